@@ -0,0 +1,220 @@
+"""
+Онлайн-бэкап affirmations.db.
+
+Копия снимается SQLite online backup API за один шаг в отдельном потоке. База в
+режиме WAL, поэтому копирование держит только транзакцию чтения: отправки по
+расписанию и обработчики пишут как обычно и не ждут, пока копируется вся база.
+Снимок проверяется quick_check, сжимается gzip и сопровождается файлом .sha256
+(формат sha256sum).
+
+    python backup.py list
+    python backup.py create
+    python backup.py verify backups/affirmations-20261019-040000-000000.db.gz
+    python backup.py restore backups/affirmations-20261019-040000-000000.db.gz
+
+Восстанавливать при остановленном боте: перед восстановлением текущая база
+сохраняется отдельным бэкапом.
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+PREFIX = "affirmations-"
+SUFFIX = ".db.gz"
+STAMP_FORMAT = "%Y%m%d-%H%M%S-%f"   # микросекунды: кнопка и плановый бэкап не перезапишут друг друга
+CHUNK = 1024 * 1024
+
+
+@dataclass
+class BackupInfo:
+    path: Path
+    sha256: str
+    db_size: int          # байт в снимке до сжатия
+    size: int             # байт в .gz
+    copy_seconds: float   # online backup API
+    compress_seconds: float
+
+
+def checksum_path(path: Path) -> Path:
+    return path.with_name(path.name + ".sha256")
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _backup_time(path: Path) -> datetime:
+    return datetime.strptime(path.name[len(PREFIX):-len(SUFFIX)], STAMP_FORMAT)
+
+
+def list_backups(backup_dir: Path) -> list[Path]:
+    """Бэкапы в папке, от старых к новым"""
+    if not backup_dir.exists():
+        return []
+    return sorted(backup_dir.glob(f"{PREFIX}*{SUFFIX}"), key=_backup_time)
+
+
+def copy_database(src_path: Path, dst_path: Path):
+    """
+    Согласованная копия живой базы через online backup API одним шагом (pages=-1).
+    Копирование порциями не годится: запись в базу через другое соединение между
+    порциями начинает копию заново с первой страницы, и при частых отправках снимок
+    может не закончиться никогда. Один шаг читает базу в одной транзакции чтения —
+    снимок на момент её начала, в WAL писатели при этом не блокируются.
+    """
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(dst_path)
+    try:
+        src.backup(dst, pages=-1)
+        # Снимок должен быть самостоятельным файлом, без -wal рядом
+        dst.execute("PRAGMA journal_mode=DELETE")
+        result = dst.execute("PRAGMA quick_check").fetchone()[0]
+        if result != "ok":
+            raise sqlite3.DatabaseError(f"Снимок не прошёл quick_check: {result}")
+    finally:
+        dst.close()
+        src.close()
+
+
+def create_backup(db_path: Path, backup_dir: Path) -> BackupInfo:
+    """Снять, проверить, сжать и записать контрольную сумму. Блокирующая — вызывать из потока"""
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    name = PREFIX + datetime.now().strftime(STAMP_FORMAT)
+    snapshot = backup_dir / f"{name}.db.tmp"
+    partial = backup_dir / f"{name}{SUFFIX}.tmp"
+    path = backup_dir / f"{name}{SUFFIX}"
+    try:
+        started = time.perf_counter()
+        copy_database(db_path, snapshot)
+        copied = time.perf_counter()
+
+        with open(snapshot, "rb") as src, gzip.open(partial, "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, CHUNK)
+        sha256 = _sha256(partial)
+        # Сначала сумма, потом сам бэкап: файл .db.gz без .sha256 значит «не дописан»
+        checksum_path(path).write_text(f"{sha256}  {path.name}\n")
+        os.replace(partial, path)
+        compressed = time.perf_counter()
+
+        return BackupInfo(
+            path=path,
+            sha256=sha256,
+            db_size=snapshot.stat().st_size,
+            size=path.stat().st_size,
+            copy_seconds=copied - started,
+            compress_seconds=compressed - copied,
+        )
+    finally:
+        snapshot.unlink(missing_ok=True)
+        partial.unlink(missing_ok=True)
+
+
+def rotate(backup_dir: Path, keep_last: int, keep_weeks: int) -> list[Path]:
+    """
+    Оставить keep_last последних бэкапов и самый свежий за каждую из keep_weeks
+    последних недель; остальные удалить. Возвращает удалённые.
+    """
+    backups = list_backups(backup_dir)
+    keep = set(backups[-keep_last:]) if keep_last > 0 else set()
+    weeks = {}
+    for path in reversed(backups):
+        week = _backup_time(path).isocalendar()[:2]
+        if week not in weeks and len(weeks) < keep_weeks:
+            weeks[week] = path
+    keep.update(weeks.values())
+
+    removed = [path for path in backups if path not in keep]
+    for path in removed:
+        path.unlink(missing_ok=True)
+        checksum_path(path).unlink(missing_ok=True)
+    return removed
+
+
+def verify(path: Path) -> bool:
+    """Совпадает ли sha256 бэкапа с записанной рядом суммой"""
+    checksum = checksum_path(path)
+    if not checksum.exists():
+        return False
+    expected = checksum.read_text().split()[0]
+    return _sha256(path) == expected
+
+
+def restore(path: Path, db_path: Path):
+    """
+    Восстановить базу из бэкапа: проверить сумму, распаковать, проверить целостность
+    и скопировать в db_path через backup API (корректно и для базы в режиме WAL).
+    """
+    if not verify(path):
+        raise ValueError(f"Контрольная сумма {path.name} не совпадает или отсутствует")
+
+    snapshot = db_path.with_name(db_path.name + ".restore")
+    try:
+        with gzip.open(path, "rb") as src, open(snapshot, "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK)
+        with sqlite3.connect(snapshot) as db:
+            result = db.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            raise sqlite3.DatabaseError(f"Бэкап повреждён: {result}")
+        copy_database(snapshot, db_path)
+    finally:
+        snapshot.unlink(missing_ok=True)
+
+
+async def run_backup(db_path: Path, backup_dir: Path, keep_last: int, keep_weeks: int) -> BackupInfo:
+    """Бэкап и ротация в отдельном потоке — event loop всё это время свободен"""
+    info = await asyncio.to_thread(create_backup, db_path, backup_dir)
+    await asyncio.to_thread(rotate, backup_dir, keep_last, keep_weeks)
+    return info
+
+
+def main():
+    data_dir = Path(os.getenv("DATA_DIR", "/app/data"))
+    parser = argparse.ArgumentParser(description="Бэкапы affirmations.db")
+    parser.add_argument("--db", type=Path, default=data_dir / "affirmations.db")
+    parser.add_argument("--dir", type=Path, default=data_dir / "backups", help="папка с бэкапами")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="бэкапы и результат проверки сумм")
+    create = commands.add_parser("create", help="снять бэкап сейчас")
+    create.add_argument("--keep-last", type=int, default=int(os.getenv("BACKUP_KEEP", "7")))
+    create.add_argument("--keep-weeks", type=int, default=int(os.getenv("BACKUP_KEEP_WEEKS", "4")))
+    commands.add_parser("verify", help="проверить сумму").add_argument("backup", type=Path)
+    restore_cmd = commands.add_parser("restore", help="восстановить базу (бот должен быть остановлен)")
+    restore_cmd.add_argument("backup", type=Path)
+    restore_cmd.add_argument("--no-safety-backup", action="store_true", help="не сохранять текущую базу перед восстановлением")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for path in list_backups(args.dir):
+            status = "ok" if verify(path) else "BAD"
+            print(f"{path.name}\t{path.stat().st_size / 1024:.0f} KiB\t{status}")
+    elif args.command == "create":
+        info = create_backup(args.db, args.dir)
+        removed = rotate(args.dir, args.keep_last, args.keep_weeks)
+        print(f"{info.path} ({info.size / 1024:.0f} KiB, sha256 {info.sha256[:12]}), удалено старых: {len(removed)}")
+    elif args.command == "verify":
+        ok = verify(args.backup)
+        print("ok" if ok else "контрольная сумма не совпадает")
+        sys.exit(0 if ok else 1)
+    elif args.command == "restore":
+        if args.db.exists() and not args.no_safety_backup:
+            safety = create_backup(args.db, args.dir)
+            print(f"Текущая база сохранена в {safety.path}")
+        restore(args.backup, args.db)
+        print(f"{args.db} восстановлена из {args.backup.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Кнопки админки: чужой пользователь получает отказ и ничего не меняет"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from support import botst
+
+STRANGER_ID = 777
+
+
+class FakeCallback:
+    """Минимум CallbackQuery, который трогают обработчики до проверки доступа"""
+
+    def __init__(self, user_id: int, data: str):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.data = data
+        self.answers = []
+        self.message = SimpleNamespace(edit_text=self._fail, answer=self._fail, chat=SimpleNamespace(id=user_id))
+
+    async def answer(self, text=None, **kwargs):
+        self.answers.append(text)
+
+    async def _fail(self, *args, **kwargs):
+        raise AssertionError("обработчик ответил чужому пользователю")
+
+
+@pytest.mark.parametrize("handler, data", [
+    ("channels_cb", "channels"),
+    ("select_channel_cb", "channel:1"),
+    ("add_channel_cb", "add_channel"),
+    ("set_tz_cb", "set_tz"),
+    ("set_caption_cb", "set_caption"),
+    ("search_cb", "search"),
+    ("search_page_cb", "search_page:0"),
+    ("preview_cb", "aff:1"),
+    ("post_history_cb", "post_history"),
+])
+def test_admin_only_callbacks(data_dir, run, handler, data):
+    run(botst.init_db())
+    state = FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=STRANGER_ID, user_id=STRANGER_ID))
+    cb = FakeCallback(STRANGER_ID, data)
+
+    run(getattr(botst, handler)(cb, state))
+
+    assert cb.answers == ["❌ Доступ только для админа."]
+    assert run(state.get_state()) is None and run(state.get_data()) == {}
+
+
+def test_handlers_wait_for_init_db(data_dir, run, monkeypatch):
+    """Кнопка, нажатая до конца init_db (polling стартует параллельно), ждёт её, а не читает пустую базу"""
+    edits = []
+
+    async def edit_text(text, **kwargs):
+        edits.append(text)
+        return SimpleNamespace(text=text)
+
+    cb = FakeCallback(botst.ADMIN_ID, "status")
+    cb.message = SimpleNamespace(edit_text=edit_text, chat=SimpleNamespace(id=botst.ADMIN_ID), message_id=1, text=None)
+    state = FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=botst.ADMIN_ID, user_id=botst.ADMIN_ID))
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def slow_init():
+            await gate.wait()
+            await botst.init_db()
+
+        monkeypatch.setattr(botst, "db_init_task", asyncio.create_task(slow_init()))
+        status = asyncio.create_task(botst.status_cb(cb, state))
+        search = asyncio.create_task(botst.search_affirmations("#12", botst.DEFAULT_CHANNEL_ID))
+        await asyncio.sleep(0.2)
+        pending = not status.done() and not search.done() and not botst.DB_PATH.exists()
+        gate.set()
+        await asyncio.wait_for(asyncio.gather(status, search), 10)
+        return pending, search.result()
+
+    pending, (results, _) = run(scenario())
+    assert pending
+    assert [r["id"] for r in results] == [12]
+    assert len(edits) == 1 and "Статус бота" in edits[0]
+
+
+class FakeMessage:
+    def __init__(self, user_id: int, text: str):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.text = text
+        self.answers = []
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+
+@pytest.mark.parametrize("text, reply", [
+    ("", "Неверный формат"),
+    ("   ", "Неверный формат"),
+    ("@chan 500-1", "начало больше конца"),
+    ("@chan 100000-100500", "нет аффирмаций"),
+])
+def test_channel_add_rejected(data_dir, run, text, reply):
+    """Пустое сообщение и пустой диапазон — ответ админу, канал без корпуса не создаётся"""
+    run(botst.init_db())
+    state = FSMContext(MemoryStorage(), StorageKey(bot_id=1, chat_id=botst.ADMIN_ID, user_id=botst.ADMIN_ID))
+    run(state.set_state(botst.AdminStates.waiting_channel_add))
+    msg = FakeMessage(botst.ADMIN_ID, text)
+
+    run(botst.process_channel_add(msg, state))
+
+    assert len(msg.answers) == 1 and reply in msg.answers[0]
+    assert [c["id"] for c in run(botst.list_channels())] == [botst.DEFAULT_CHANNEL_ID]
+    assert run(state.get_state()) is None
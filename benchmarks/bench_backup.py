@@ -0,0 +1,77 @@
+"""Онлайн-бэкап базы и выбор аффирмации, пока бэкап копирует базу"""
+import sqlite3
+import threading
+
+import pytest
+
+import backup
+from support import botst
+
+
+def count_affirmations(path) -> int:
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM affirmations").fetchone()[0]
+
+
+@pytest.mark.benchmark(group="backup")
+def test_backup(benchmark, corpus, run, tmp_path):
+    info = benchmark.pedantic(lambda: run(botst.backup_database()), rounds=3)
+    assert backup.verify(info.path)
+
+    restored = tmp_path / "restored.db"
+    backup.restore(info.path, restored)
+    assert count_affirmations(restored) == count_affirmations(botst.DB_PATH) >= corpus
+
+
+def test_backup_under_writes(corpus, tmp_path):
+    """Другое соединение пишет без пауз, пока идёт копия: снимок заканчивается и цел"""
+    stop = threading.Event()
+    writes = []
+
+    def writer():
+        with sqlite3.connect(botst.DB_PATH) as db:
+            while not stop.is_set():
+                db.execute("UPDATE affirmations SET used = 1 - used WHERE id = ?", (len(writes) % corpus + 1,))
+                db.commit()
+                writes.append(1)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    copy = threading.Thread(target=backup.copy_database, args=(botst.DB_PATH, tmp_path / "snapshot.db"))
+    try:
+        while not writes:
+            pass
+        copy.start()
+        copy.join(timeout=30)
+        finished = not copy.is_alive()
+    finally:
+        stop.set()
+        thread.join()
+        if copy.is_alive():
+            copy.join()
+    assert finished, "копия не закончилась, пока в базу пишут"
+    assert count_affirmations(tmp_path / "snapshot.db") == count_affirmations(botst.DB_PATH)
+
+
+@pytest.fixture
+def backups_running(corpus, tmp_path):
+    """Бэкапы без перерыва в фоновом потоке, пока идёт бенчмарк"""
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            backup.copy_database(botst.DB_PATH, tmp_path / "snapshot.db")
+            (tmp_path / "snapshot.db").unlink()
+
+    thread = threading.Thread(target=loop)
+    thread.start()
+    yield corpus
+    stop.set()
+    thread.join()
+
+
+@pytest.mark.benchmark(group="pick-during-backup")
+def test_pick_during_backup(benchmark, backups_running, run):
+    """Сравнивать с группой pick: отправка не должна ждать копирования всей базы"""
+    aff = benchmark(lambda: run(botst.get_next_affirmation()))
+    assert 1 <= aff["id"] <= backups_running
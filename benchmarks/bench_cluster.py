@@ -0,0 +1,227 @@
+"""Кластерный режим: аренда лидера и очередь апдейтов между процессами, отказ лидера"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from cluster import Lease, UpdateQueue
+from cluster_check import run as run_cluster
+from loadtest import start_update
+from support import botst
+
+PROCESSES = 4
+
+
+def contend_lease(db_path, holder: str, barrier, results):
+    barrier.wait()
+    results.put((holder, asyncio.run(Lease(db_path, "leader", holder, ttl=30).acquire())))
+
+
+def drain_queue(db_path, worker: str, barrier, results):
+    async def drain():
+        queue = UpdateQueue(db_path, worker)
+        claimed = []
+        try:
+            while batch := await queue.claim(5):
+                for raw in batch:
+                    claimed.append(raw["update_id"])
+                    await queue.ack(raw["update_id"])
+        finally:
+            await queue.close()
+        return claimed
+
+    barrier.wait()
+    results.put(asyncio.run(drain()))
+
+
+def start_processes(target, db_path, count: int) -> list:
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(count)
+    results = context.Queue()
+    processes = [
+        context.Process(target=target, args=(db_path, f"host:{i}", barrier, results))
+        for i in range(count)
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+    return collected
+
+
+def test_lease_one_holder_across_processes(tmp_path, run):
+    """Процессы одновременно берут аренду — получает ровно один, после release — другой"""
+    db_path = tmp_path / "cluster.db"
+    results = dict(start_processes(contend_lease, db_path, PROCESSES))
+
+    winners = [holder for holder, acquired in results.items() if acquired]
+    assert len(winners) == 1
+
+    loser = next(holder for holder in results if holder not in winners)
+    assert not run(Lease(db_path, "leader", loser, ttl=30).acquire())
+    run(Lease(db_path, "leader", winners[0], ttl=30).release())
+    assert run(Lease(db_path, "leader", loser, ttl=30).acquire())
+
+
+def test_queue_claims_disjoint_across_processes(tmp_path, run):
+    """Процессы разбирают общую очередь — каждый апдейт достаётся ровно одному"""
+    db_path = tmp_path / "cluster.db"
+    queue = UpdateQueue(db_path, "host:leader")
+    run(queue.put([{"update_id": i} for i in range(1, 401)]))
+    run(queue.close())
+
+    claimed = [update_id for batch in start_processes(drain_queue, db_path, PROCESSES) for update_id in batch]
+    assert sorted(claimed) == list(range(1, 401))
+
+
+def test_queue_extend_keeps_claim(tmp_path, run):
+    """Продлённый захват не уходит другому процессу; брошенный — уходит после claim_timeout"""
+    db_path = tmp_path / "cluster.db"
+    first = UpdateQueue(db_path, "host:1", claim_timeout=0.2)
+    second = UpdateQueue(db_path, "host:2", claim_timeout=0.2)
+
+    async def scenario():
+        await first.put([{"update_id": 1}])
+        assert [u["update_id"] for u in await first.claim(10)] == [1]
+        for _ in range(5):
+            await asyncio.sleep(0.1)
+            await first.extend([1])
+            assert await second.claim(10) == []
+        await asyncio.sleep(0.3)
+        assert [u["update_id"] for u in await second.claim(10)] == [1]
+        # Чужой ack не удаляет апдейт: после перехвата он принадлежит второму
+        await first.ack(1)
+        await second.ack(1)
+        assert await second.claim(10) == []
+        await first.close()
+        await second.close()
+
+    run(scenario())
+
+
+def test_slow_handler_not_redelivered(data_dir, run, monkeypatch):
+    """Обработчик дольше claim_timeout: consume_updates продлевает захват, второй процесс не получает апдейт"""
+    handled = []
+
+    async def slow_feed(bot, update):
+        handled.append(update.update_id)
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(botst.dp, "feed_update", slow_feed)
+    db_path = data_dir / "cluster.db"
+    queue = UpdateQueue(db_path, "host:1", claim_timeout=0.3)
+    other = UpdateQueue(db_path, "host:2", claim_timeout=0.3)
+
+    async def scenario():
+        await queue.put([{"update_id": 1, **start_update(10_001)}])
+        consumer = asyncio.create_task(botst.consume_updates(queue))
+        stolen = []
+        try:
+            deadline = time.monotonic() + 1.5
+            while time.monotonic() < deadline:
+                stolen += await other.claim(10)
+                await asyncio.sleep(0.05)
+        finally:
+            consumer.cancel()
+            await asyncio.gather(consumer, return_exceptions=True)
+        try:
+            # Отмена могла прервать claim посреди транзакции — база не должна остаться заблокированной
+            return stolen, await other.claim(10)
+        finally:
+            await queue.close()
+            await other.close()
+
+    stolen, remaining = run(scenario())
+    assert handled == [1]
+    assert stolen == [] and remaining == []
+
+
+@pytest.mark.parametrize("grace, handled_ids, released", [(5, [1, 2], [3, 4]), (0.05, [], [1, 2, 3, 4])])
+def test_shutdown_releases_claims(data_dir, run, monkeypatch, grace, handled_ids, released):
+    """Остановка: начатые обработчики дорабатывают SHUTDOWN_GRACE, все неподтверждённые апдейты сразу доступны другим"""
+    handled = []
+
+    async def slow_feed(bot, update):
+        await asyncio.sleep(0.3)
+        handled.append(update.update_id)
+
+    monkeypatch.setattr(botst.dp, "feed_update", slow_feed)
+    monkeypatch.setattr(botst, "CLUSTER_CONCURRENCY", 2)
+    monkeypatch.setattr(botst, "SHUTDOWN_GRACE", grace)
+    db_path = data_dir / "cluster.db"
+    queue = UpdateQueue(db_path, "host:1")
+    other = UpdateQueue(db_path, "host:2")
+
+    async def scenario():
+        await queue.put([{"update_id": i, **start_update(10_000 + i)} for i in (1, 2, 3, 4)])
+        consumer = asyncio.create_task(botst.consume_updates(queue))
+        await asyncio.sleep(0.1)
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+        try:
+            return sorted(u["update_id"] for u in await other.claim(10))
+        finally:
+            await queue.close()
+            await other.close()
+
+    assert run(scenario()) == released
+    assert sorted(handled) == handled_ids
+
+
+def test_demoted_leader_stops_catch_up(run, monkeypatch):
+    """Потеряв аренду, процесс останавливает и getUpdates, и досылку пропущенных постов"""
+    cancelled = []
+
+    async def forever(name):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+
+    class FlakyLease:
+        ttl = 0.15
+        answers = iter([True, False])
+
+        async def acquire(self):
+            return next(self.answers, False)
+
+    async def fingerprint():
+        return []
+
+    async def load_schedule():
+        pass
+
+    monkeypatch.setattr(botst, "scheduler", SimpleNamespace(resume=lambda: None, pause=lambda: None))
+    monkeypatch.setattr(botst, "schedule_fingerprint", fingerprint)
+    monkeypatch.setattr(botst, "load_schedule", load_schedule)
+    monkeypatch.setattr(botst, "poll_updates", lambda queue: forever("poller"))
+    monkeypatch.setattr(botst, "catch_up_missed_posts", lambda: forever("catch_up"))
+
+    async def scenario():
+        loop_task = asyncio.create_task(botst.leadership_loop(FlakyLease(), None))
+        await asyncio.sleep(0.2)
+        demoted = sorted(cancelled)
+        loop_task.cancel()
+        await asyncio.gather(loop_task, return_exceptions=True)
+        return demoted
+
+    assert run(scenario()) == ["catch_up", "poller"]
+
+
+@pytest.mark.benchmark(group="cluster")
+def test_cluster_workers(benchmark, run):
+    """Три процесса botst против заглушки Bot API: апдейты обработаны по разу, лидер сменяется"""
+    args = argparse.Namespace(workers=3, updates=60, lease_ttl=2.0, timeout=60.0, schedule=False)
+    report = benchmark.pedantic(lambda: run(run_cluster(args)), rounds=1, iterations=1)
+
+    benchmark.extra_info.update(updates_s=report["updates"]["elapsed_s"], failover_s=report["failover"]["failover_s"])
+    assert report["updates"]["answered"] == report["updates"]["sent"]
+    assert report["updates"]["duplicates"] == 0
+    assert report["failover"]["failover_s"] is not None
+    assert report["failover"]["new_leader"] not in (None, report["failover"]["killed_leader"])
@@ -0,0 +1,258 @@
+"""Заполнение базы и выбор следующей аффирмации на корпусах разного размера"""
+import asyncio
+import sqlite3
+
+import pytest
+
+from support import botst
+
+
+@pytest.mark.benchmark(group="init-db")
+def test_init_db_seed(benchmark, data_dir, run):
+    def setup():
+        botst.DB_PATH.unlink(missing_ok=True)
+        return (botst.init_db(),), {}
+
+    benchmark.pedantic(run, setup=setup, rounds=20)
+
+    with sqlite3.connect(botst.DB_PATH) as db:
+        assert db.execute("SELECT COUNT(*) FROM affirmations").fetchone()[0] == len(botst.load_affirmations())
+
+
+@pytest.mark.benchmark(group="pick")
+def test_pick(benchmark, corpus, run):
+    aff = benchmark(lambda: run(botst.get_next_affirmation()))
+    assert 1 <= aff["id"] <= corpus
+
+
+@pytest.mark.benchmark(group="pick-cycle-reset")
+def test_pick_cycle_reset(benchmark, corpus, run):
+    """Ветка «все использованы — начинаем новый круг»"""
+    def setup():
+        with sqlite3.connect(botst.DB_PATH) as db:
+            db.execute("UPDATE channel_affirmations SET used = 1")
+        return (botst.get_next_affirmation(),), {}
+
+    benchmark.pedantic(run, setup=setup, rounds=5)
+
+    with sqlite3.connect(botst.DB_PATH) as db:
+        assert db.execute("SELECT COUNT(*) FROM channel_affirmations WHERE used = 1").fetchone()[0] == 1
+
+
+@pytest.mark.benchmark(group="status-counters")
+def test_status_counters(benchmark, corpus, run):
+    """Счётчики экрана статуса после выборов и смены круга совпадают с подсчётом по таблице"""
+    for _ in range(3):
+        run(botst.get_next_affirmation())
+
+    def setup():
+        botst.channel_stats.clear()     # мерим чтение из channel_stats, а не из памяти
+        return (botst.get_channel_stats(botst.DEFAULT_CHANNEL_ID),), {}
+
+    stats = benchmark.pedantic(run, setup=setup, rounds=50)
+
+    with sqlite3.connect(botst.DB_PATH) as db:
+        total, used = db.execute(
+            "SELECT COUNT(*), SUM(used) FROM channel_affirmations WHERE channel_id = ?", (botst.DEFAULT_CHANNEL_ID,)
+        ).fetchone()
+    assert stats == {"total": total, "used": used, "remaining": total - used} and used == 3
+
+
+@pytest.mark.benchmark(group="post-log")
+def test_post_log_flush(benchmark, data_dir, run):
+    """Пачка журнала отправок: вставка в post_log и обновление post_daily одной транзакцией"""
+    from datetime import datetime, timedelta
+
+    import pytz
+
+    from postlog import PostLog, PostRecord
+
+    run(botst.init_db())
+    log = PostLog(botst.connect_db, batch=10_000)
+    base = pytz.timezone("Europe/Moscow").localize(datetime(2027, 1, 1, 9, 0))
+    flushes = []
+
+    def setup():
+        flushes.append(1)
+        for i in range(200):
+            sent = base + timedelta(hours=12 * i, seconds=3)
+            log._buffer.append(PostRecord(1, i + 1, sent - timedelta(seconds=3), sent, 100.0, f"file-{i}", i))
+        return (log.flush(),), {}
+
+    benchmark.pedantic(run, setup=setup, rounds=10)
+
+    week = run(log.totals(1, "2027-01-01"))
+    days = run(log.daily(1, "2027-01-01"))
+    rounds = len(flushes)
+    assert week["posts"] == 200 * rounds and week["delay_s"] == pytest.approx(3.0)
+    assert len(days) == 100 and all(d["posts"] == 2 * rounds for d in days)
+    with sqlite3.connect(botst.DB_PATH) as db:
+        assert db.execute("SELECT COUNT(*) FROM post_log").fetchone()[0] == 200 * rounds
+        with pytest.raises(sqlite3.DatabaseError, match="append-only"):
+            db.execute("UPDATE post_log SET error = 'x'")
+    assert run(log.prune(base + timedelta(days=50))) == 100 * rounds
+
+
+def test_post_log_retry_and_close(data_dir, run):
+    """Неудачная запись повторяется по таймеру без новых записей; close() дописывает буфер и снимает таймеры"""
+    from datetime import datetime
+
+    import pytz
+
+    from postlog import PostLog, PostRecord
+
+    run(botst.init_db())
+    failures = []
+
+    def connect():
+        if len(failures) < 2:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return botst.connect_db()
+
+    log = PostLog(connect, batch=100, interval=0.05)
+    sent = pytz.timezone("Europe/Moscow").localize(datetime(2027, 1, 1, 9, 0))
+
+    async def scenario():
+        log.record(PostRecord(1, 1, None, sent, 100.0))
+        await asyncio.sleep(0.5)
+        retried = (await log.totals(1))["posts"]
+        log.record(PostRecord(1, 2, None, sent, 100.0))
+        await log.close()
+        return retried, (await log.totals(1))["posts"]
+
+    assert run(scenario()) == (1, 2)
+    assert len(failures) == 2 and not log._tasks
+
+
+def test_reload_keeps_log_prune(data_dir, run):
+    """Перезагрузка расписания снимает задачи постинга, но не очистку журнала"""
+    run(botst.init_db())
+    try:
+        botst.schedule_post_log_prune()
+        run(botst.load_schedule())
+        posting = [job.id for job in botst.scheduler.get_jobs() if job.id.startswith("post_")]
+        run(botst.load_schedule())
+        run(botst.load_schedule(botst.DEFAULT_CHANNEL_ID))
+
+        assert botst.scheduler.get_job("log_prune") is not None
+        assert posting and sorted(job.id for job in botst.scheduler.get_jobs() if job.id.startswith("post_")) == sorted(posting)
+    finally:
+        botst.scheduler.remove_all_jobs()
+
+
+@pytest.mark.benchmark(group="search")
+@pytest.mark.parametrize("query", ["люблю себя", "#4321", "ценн"], ids=["words", "number", "prefix"])
+def test_search(benchmark, corpus, run, query):
+    """Страница поиска админки по FTS5 на корпусах до 500k строк"""
+    results, has_next = benchmark(lambda: run(botst.search_affirmations(query, botst.DEFAULT_CHANNEL_ID)))
+
+    if query.startswith("#"):
+        assert [r["id"] for r in results] == ([4321] if corpus >= 4321 else [])
+        return
+    assert results and len(results) <= botst.SEARCH_PAGE_SIZE
+    assert has_next == (corpus > 500)
+    words = botst.fts_query(query).replace('"', "").replace("*", "").split()
+    assert all(all(word in r["text"].lower() for word in words) for r in results)
+    assert all(r["used"] == 0 for r in results)
+
+
+def test_search_index_in_sync(data_dir, run):
+    """Триггеры держат индекс в синхронизации с affirmations; старая база без индекса перестраивается"""
+    run(botst.init_db())
+    with sqlite3.connect(botst.DB_PATH) as db:
+        db.execute("UPDATE affirmations SET text = 'Совершенно новая формулировка' WHERE id = 5")
+        db.execute("DELETE FROM affirmations WHERE id = 6")
+    assert [r["id"] for r in run(botst.search_affirmations("совершенно формулир", 1))[0]] == [5]
+
+    with sqlite3.connect(botst.DB_PATH) as db:
+        db.execute("DROP TABLE affirmations_fts")
+    run(botst.init_db())
+    with sqlite3.connect(botst.DB_PATH) as db:
+        assert db.execute("INSERT INTO affirmations_fts (affirmations_fts) VALUES ('integrity-check')").rowcount
+    assert [r["id"] for r in run(botst.search_affirmations("совершенно", 1))[0]] == [5]
+
+
+def test_search_number_query(data_dir, run):
+    """Номер — только ASCII-цифры: "²" и "٣" ищутся как текст, а не падают в int()"""
+    run(botst.init_db())
+    assert [r["id"] for r in run(botst.search_affirmations("#12", 1))[0]] == [12]
+    for query in ("²", "#٣"):
+        assert run(botst.search_affirmations(query, 1)) == ([], False)
+
+
+def test_pick_uniform(data_dir, run):
+    """После длинной серии использованных следующая выпадает не чаще прочих (как ORDER BY RANDOM())"""
+    run(botst.init_db())
+    with sqlite3.connect(botst.DB_PATH) as db:
+        db.execute("UPDATE channel_affirmations SET used = 1 WHERE affirmation_id BETWEEN 2 AND 400")
+    remaining = len(botst.load_affirmations()) - 399
+
+    async def picks(rounds: int):
+        async with botst.connect_db() as db:
+            result = []
+            for _ in range(rounds):
+                # Перетасовка, как при сбросе круга
+                await db.execute("UPDATE channel_affirmations SET rank = random() WHERE channel_id = 1")
+                aff_id = await botst.pick_unused(db, 1)
+                # Выбор сразу помечает её использованной — возвращаем в остаток
+                await db.execute("UPDATE channel_affirmations SET used = 0 WHERE channel_id = 1 AND affirmation_id = ?", (aff_id,))
+                result.append(aff_id)
+            return result
+
+    picked = run(picks(2000))
+    assert set(picked) <= {1, *range(401, 401 + remaining)}
+    # Равномерно — около 2000/101 ≈ 20 раз; «первая после серии» давала ~1600
+    assert picked.count(401) < 50 and len(set(picked)) > remaining * 0.9
+
+
+def test_pick_concurrent(data_dir, run):
+    """Одновременные выборы одного канала (задачи процесса, процессы кластера) получают разные аффирмации"""
+    run(botst.init_db())
+
+    async def burst():
+        return await asyncio.gather(*(botst.get_next_affirmation() for _ in range(20)))
+
+    picked = [aff["id"] for aff in run(burst())]
+    assert len(set(picked)) == 20
+    assert run(botst.get_channel_stats(botst.DEFAULT_CHANNEL_ID))["used"] == 20
+
+
+def test_rank_migration(data_dir, run):
+    """База до столбца rank: init_db добавляет его, тасует и строит индекс выбора"""
+    run(botst.init_db())
+    with sqlite3.connect(botst.DB_PATH) as db:
+        db.execute("DROP INDEX idx_channel_affirmations_rank")
+        db.execute("ALTER TABLE channel_affirmations DROP COLUMN rank")
+    run(botst.init_db())
+    with sqlite3.connect(botst.DB_PATH) as db:
+        assert db.execute("SELECT COUNT(DISTINCT rank) > 400 FROM channel_affirmations").fetchone()[0]
+        plan = db.execute(
+            "EXPLAIN QUERY PLAN SELECT affirmation_id FROM channel_affirmations "
+            "WHERE channel_id = 1 AND used = 0 ORDER BY rank LIMIT 1"
+        ).fetchall()
+    assert "idx_channel_affirmations_rank" in plan[0][3] and "TEMP B-TREE" not in str(plan)
+
+
+def test_pick_covers_corpus(data_dir, run):
+    """Круг по диапазону номеров: каждая аффирмация канала ровно один раз, потом новый круг"""
+    run(botst.init_db())
+    total = len(botst.load_affirmations())
+    picked = [run(botst.get_next_affirmation())["id"] for _ in range(total)]
+    assert sorted(picked) == list(range(1, total + 1))
+    assert run(botst.get_channel(botst.DEFAULT_CHANNEL_ID))["cycle"] == 1
+    run(botst.get_next_affirmation())
+    assert run(botst.get_channel(botst.DEFAULT_CHANNEL_ID))["cycle"] == 2
+
+
+def test_init_db_channel_id_conflict(data_dir, run):
+    """CHANNEL_ID, добавленный в админке отдельным каналом, не ломает старт"""
+    run(botst.init_db())
+    with sqlite3.connect(botst.DB_PATH) as db:
+        db.execute("UPDATE channels SET chat_id = '@old_default' WHERE id = 1")
+    channel_id = run(botst.create_channel(botst.CHANNEL_ID, "UTC"))
+
+    run(botst.init_db())
+
+    assert run(botst.get_channel(1))["chat_id"] == "@old_default"
+    assert run(botst.get_channel(channel_id))["chat_id"] == botst.CHANNEL_ID
@@ -0,0 +1,32 @@
+"""Сквозной прогон через dp и заглушку Bot API — задержки и пропускная способность"""
+import asyncio
+
+import pytest
+
+from loadtest import run_load
+from support import botst, close_loop
+from telegram_stub import StubConfig
+
+
+@pytest.fixture(scope="module")
+def dp_loop():
+    """Один цикл на модуль: внутренние события dp привязываются к первому циклу polling"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    close_loop(loop)
+
+
+@pytest.mark.benchmark(group="e2e")
+@pytest.mark.parametrize("rate_429", [0.0, 0.02], ids=["clean", "429"])
+def test_e2e_load(benchmark, data_dir, dp_loop, rate_429):
+    config = StubConfig(latency=0.005, jitter=0.005, rate_429=rate_429, seed=1)
+    report = benchmark.pedantic(lambda: dp_loop.run_until_complete(run_load(updates=1000, sends=20, config=config)), rounds=1, iterations=1)
+
+    benchmark.extra_info.update(report)
+    if not rate_429:
+        assert report["updates"]["handled"] == 1000
+        assert report["sends"]["delivered"] == 20
+    assert report["updates"]["handled"] + report["updates"]["unanswered"] == 1000
+    # Время обработчиков — по имени функции, а не по callback_data
+    assert botst.HANDLER_SECONDS.stats(handler="status_cb")["count"] > 0
+    assert botst.HANDLER_SECONDS.stats(handler="reload_cb")["count"] > 0
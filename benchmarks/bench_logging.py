@@ -0,0 +1,61 @@
+"""Цена logger.info в потоке event loop: синхронный StreamHandler против очереди"""
+import logging
+import queue
+
+import pytest
+
+from support import botst  # noqa: F401 — импорт бота и корень репозитория в sys.path
+from logs import TEXT_FORMAT, JsonFormatter, LazyQueueHandler, RateLimitFilter
+
+
+@pytest.fixture(params=["stream", "queue"])
+def bench_logger(request, tmp_path):
+    logger = logging.getLogger(f"bench.{request.param}")
+    logger.propagate = False
+    if request.param == "stream":
+        # Как было с basicConfig: форматирование и запись прямо в вызывающем потоке
+        handler = logging.StreamHandler(open(tmp_path / "bot.log", "w", encoding="utf-8"))
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    else:
+        # Слушатель не нужен: мерим только то, что остаётся в потоке event loop
+        handler = LazyQueueHandler(queue.SimpleQueue())
+        handler.addFilter(RateLimitFilter(burst=20, interval=10))
+    logger.addHandler(handler)
+    yield logger
+    logger.removeHandler(handler)
+    handler.close()
+
+
+@pytest.mark.benchmark(group="log-info")
+def test_log_info(benchmark, bench_logger):
+    aff = {"id": 42, "text": "Я позволяю себе быть счастливой и спокойной каждый день"}
+    benchmark(bench_logger.info, "✅ [%s] Отправлена аффирмация #%s: %.30s...", "@bench_channel", aff["id"], aff["text"])
+
+
+def test_prepare_snapshots_record():
+    """Исключение и изменяемые аргументы фиксируются до очереди; неизменяемые остаются ленивыми"""
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("bench.prepare")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(LazyQueueHandler(log_queue))
+
+    channels = ["@one"]
+    logger.info("Каналы: %s", channels)
+    channels.append("@two")
+    logger.info("Канал #%s", 7)
+    try:
+        raise ValueError("сломалось")
+    except ValueError:
+        logger.exception("Ошибка")
+
+    mutable, lazy, failed = (log_queue.get_nowait() for _ in range(3))
+    assert mutable.getMessage() == "Каналы: ['@one']" and mutable.args is None
+    assert lazy.msg == "Канал #%s" and lazy.args == (7,)
+    assert failed.exc_info is None and "ValueError: сломалось" in failed.exc_text
+    assert "ValueError: сломалось" in JsonFormatter().format(failed)
+
+
+def test_import_keeps_root_logger():
+    """Импорт botst не настраивает логирование — это делает main()"""
+    assert not any(isinstance(handler, LazyQueueHandler) for handler in logging.getLogger().handlers)
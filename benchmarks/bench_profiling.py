@@ -0,0 +1,113 @@
+"""Профилирование по запросу: сессия cProfile + сэмплер, снимки tracemalloc, стеки задач"""
+import asyncio
+import logging
+import threading
+import tracemalloc
+
+import pytest
+
+from profiling import MemoryTracer, Profiler, dump_tasks
+
+
+def busy(n: int = 20_000) -> int:
+    return sum(i * i for i in range(n))
+
+
+def sampler_threads() -> list[threading.Thread]:
+    return [t for t in threading.enumerate() if t.name == "profiler-sampler"]
+
+
+def test_profiler_start_stop_report(run):
+    """start -> нагрузка -> stop: отчёт с профилем и сэмплами, поток-сэмплер остановлен"""
+    profiler = Profiler(timeout=60, sample_interval=0.001)
+
+    async def session():
+        profiler.start()
+        assert profiler.active and len(sampler_threads()) == 1
+        for _ in range(20):
+            busy()
+            await asyncio.sleep(0.002)
+        return profiler.stop()
+
+    report = run(session())
+
+    assert not profiler.active
+    assert not sampler_threads()
+    assert report.duration > 0.04
+    assert "busy" in report.pstats_text
+    assert report.samples > 0
+    assert report.samples == sum(int(line.rsplit(" ", 1)[1]) for line in report.collapsed.splitlines())
+    assert any(line.startswith("MainThread;") for line in report.collapsed.splitlines())
+    with pytest.raises(RuntimeError):
+        profiler.stop()
+
+
+def test_profiler_timeout(run):
+    """Сессия останавливается сама по timeout и отдаёт отчёт в on_timeout"""
+    reports = []
+
+    async def on_timeout(report):
+        reports.append(report)
+
+    profiler = Profiler(timeout=0.05, sample_interval=0.001, on_timeout=on_timeout)
+
+    async def session():
+        profiler.start()
+        with pytest.raises(RuntimeError):
+            profiler.start()
+        await asyncio.sleep(0.2)
+
+    run(session())
+
+    assert len(reports) == 1 and not profiler.active
+    assert not sampler_threads()
+
+
+def test_profiler_timeout_error_logged(run, caplog):
+    """Ошибка on_timeout попадает в лог, а не в «Task exception was never retrieved»"""
+    async def on_timeout(report):
+        raise RuntimeError("отчёт не отправлен")
+
+    profiler = Profiler(timeout=0.02, sample_interval=0.001, on_timeout=on_timeout)
+
+    async def session():
+        profiler.start()
+        await asyncio.sleep(0.1)
+
+    with caplog.at_level(logging.ERROR, logger="profiling"):
+        run(session())
+
+    assert [r.exc_info[1].args[0] for r in caplog.records] == ["отчёт не отправлен"]
+    assert not profiler._reports
+
+
+def test_memory_tracer_snapshots(run):
+    """Первый снимок включает tracemalloc, второй показывает разницу, stop выключает"""
+    tracer = MemoryTracer(timeout=60, top=5)
+
+    async def session():
+        first = tracer.snapshot()
+        hold = [bytearray(1024) for _ in range(1000)]
+        second = tracer.snapshot()
+        tracer.stop()
+        return first, second, hold
+
+    first, second, _ = run(session())
+
+    assert "Топ-5 мест выделения памяти" in first
+    assert "Топ-5 изменений с прошлого снимка" in second
+    assert not tracer.active and not tracemalloc.is_tracing()
+
+
+def test_dump_tasks(run):
+    async def session():
+        task = asyncio.create_task(asyncio.sleep(10), name="sleeper")
+        await asyncio.sleep(0)
+        try:
+            return dump_tasks()
+        finally:
+            task.cancel()
+
+    text = run(session())
+    assert "=== sleeper" in text and "Задач: 2" in text
+
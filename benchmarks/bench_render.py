@@ -0,0 +1,113 @@
+"""Рендер картинки аффирмации: холодный (без кэша на диске) и тёплый"""
+import pytest
+
+from support import ROOT, botst
+
+TEXTS = {
+    "short": "Я здесь.",
+    "long": " ".join(botst.load_affirmations()[100:110]),
+    "giant_word": "Самопринятие" * 8,
+}
+
+
+@pytest.mark.benchmark(group="render-cold")
+@pytest.mark.parametrize("kind", TEXTS)
+def test_render_cold(benchmark, data_dir, run, kind):
+    text = TEXTS[kind]
+    path = botst.IMAGES_DIR / "1.png"
+
+    def setup():
+        path.unlink(missing_ok=True)
+        return (botst.get_affirmation_photo(1, text),), {}
+
+    result = benchmark.pedantic(run, setup=setup, rounds=30)
+    assert result == str(path)
+
+
+@pytest.mark.benchmark(group="render-warm")
+@pytest.mark.parametrize("kind", TEXTS)
+def test_render_warm(benchmark, data_dir, run, kind):
+    text = TEXTS[kind]
+    run(botst.get_affirmation_photo(1, text))
+
+    result = benchmark(lambda: run(botst.get_affirmation_photo(1, text)))
+    assert result == str(botst.IMAGES_DIR / "1.png")
+
+
+FONT_PATH = str(ROOT / "TTNormsPro-Thin.ttf")
+
+
+@pytest.fixture(scope="module")
+def atlas():
+    from glyphs import get_atlas
+
+    return get_atlas(FONT_PATH, 60)
+
+
+@pytest.fixture(scope="module")
+def font():
+    """Эталон — шрифт с раскладкой по умолчанию, как его рисовал бот до атласа"""
+    from PIL import ImageFont
+
+    return ImageFont.truetype(FONT_PATH, 60)
+
+
+def draw_line(atlas, text: str, use_atlas: bool, font=None):
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", (1400, 100), color=(230, 210, 220))
+    draw = ImageDraw.Draw(img)
+    if use_atlas:
+        atlas.draw(draw, (20, 10), text, fill="black")
+    else:
+        draw.text((20, 10), text, fill="black", font=font or atlas.font)
+    return img
+
+
+@pytest.mark.benchmark(group="text-line")
+@pytest.mark.parametrize("use_atlas", [False, True], ids=["draw.text", "atlas"])
+def test_text_line(benchmark, atlas, use_atlas):
+    benchmark(draw_line, atlas, TEXTS["long"], use_atlas)
+
+
+def test_atlas_pixel_identical(atlas, font):
+    """Атлас рисует и меряет весь корпус так же, как draw.text / textbbox шрифтом с раскладкой по умолчанию"""
+    from PIL import Image, ImageDraw
+
+    measure = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    for text in botst.load_affirmations():
+        assert draw_line(atlas, text, True).tobytes() == draw_line(atlas, text, False, font).tobytes(), text
+        assert atlas.bbox(text) == measure.textbbox((0, 0), text, font=font), text
+
+
+def test_atlas_follows_default_layout(atlas, font):
+    """Быстрый путь — только там, где draw.text и так раскладывает базово; с raqm (кернинг из GPOS) — выключен"""
+    from PIL import ImageFont
+
+    from glyphs import GlyphAtlas
+
+    assert atlas.enabled == (font.layout_engine == ImageFont.Layout.BASIC)
+    raqm = ImageFont.truetype(FONT_PATH, 60, layout_engine=ImageFont.Layout.BASIC)
+    raqm.layout_engine = ImageFont.Layout.RAQM     # как в сборке Pillow с raqm; рисовать им здесь не нужно
+    assert not GlyphAtlas(raqm).enabled
+    basic = ImageFont.truetype(FONT_PATH, 60, layout_engine=ImageFont.Layout.BASIC)
+    assert not GlyphAtlas(basic, raqm).enabled
+
+
+def test_atlas_fallback(atlas):
+    """Строки с шейпингом уходят в draw.text шрифтом по умолчанию"""
+    from PIL import Image, ImageDraw
+
+    text = "שלום мир"
+    assert not atlas.supports(text)
+
+    def draw(use_atlas):
+        img = Image.new("RGB", (600, 100), color=(230, 210, 220))
+        if use_atlas:
+            atlas.draw(ImageDraw.Draw(img), (20, 10), text, fill="black")
+        else:
+            ImageDraw.Draw(img).text((20, 10), text, fill="black", font=atlas.shaping_font)
+        return img.tobytes()
+
+    assert draw(True) == draw(False)
+    assert atlas.bbox(text) == atlas.shaping_font.getbbox(text)
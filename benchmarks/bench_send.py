@@ -0,0 +1,185 @@
+"""Полный путь отправки: выбор, рендер, «загрузка» в фейковый Bot"""
+import asyncio
+import threading
+import time
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendPhoto
+
+from singleflight import SingleFlight, settle
+from support import FakeBot, botst
+
+
+class RejectingBot(FakeBot):
+    """FakeBot, который отвечает Bad Request: на отправку по file_id (всем или из rejected) или в чаты из broken"""
+
+    def __init__(self, file_id_error=None, broken=(), rejected=None):
+        super().__init__()
+        self.file_id_error = file_id_error
+        self.broken = broken
+        self.rejected = rejected
+
+    async def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        if isinstance(photo, str) and self.file_id_error and (self.rejected is None or photo in self.rejected):
+            raise TelegramBadRequest(SendPhoto(chat_id=chat_id, photo=photo), self.file_id_error)
+        if chat_id in self.broken:
+            await asyncio.sleep(0.1)        # все ждущие успевают присоединиться к этой загрузке
+            raise TelegramBadRequest(SendPhoto(chat_id=chat_id, photo="-"), "Bad Request: chat not found")
+        return await super().send_photo(chat_id, photo, caption, **kwargs)
+
+
+@pytest.mark.benchmark(group="send")
+@pytest.mark.parametrize("corpus", [500], indirect=True, ids=["n=500"])
+def test_send_affirmation(benchmark, corpus, fake_bot, run):
+    benchmark(lambda: run(botst.send_affirmation()))
+
+    # send_affirmation глотает исключения — проверяем, что каждая итерация дошла до Bot
+    assert fake_bot.sent
+    assert all(chat_id == botst.CHANNEL_ID for chat_id, _, _ in fake_bot.sent)
+
+
+@pytest.mark.benchmark(group="send-coalesced")
+def test_concurrent_sends_coalesce(benchmark, data_dir, fake_bot, run):
+    """Десять одновременных отправок одной неотрендеренной картинки: один рендер, одна загрузка"""
+    run(botst.init_db())
+    aff = {"id": 7, "image_id": 7, "text": botst.load_affirmations()[6]}
+    misses = []
+
+    async def burst():
+        return await asyncio.gather(*(botst.send_affirmation_photo(f"@chat_{i}", aff, "✨") for i in range(10)))
+
+    def setup():
+        (botst.IMAGES_DIR / "7.png").unlink(missing_ok=True)
+        run(botst.set_photo_file_id(7, None))
+        fake_bot.sent.clear()
+        misses.append(botst.IMAGE_CACHE.value(result="miss"))
+        return (burst(),), {}
+
+    messages = benchmark.pedantic(run, setup=setup, rounds=5)
+
+    assert botst.IMAGE_CACHE.value(result="miss") - misses[-1] == 1
+    assert len(fake_bot.sent) == 10
+    assert sum(1 for _, size, _ in fake_bot.sent if size) == 1
+    assert len({m.photo[-1].file_id for m in messages}) == 1
+
+
+def test_single_flight_errors(run):
+    """Ошибка и таймаут общей операции достаются всем ждущим; после неё ключ свободен"""
+    flights = SingleFlight(timeout=0.05)
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0)
+        raise ValueError("render failed")
+
+    async def stuck():
+        calls.append(1)
+        await asyncio.sleep(10)
+
+    async def burst(operation):
+        return await asyncio.gather(*(flights.run("key", operation) for _ in range(5)), return_exceptions=True)
+
+    errors = run(burst(failing))
+    assert len(calls) == 1 and all(isinstance(e, ValueError) for e in errors)
+    errors = run(burst(stuck))
+    assert len(calls) == 2 and all(isinstance(e, TimeoutError) for e in errors)
+    assert not flights.in_flight("key")
+
+
+def test_single_flight_keeps_key_until_thread_ends(run):
+    """Таймаут отпускает ждущих, но второй рендер не начинается, пока поток первого не закончил"""
+    flights = SingleFlight(timeout=0.05)
+    release = threading.Event()
+    calls = []
+
+    def render():
+        calls.append(1)
+        release.wait(5)
+        return "done"
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        operation = lambda: settle(loop.run_in_executor(None, render))
+        started = time.perf_counter()
+        errors = await asyncio.gather(*(flights.run("key", operation) for _ in range(3)), return_exceptions=True)
+        waited = time.perf_counter() - started
+        assert flights.in_flight("key")
+        with pytest.raises(TimeoutError):
+            await flights.run("key", operation)
+        release.set()
+        while flights.in_flight("key"):
+            await asyncio.sleep(0.01)
+        return errors, waited, await flights.run("key", operation)
+
+    errors, waited, result = run(scenario())
+    assert all(isinstance(e, TimeoutError) for e in errors) and waited < 1
+    assert len(calls) == 2 and result == "done"
+
+
+@pytest.fixture
+def image_7(data_dir, run):
+    run(botst.init_db())
+    return {"id": 7, "image_id": 7, "text": botst.load_affirmations()[6]}
+
+
+@pytest.mark.parametrize("error", ["Bad Request: wrong file identifier/HTTP URL specified", "Bad Request: file reference expired"])
+def test_stale_file_id_reuploads(image_7, run, monkeypatch, error):
+    monkeypatch.setattr(botst, "bot", RejectingBot(file_id_error=error))
+    run(botst.set_photo_file_id(7, "stale"))
+
+    message = run(botst.send_affirmation_photo("@chat", image_7, "✨"))
+    assert run(botst.get_photo_file_id(7)) == message.photo[-1].file_id != "stale"
+
+
+def test_stale_file_id_single_upload(image_7, run, monkeypatch):
+    """Одновременные отправки с устаревшим file_id: загружает одна, остальные и опоздавшие — по новому file_id"""
+    monkeypatch.setattr(botst, "bot", RejectingBot(file_id_error="Bad Request: file reference expired", rejected={"stale"}))
+    run(botst.set_photo_file_id(7, "stale"))
+
+    async def burst():
+        return await asyncio.gather(*(botst.send_affirmation_photo(f"@chat_{i}", image_7, "✨") for i in range(5)))
+
+    messages = run(burst())
+    fresh = run(botst.get_photo_file_id(7))
+    assert fresh != "stale" and {m.photo[-1].file_id for m in messages} == {fresh}
+
+    # Процесс, не заметивший перезагрузки, не стирает новый file_id и не грузит картинку ещё раз
+    botst.photo_file_ids[7] = "stale"
+    late = run(botst.send_affirmation_photo("@late", image_7, "✨"))
+    assert late.photo[-1].file_id == run(botst.get_photo_file_id(7)) == fresh
+    assert sum(1 for _, size, _ in botst.bot.sent if size) == 1
+
+
+def test_other_bad_request_keeps_file_id(image_7, run, monkeypatch):
+    """Ошибка не про file_id уходит вызывающему, file_id остаётся"""
+    monkeypatch.setattr(botst, "bot", RejectingBot(file_id_error="Bad Request: message caption is too long"))
+    run(botst.set_photo_file_id(7, "valid"))
+
+    with pytest.raises(TelegramBadRequest, match="caption"):
+        run(botst.send_affirmation_photo("@chat", image_7, "✨"))
+    assert run(botst.get_photo_file_id(7)) == "valid"
+    assert not botst.bot.sent
+
+
+def test_shared_upload_failure_falls_back(image_7, run, monkeypatch):
+    """Общая загрузка ушла в сломанный чат — картинку заново загружает один из ждущих, остальные берут его file_id"""
+    monkeypatch.setattr(botst, "bot", RejectingBot(broken={"@broken"}))
+    run(botst.set_photo_file_id(7, None))
+
+    async def burst():
+        # Общую загрузку ведёт именно сломанный чат
+        first = asyncio.ensure_future(botst.send_affirmation_photo("@broken", image_7, "✨"))
+        while not botst.upload_flights.in_flight(7):
+            await asyncio.sleep(0)
+        return await asyncio.gather(
+            first, *(botst.send_affirmation_photo(chat, image_7, "✨") for chat in ("@one", "@two")),
+            return_exceptions=True,
+        )
+
+    broken, *messages = run(burst())
+    assert isinstance(broken, TelegramBadRequest)
+    assert all(m.photo[-1].file_id.startswith("fake-file-") for m in messages)
+    assert sorted(chat for chat, _, _ in botst.bot.sent) == ["@one", "@two"]
+    assert sum(1 for _, size, _ in botst.bot.sent if size) == 1
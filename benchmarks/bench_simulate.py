@@ -0,0 +1,28 @@
+"""Расписание на виртуальных часах: месяцы постинга, повторы, круги и кэш картинок"""
+from datetime import datetime
+
+import pytest
+import pytz
+
+from simulate import run_simulation
+
+START = pytz.utc.localize(datetime(2027, 3, 1))
+
+
+@pytest.mark.benchmark(group="simulate")
+def test_simulate_schedule(benchmark, data_dir, run):
+    report = benchmark.pedantic(
+        lambda: run(run_simulation(days=120, times=("09:00", "21:00"), channels=2, channel_size=30, tz_name="Europe/Berlin", start=START)),
+        rounds=1,
+        iterations=1,
+    )
+
+    benchmark.extra_info.update({key: report[key] for key in ("posts", "posts_per_second", "simulated_days_per_second")})
+    assert report["slots"] == report["posts"] == 2 * 2 * 120
+    assert report["errors"] == 0
+    assert report["repeats_in_cycle"] == 0
+    assert report["channels"][2]["cycle_lengths"] == [30] * 7
+    assert all(c["logged_posts"] == c["posts"] and c["mean_delay_s"] == 0 for c in report["channels"].values())
+    # Картинка рендерится и загружается один раз на аффирмацию, дальше уходит по file_id
+    assert report["render"]["misses"] == report["render"]["images_on_disk"] == report["uploads"]["upload"]
+    assert report["uploads"]["upload"] + report["uploads"]["file_id"] == report["posts"]
@@ -0,0 +1,173 @@
+"""
+Проверка кластерного режима: несколько процессов botst.py над одной базой и заглушкой Bot API.
+
+Проверяет, что каждый апдейт обработан ровно одним процессом, измеряет время
+переключения лидера после kill -9 и (с --schedule) что плановый пост в слот
+уходит ровно один раз.
+
+    python benchmarks/cluster_check.py --workers 3 --updates 300 --schedule
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytz
+
+from loadtest import START_USER_BASE, start_update
+from telegram_stub import TelegramStub
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def spawn_workers(count: int, data_dir: Path, api_url: str, lease_ttl: float) -> list[subprocess.Popen]:
+    env = {
+        **os.environ,
+        "BOT_TOKEN": os.environ.get("BOT_TOKEN", "123456:CLUSTER"),
+        "ADMIN_ID": os.environ.get("ADMIN_ID", "1"),
+        "CHANNEL_ID": os.environ.get("CHANNEL_ID", "@cluster_channel"),
+        "CLUSTER_MODE": "1",
+        "DATA_DIR": str(data_dir),
+        "TELEGRAM_API_SERVER": api_url,
+        "METRICS_PORT": "0",
+        "LEASE_TTL": str(lease_ttl),
+    }
+    return [
+        subprocess.Popen(
+            [sys.executable, str(ROOT / "botst.py")],
+            cwd=data_dir, env=env,
+            stdout=open(data_dir / f"worker-{i}.log", "w"), stderr=subprocess.STDOUT,
+        )
+        for i in range(count)
+    ]
+
+
+def leader_pid(db_path: Path) -> int | None:
+    try:
+        with sqlite3.connect(db_path) as db:
+            row = db.execute("SELECT holder, expires_at FROM leases WHERE name = 'leader'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if not row or row[1] < time.time():
+        return None
+    return int(row[0].rsplit(":", 1)[1])
+
+
+async def wait_for(predicate, timeout: float, interval: float = 0.05) -> float | None:
+    """Сколько секунд ждали predicate(); None — не дождались"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if predicate():
+            return time.perf_counter() - started
+        await asyncio.sleep(interval)
+    return None
+
+
+def replies(stub: TelegramStub) -> Counter:
+    return Counter(str(c.params.get("chat_id")) for c in stub.calls if c.method == "sendMessage" and c.status == 200)
+
+
+def push_starts(stub: TelegramStub, first: int, count: int) -> list[str]:
+    users = [START_USER_BASE + i for i in range(first, first + count)]
+    for user_id in users:
+        stub.push_update(start_update(user_id))
+    return [str(user_id) for user_id in users]
+
+
+async def check_updates(stub: TelegramStub, count: int, timeout: float) -> dict:
+    users = push_starts(stub, 0, count)
+    elapsed = await wait_for(lambda: all(replies(stub)[u] for u in users), timeout)
+    await asyncio.sleep(1)      # дать шанс проявиться повторным ответам
+    answered = replies(stub)
+    return {
+        "sent": count,
+        "answered": sum(1 for u in users if answered[u]),
+        "duplicates": sum(1 for u in users if answered[u] > 1),
+        "elapsed_s": round(elapsed, 3) if elapsed is not None else None,
+    }
+
+
+async def check_failover(stub: TelegramStub, workers: list[subprocess.Popen], db_path: Path, timeout: float) -> dict:
+    pid = leader_pid(db_path)
+    victim = next(p for p in workers if p.pid == pid)
+    victim.send_signal(signal.SIGKILL)
+    victim.wait()
+    killed_at = time.perf_counter()
+
+    users = push_starts(stub, 1_000_000, 1)
+    elapsed = await wait_for(lambda: replies(stub)[users[0]] > 0, timeout)
+    new_pid = leader_pid(db_path)
+    return {
+        "killed_leader": pid,
+        "new_leader": new_pid,
+        "failover_s": round(time.perf_counter() - killed_at, 3) if elapsed is not None else None,
+    }
+
+
+async def check_schedule(stub: TelegramStub, db_path: Path, timeout: float) -> dict:
+    """Поставить каналу по умолчанию слот на следующую минуту и посчитать отправки"""
+    with sqlite3.connect(db_path) as db:
+        tz_name = db.execute("SELECT tz_name FROM channels WHERE id = 1").fetchone()[0]
+        slot = datetime.now(pytz.timezone(tz_name)) + timedelta(minutes=1)
+        db.execute("DELETE FROM channel_schedule WHERE channel_id = 1")
+        db.execute("INSERT INTO channel_schedule (channel_id, post_time) VALUES (1, ?)", (slot.strftime("%H:%M"),))
+
+    before = stub.count("sendPhoto")
+    await wait_for(lambda: stub.count("sendPhoto") > before, timeout)
+    await asyncio.sleep(5)      # вдруг отправит и второй процесс
+    return {"slot": slot.strftime("%H:%M"), "posts": stub.count("sendPhoto") - before}
+
+
+async def run(args: argparse.Namespace) -> dict:
+    data_dir = Path(tempfile.mkdtemp(prefix="cluster-"))
+    db_path = data_dir / "affirmations.db"
+    stub = TelegramStub()
+    url = await stub.start()
+    workers = spawn_workers(args.workers, data_dir, url, args.lease_ttl)
+    try:
+        if await wait_for(lambda: leader_pid(db_path), args.timeout) is None:
+            raise RuntimeError(f"Лидер не выбран, логи в {data_dir}")
+        report = {"workers": args.workers, "data_dir": str(data_dir)}
+        report["updates"] = await check_updates(stub, args.updates, args.timeout)
+        if args.schedule:
+            report["schedule"] = await check_schedule(stub, db_path, 90)
+        report["failover"] = await check_failover(stub, workers, db_path, args.lease_ttl * 3 + args.timeout)
+        return report
+    finally:
+        for worker in workers:
+            if worker.poll() is None:
+                worker.terminate()
+        for worker in workers:
+            worker.wait()
+        await stub.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка кластерного режима против заглушки Bot API")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--updates", type=int, default=300)
+    parser.add_argument("--lease-ttl", type=float, default=3.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--schedule", action="store_true", help="проверить плановый пост (ждёт до двух минут)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    ok = report["updates"]["answered"] == report["updates"]["sent"] and not report["updates"]["duplicates"]
+    ok = ok and report["failover"]["failover_s"] is not None
+    if "schedule" in report:
+        ok = ok and report["schedule"]["posts"] == 1
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
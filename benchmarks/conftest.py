@@ -0,0 +1,105 @@
+"""
+Общие фикстуры бенчмарков.
+
+Запуск (без сети, Telegram не нужен):
+
+    pip install -r requirements-dev.txt
+    pytest benchmarks --benchmark-json=bench.json
+    pytest benchmarks --benchmark-compare          # сравнить с прошлым прогоном
+
+Каждый прогон автоматически сохраняется в .benchmarks/ (JSON), так что
+между версиями можно сравнивать через --benchmark-compare / --benchmark-compare-fail.
+"""
+import asyncio
+import shutil
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from support import FakeBot, botst, close_loop, use_data_dir
+
+CORPUS_SIZES = [500, 50_000, 500_000]
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    close_loop(loop)
+
+
+@pytest.fixture
+def run(loop):
+    """Синхронный запуск корутины — benchmark умеет мерить только обычные функции"""
+    return loop.run_until_complete
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Изолированный DATA_DIR и шрифт из репозитория вместо /app; журнал отправок — свой на тест"""
+    from postlog import PostLog
+
+    for name in ("DATA_DIR", "DB_PATH", "IMAGES_DIR", "FONT_PATH"):
+        monkeypatch.setattr(botst, name, getattr(botst, name))
+    # Иначе записи, не дописанные одним тестом, попадут в базу следующего
+    monkeypatch.setattr(botst, "post_log", PostLog(botst.connect_db, botst.POST_LOG_BATCH, botst.POST_LOG_FLUSH))
+    use_data_dir(tmp_path)
+    return tmp_path
+
+
+def build_corpus(path: Path, size: int):
+    """База с size аффирмациями: init_db заполняет первые 500, остальное — повтор текстов"""
+    old_db_path = botst.DB_PATH
+    botst.DB_PATH = path
+    try:
+        asyncio.run(botst.init_db())
+    finally:
+        botst.DB_PATH = old_db_path
+
+    texts = botst.load_affirmations()
+    # closing: база в WAL, строки попадут в основной файл только при закрытии соединения
+    with closing(sqlite3.connect(path)) as db, db:
+        db.executemany(
+            "INSERT INTO affirmations (id, text, image_id, used) VALUES (?, ?, ?, 0)",
+            ((i, texts[(i - 1) % len(texts)], i) for i in range(len(texts) + 1, size + 1))
+        )
+        db.execute(
+            "INSERT INTO channel_affirmations (channel_id, affirmation_id) SELECT ?, id FROM affirmations WHERE id > ?",
+            (botst.DEFAULT_CHANNEL_ID, len(texts))
+        )
+        db.execute(
+            "UPDATE channel_stats SET total = (SELECT COUNT(*) FROM channel_affirmations WHERE channel_id = ?) "
+            "WHERE channel_id = ?",
+            (botst.DEFAULT_CHANNEL_ID, botst.DEFAULT_CHANNEL_ID)
+        )
+
+
+@pytest.fixture(scope="session")
+def corpus_cache(tmp_path_factory):
+    """Готовые базы по размерам — 500k строк строим один раз за сессию"""
+    built = {}
+
+    def get(size: int) -> Path:
+        if size not in built:
+            path = tmp_path_factory.mktemp("corpus") / f"corpus_{size}.db"
+            build_corpus(path, size)
+            built[size] = path
+        return built[size]
+
+    return get
+
+
+@pytest.fixture(params=CORPUS_SIZES, ids=lambda n: f"n={n}")
+def corpus(request, data_dir, corpus_cache):
+    """Свежая копия базы нужного размера в DB_PATH"""
+    shutil.copyfile(corpus_cache(request.param), botst.DB_PATH)
+    return request.param
+
+
+@pytest.fixture
+def fake_bot(monkeypatch):
+    fake = FakeBot()
+    monkeypatch.setattr(botst, "bot", fake)
+    return fake
@@ -0,0 +1,227 @@
+"""
+Сквозной нагрузочный прогон против локальной заглушки Bot API.
+
+Гоняет тысячи синтетических апдейтов через botst.dp (обычный polling через
+getUpdates заглушки) и залп «плановых» send_affirmation, затем печатает
+p50/p99 задержки и пропускную способность. Сеть не нужна.
+
+    python benchmarks/loadtest.py --updates 5000 --sends 300 --latency 0.02 --rate-429 0.01
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from support import botst, use_data_dir
+from telegram_stub import StubConfig, TelegramStub, parse_stub_args, stub_config
+
+START_USER_BASE = 10_000_000
+# Если очередь выбрана, а новых ответов нет столько секунд — остальные уже не придут (429/500)
+IDLE_TIMEOUT = 5.0
+
+
+def percentiles(samples: list[float]) -> dict:
+    """p50/p99/max в миллисекундах"""
+    if not samples:
+        return {"p50_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return {
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p99_ms": round(p99 * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def callback_update(data: str) -> dict:
+    admin = {"id": botst.ADMIN_ID, "is_bot": False, "first_name": "Admin"}
+    return {
+        "callback_query": {
+            "id": "",
+            "from": admin,
+            "chat_instance": "loadtest",
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": botst.ADMIN_ID, "type": "private"},
+                "text": "panel",
+            },
+        }
+    }
+
+
+def start_update(user_id: int) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": "User"}
+    return {
+        "message": {
+            "message_id": user_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": user,
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        }
+    }
+
+
+def push_updates(stub: TelegramStub, count: int, callbacks: tuple[str, ...]) -> dict:
+    """
+    Наполнить очередь апдейтов: чередуем callback-кнопки админки и /start от разных
+    пользователей. Возвращает ключ ответа -> update_id для сопоставления задержек.
+    """
+    expected = {}
+    for i in range(count):
+        if i % 2:
+            user_id = START_USER_BASE + i
+            update_id = stub.push_update(start_update(user_id))
+            expected[("sendMessage", str(user_id))] = update_id
+        else:
+            payload = callback_update(callbacks[(i // 2) % len(callbacks)])
+            update_id = stub.push_update(payload)
+            # id колбэка = update_id, чтобы найти его answerCallbackQuery
+            stub.updates[-1]["callback_query"]["id"] = str(update_id)
+            expected[("answerCallbackQuery", str(update_id))] = update_id
+    return expected
+
+
+def match_replies(stub: TelegramStub, expected: dict) -> list[float]:
+    latencies = []
+    for call in stub.calls:
+        if call.status != 200:
+            continue
+        if call.method == "sendMessage":
+            key = (call.method, str(call.params.get("chat_id")))
+        elif call.method == "answerCallbackQuery":
+            key = (call.method, str(call.params.get("callback_query_id")))
+        else:
+            continue
+        update_id = expected.pop(key, None)
+        if update_id is not None:
+            latencies.append(call.at - stub.pushed_at[update_id])
+    return latencies
+
+
+async def drive_updates(stub: TelegramStub, bot: Bot, count: int, callbacks: tuple[str, ...], timeout: float) -> dict:
+    pending = push_updates(stub, count, callbacks)
+    started = time.perf_counter()
+
+    polling = asyncio.create_task(
+        botst.dp.start_polling(bot, handle_signals=False, close_bot_session=False, polling_timeout=1)
+    )
+    latencies = []
+    deadline = started + timeout
+    last_progress = started
+    while pending and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+        matched = match_replies(stub, pending)
+        now = time.perf_counter()
+        if matched:
+            latencies += matched
+            last_progress = now
+        elif not stub.updates and now - last_progress > IDLE_TIMEOUT:
+            break
+        # сопоставленные ответы больше не нужны — не перебираем их на каждом шаге
+        stub.calls = [c for c in stub.calls if c.method not in ("sendMessage", "answerCallbackQuery")]
+    elapsed = last_progress - started
+
+    await botst.dp.stop_polling()
+    await polling
+
+    return {
+        "sent": count,
+        "handled": len(latencies),
+        "unanswered": len(pending),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(latencies) / elapsed, 1) if elapsed else None,
+        **percentiles(latencies),
+    }
+
+
+async def flood_sends(stub: TelegramStub, count: int) -> dict:
+    """Залп плановых отправок, как если бы одновременно сработали count cron-задач"""
+    latencies = []
+
+    async def timed_send():
+        t0 = time.perf_counter()
+        await botst.send_affirmation()
+        latencies.append(time.perf_counter() - t0)
+
+    before = stub.count("sendPhoto")
+    started = time.perf_counter()
+    await asyncio.gather(*(timed_send() for _ in range(count)))
+    elapsed = time.perf_counter() - started
+    delivered = stub.count("sendPhoto") - before
+
+    return {
+        "sent": count,
+        "delivered": delivered,
+        "failed": count - delivered,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(delivered / elapsed, 1) if elapsed else None,
+        **percentiles(latencies),
+    }
+
+
+async def run_load(
+    updates: int = 2000,
+    sends: int = 100,
+    config: StubConfig | None = None,
+    callbacks: tuple[str, ...] = ("status", "reload"),
+    timeout: float = 120.0,
+) -> dict:
+    """
+    Поднять заглушку, направить на неё Bot через кастомный API-сервер и прогнать нагрузку.
+    Используется текущий botst.DB_PATH; база инициализируется при необходимости.
+    """
+    stub = TelegramStub(config)
+    url = await stub.start()
+    bot = Bot(token=botst.BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    original_bot = botst.bot
+    botst.bot = bot
+    try:
+        await botst.init_db()
+        report = {
+            "stub": {"latency": stub.config.latency, "rate_429": stub.config.rate_429, "error_rate": stub.config.error_rate},
+            "updates": await drive_updates(stub, bot, updates, callbacks, timeout),
+            "sends": await flood_sends(stub, sends),
+        }
+        report["stub"]["responses_429"] = stub.count(status=429)
+        report["stub"]["responses_500"] = stub.count(status=500)
+        return report
+    finally:
+        botst.bot = original_bot
+        await bot.session.close()
+        await stub.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота против заглушки Bot API")
+    parser.add_argument("--updates", type=int, default=2000, help="сколько апдейтов прогнать через dp")
+    parser.add_argument("--sends", type=int, default=100, help="сколько одновременных send_affirmation")
+    parser.add_argument("--timeout", type=float, default=120.0, help="сколько ждать ответов на апдейты, сек")
+    parser.add_argument("--json", type=Path, help="сохранить отчёт в JSON")
+    parser.add_argument("--log-level", default="WARNING")
+    parse_stub_args(parser)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level)
+    use_data_dir(Path(tempfile.mkdtemp(prefix="loadtest-")))
+
+    report = asyncio.run(run_load(args.updates, args.sends, stub_config(args), timeout=args.timeout))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.json:
+        args.json.write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
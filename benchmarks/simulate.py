@@ -0,0 +1,306 @@
+"""
+Прогон расписания на виртуальных часах: год постинга за секунды.
+
+Берёт задачи, которые load_schedule ставит в планировщик (те же cron-триггеры с
+поясами каналов), и вместо ожидания перематывает часы к ближайшему срабатыванию.
+Дальше всё настоящее: claim_post, выбор аффирмации, рендер и кэш картинок, подпись;
+вместо Telegram — FakeBot. В конце — повторы внутри круга, длины кругов, минимальный
+интервал между повторами одной аффирмации, поведение кэша картинок, сверка
+дневных сводок журнала отправок и пропускная способность.
+
+    python benchmarks/simulate.py --days 365 --times 09:00,15:00,21:00
+    python benchmarks/simulate.py --days 365 --channels 3 --channel-size 120 --tz Asia/Tokyo
+    python benchmarks/simulate.py --db /app/data/affirmations.db --days 90   # копия боевой базы и её расписание
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytz
+
+from support import FakeBot, botst, use_data_dir
+
+DEFAULT_TIMES = ("09:00", "15:00", "21:00")
+
+
+class VirtualClock:
+    """Текущее время симуляции (aware, UTC)"""
+
+    def __init__(self, start: datetime):
+        self.utc = start.astimezone(pytz.utc)
+
+    def set(self, moment: datetime):
+        self.utc = moment.astimezone(pytz.utc)
+
+    def now(self, tz=None) -> datetime:
+        if tz is None:
+            return self.utc.astimezone().replace(tzinfo=None)
+        return self.utc.astimezone(tz)
+
+
+@contextmanager
+def virtual_time(clock: VirtualClock):
+    """datetime.now() внутри botst отдаёт время симуляции"""
+
+    class VirtualDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock.now(tz)
+
+    original = botst.datetime
+    botst.datetime = VirtualDatetime
+    try:
+        yield
+    finally:
+        botst.datetime = original
+
+
+class Recorder:
+    """Обёртки выбора и рендера: что отправлено, когда и сколько это стоило"""
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.picks = []                         # (канал, аффирмация, круг, время симуляции)
+        self.pick_seconds = []
+        self.render_seconds = {"hit": [], "miss": []}
+
+    @contextmanager
+    def installed(self):
+        get_next_affirmation = botst.get_next_affirmation
+        get_affirmation_photo = botst.get_affirmation_photo
+
+        async def recorded_pick(channel_id: int = botst.DEFAULT_CHANNEL_ID) -> dict:
+            started = time.perf_counter()
+            aff = await get_next_affirmation(channel_id)
+            self.pick_seconds.append(time.perf_counter() - started)
+            channel = await botst.get_channel(channel_id)
+            self.picks.append((channel_id, aff["id"], channel["cycle"], self.clock.utc))
+            return aff
+
+        async def recorded_render(aff_id: int, aff_text: str) -> str:
+            hit = (botst.IMAGES_DIR / f"{aff_id}.png").exists()
+            started = time.perf_counter()
+            path = await get_affirmation_photo(aff_id, aff_text)
+            self.render_seconds["hit" if hit else "miss"].append(time.perf_counter() - started)
+            return path
+
+        botst.get_next_affirmation = recorded_pick
+        botst.get_affirmation_photo = recorded_render
+        try:
+            yield self
+        finally:
+            botst.get_next_affirmation = get_next_affirmation
+            botst.get_affirmation_photo = get_affirmation_photo
+
+
+async def configure(times: tuple[str, ...] | None, channels: int, channel_size: int | None, tz_name: str | None):
+    """Расписание симуляции: times для всех каналов и channels-1 дополнительных каналов"""
+    await botst.init_db()
+    async with botst.connect_db() as db:
+        if tz_name:
+            await db.execute("UPDATE channels SET tz_name = ?", (tz_name,))
+        if times:
+            await db.execute("DELETE FROM channel_schedule WHERE channel_id = ?", (botst.DEFAULT_CHANNEL_ID,))
+            await db.executemany(
+                "INSERT INTO channel_schedule (channel_id, post_time) VALUES (?, ?)",
+                ((botst.DEFAULT_CHANNEL_ID, t) for t in times)
+            )
+        await db.commit()
+
+    for i in range(2, channels + 1):
+        channel_id = await botst.create_channel(f"@sim_channel_{i}", tz_name or botst.TZ_NAME, 1, channel_size)
+        async with botst.connect_db() as db:
+            await db.executemany(
+                "INSERT INTO channel_schedule (channel_id, post_time) VALUES (?, ?)",
+                ((channel_id, t) for t in times or DEFAULT_TIMES)
+            )
+            await db.commit()
+
+
+def next_fire(job, after: datetime) -> datetime | None:
+    """Ближайшее срабатывание cron-задачи строго после after"""
+    return job.trigger.get_next_fire_time(None, after + timedelta(seconds=1))
+
+
+def channel_report(picks: list, total: int) -> dict:
+    """Повторы внутри круга, длины завершённых кругов и минимальный интервал между повторами"""
+    per_cycle = Counter((cycle, aff_id) for aff_id, cycle, _ in picks)
+    cycles = Counter(cycle for aff_id, cycle, _ in picks)
+    last_seen = {}
+    gaps = []
+    for aff_id, _, moment in picks:
+        if aff_id in last_seen:
+            gaps.append((moment - last_seen[aff_id]).total_seconds() / 86400)
+        last_seen[aff_id] = moment
+
+    ordered = sorted(cycles)
+    return {
+        "posts": len(picks),
+        "corpus": total,
+        "repeats_in_cycle": sum(count - 1 for count in per_cycle.values() if count > 1),
+        # Последний круг может быть не дописан — в длины идут только завершённые
+        "cycle_lengths": [cycles[cycle] for cycle in ordered[:-1]],
+        "current_cycle_posts": cycles[ordered[-1]] if ordered else 0,
+        "unique_affirmations": len(last_seen),
+        "min_repeat_gap_days": round(min(gaps), 2) if gaps else None,
+    }
+
+
+def timing(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    result = {"count": len(samples), "mean_ms": round(statistics.fmean(samples) * 1000, 3)}
+    if len(samples) >= 2:
+        quantiles = statistics.quantiles(samples, n=100)
+        result["p50_ms"] = round(quantiles[49] * 1000, 3)
+        result["p99_ms"] = round(quantiles[98] * 1000, 3)
+    return result
+
+
+async def simulate(days: int, start: datetime) -> dict:
+    """
+    Прогнать расписание из базы (botst.DB_PATH) на days суток от start.
+    Используется текущий botst.scheduler: задачи ставит load_schedule, сам планировщик не запускается.
+    """
+    clock = VirtualClock(start)
+    fake_bot = FakeBot()
+    original_bot = botst.bot
+    botst.bot = fake_bot
+    errors_before = botst.POSTS.value(result="error")
+    uploads_before = {result: botst.PHOTO_UPLOADS.value(result=result) for result in ("upload", "file_id", "shared")}
+    try:
+        await botst.load_schedule()
+        jobs = [job for job in botst.scheduler.get_jobs() if job.id.startswith("post_")]
+        end = clock.utc + timedelta(days=days)
+        fires = {job.id: next_fire(job, clock.utc - timedelta(seconds=1)) for job in jobs}
+
+        recorder = Recorder(clock)
+        slots = 0
+        post_seconds = []
+        started = time.perf_counter()
+        with virtual_time(clock), recorder.installed():
+            while jobs:
+                job = min(jobs, key=lambda j: fires[j.id] or end)
+                fire = fires[job.id]
+                if fire is None or fire >= end:
+                    break
+                clock.set(fire)
+                slots += 1
+                post_started = time.perf_counter()
+                await job.func(*job.args)
+                post_seconds.append(time.perf_counter() - post_started)
+                fires[job.id] = next_fire(job, fire)
+            await botst.post_log.flush()
+        wall = time.perf_counter() - started
+    finally:
+        botst.bot = original_bot
+        for job in botst.scheduler.get_jobs():
+            if job.id.startswith("post_"):
+                job.remove()
+
+    by_channel = defaultdict(list)
+    for channel_id, aff_id, cycle, moment in recorder.picks:
+        by_channel[channel_id].append((aff_id, cycle, moment))
+    channels = {}
+    for channel_id, picks in sorted(by_channel.items()):
+        total = (await botst.get_channel_stats(channel_id))["total"]
+        channels[channel_id] = channel_report(picks, total)
+        # Сводки post_daily должны сойтись с тем, что реально ушло в FakeBot
+        logged = await botst.post_log.totals(channel_id, start.date().isoformat())
+        channels[channel_id]["logged_posts"] = logged["posts"]
+        channels[channel_id]["mean_delay_s"] = round(logged["delay_s"], 3)
+
+    hits, misses = len(recorder.render_seconds["hit"]), len(recorder.render_seconds["miss"])
+    images = list(botst.IMAGES_DIR.glob("*.png"))
+    posts = len(fake_bot.sent)
+    return {
+        "days": days,
+        "start": start.isoformat(),
+        "jobs": len(jobs),
+        "slots": slots,
+        "posts": posts,
+        "missed_slots": slots - posts,
+        "errors": int(botst.POSTS.value(result="error") - errors_before),
+        "repeats_in_cycle": sum(c["repeats_in_cycle"] for c in channels.values()),
+        "channels": channels,
+        "render": {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+            "hit": timing(recorder.render_seconds["hit"]),
+            "miss": timing(recorder.render_seconds["miss"]),
+            "images_on_disk": len(images),
+            "disk_mb": round(sum(p.stat().st_size for p in images) / 1024 / 1024, 2),
+        },
+        # Картинка загружается один раз, дальше уходит по file_id без рендера
+        "uploads": {
+            result: int(botst.PHOTO_UPLOADS.value(result=result) - before)
+            for result, before in uploads_before.items()
+        },
+        "pick": timing(recorder.pick_seconds),
+        "post": timing(post_seconds),
+        "wall_seconds": round(wall, 3),
+        "posts_per_second": round(posts / wall, 1) if wall else None,
+        "simulated_days_per_second": round(days / wall, 1) if wall else None,
+    }
+
+
+async def run_simulation(
+    days: int = 365,
+    times: tuple[str, ...] | None = DEFAULT_TIMES,
+    channels: int = 1,
+    channel_size: int | None = None,
+    tz_name: str | None = None,
+    start: datetime | None = None,
+) -> dict:
+    """Настроить каналы и расписание в текущей botst.DB_PATH и прогнать симуляцию"""
+    await configure(times, channels, channel_size, tz_name)
+    start = start or pytz.utc.localize(datetime.combine(datetime.now().date(), datetime.min.time()))
+    return await simulate(days, start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Год постинга на виртуальных часах")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--times", help="времена постинга через запятую (по умолчанию %s; с --db — расписание базы)" % ",".join(DEFAULT_TIMES))
+    parser.add_argument("--channels", type=int, default=1, help="сколько каналов (дополнительные — с тем же расписанием)")
+    parser.add_argument("--channel-size", type=int, help="корпус дополнительных каналов: аффирмации 1..N")
+    parser.add_argument("--tz", help="пояс всех каналов")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="начало симуляции, ISO (без пояса — UTC)")
+    parser.add_argument("--db", type=Path, help="прогнать копию этой базы (оригинал не меняется)")
+    parser.add_argument("--seed", type=int, help="зерно random для воспроизводимого выбора")
+    parser.add_argument("--json", type=Path, help="сохранить отчёт в JSON")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(args.log_level)
+    if args.seed is not None:
+        random.seed(args.seed)
+    use_data_dir(Path(tempfile.mkdtemp(prefix="simulate-")))
+    if args.db:
+        from backup import copy_database
+
+        copy_database(args.db, botst.DB_PATH)
+    times = tuple(t.strip() for t in args.times.split(",")) if args.times else (None if args.db else DEFAULT_TIMES)
+    start = args.start
+    if start is not None and start.tzinfo is None:
+        start = pytz.utc.localize(start)
+
+    report = asyncio.run(run_simulation(args.days, times, args.channels, args.channel_size, args.tz, start))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.json:
+        args.json.write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
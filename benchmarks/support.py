@@ -0,0 +1,61 @@
+"""Импорт botst без реального окружения и общие заглушки для бенчмарков и нагрузочных прогонов"""
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+os.environ.setdefault("ADMIN_ID", "1")
+os.environ.setdefault("CHANNEL_ID", "@bench_channel")
+
+# botst создаёт DATA_DIR при импорте — делаем это во временной папке, а не в репозитории
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix="bench-import-"))
+try:
+    import botst
+finally:
+    os.chdir(_cwd)
+
+
+class FakeBot:
+    """Заглушка aiogram.Bot: читает файл, как при загрузке, запоминает отправки и отвечает подобием Message"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        message_id = len(self.sent) + 1
+        if isinstance(photo, str):
+            # Повторная отправка по file_id — файл не загружается
+            self.sent.append((chat_id, 0, caption))
+            file_id = photo
+        else:
+            data = Path(photo.path).read_bytes()
+            self.sent.append((chat_id, len(data), caption))
+            file_id = f"fake-file-{message_id}"
+        return SimpleNamespace(message_id=message_id, photo=[SimpleNamespace(file_id=file_id)])
+
+
+def close_loop(loop):
+    """Закрыть цикл как asyncio.run: сначала отменить оставшиеся фоновые задачи (таймеры журнала отправок)"""
+    pending = asyncio.all_tasks(loop)
+    for task in pending:
+        task.cancel()
+    if pending:
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+    loop.close()
+
+
+def use_data_dir(path: Path):
+    """Перенаправить DATA_DIR/DB_PATH/IMAGES_DIR в path и взять шрифт из репозитория"""
+    images = path / "images"
+    images.mkdir(parents=True, exist_ok=True)
+    botst.DATA_DIR = path
+    botst.DB_PATH = path / "affirmations.db"
+    botst.IMAGES_DIR = images
+    botst.FONT_PATH = str(ROOT / "TTNormsPro-Thin.ttf")
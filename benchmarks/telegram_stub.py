@@ -0,0 +1,237 @@
+"""
+Локальная заглушка Telegram Bot API на aiohttp.
+
+Поддерживает методы, которыми пользуется бот: getMe, getUpdates, sendPhoto,
+sendMediaGroup, answerCallbackQuery, editMessageText, sendMessage.
+Задержка, доля ответов 429 и доля ошибок 500 настраиваются.
+
+Отдельный запуск:
+
+    python benchmarks/telegram_stub.py --port 8081 --latency 0.05 --rate-429 0.01
+    TELEGRAM_API_SERVER=http://127.0.0.1:8081 python botst.py
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+STUB_BOT = {"id": 123456, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}
+CHANNEL_CHAT_ID = -1001234567890
+
+
+@dataclass
+class StubCall:
+    method: str
+    params: dict
+    at: float
+    status: int
+
+
+@dataclass
+class StubConfig:
+    latency: float = 0.0        # базовая задержка ответа, сек
+    jitter: float = 0.0         # случайная добавка 0..jitter, сек
+    rate_429: float = 0.0       # доля ответов Too Many Requests
+    error_rate: float = 0.0     # доля ответов 500
+    retry_after: int = 1
+    seed: int | None = None
+    # getUpdates не ломаем: иначе polling уходит в backoff и мерит уже не бота
+    faultless: set = field(default_factory=lambda: {"getMe", "getUpdates"})
+
+
+class TelegramStub:
+    """Заглушка Bot API: очередь апдейтов для getUpdates и журнал всех вызовов"""
+
+    def __init__(self, config: StubConfig | None = None):
+        self.config = config or StubConfig()
+        self.calls: list[StubCall] = []
+        self.responses = Counter()      # (method, status) -> сколько раз ответили
+        self.updates: list[dict] = []
+        self.pushed_at: dict[int, float] = {}
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self._random = random.Random(self.config.seed)
+        self._runner: web.AppRunner | None = None
+        self.url = None
+
+        self.app = web.Application(client_max_size=50 * 1024 * 1024)
+        self.app.router.add_post("/bot{token}/{method}", self._dispatch)
+        self.app.router.add_get("/bot{token}/{method}", self._dispatch)
+        self._handlers = {
+            "getMe": self._get_me,
+            "getUpdates": self._get_updates,
+            "deleteWebhook": self._true,
+            "sendPhoto": self._send_photo,
+            "sendMediaGroup": self._send_media_group,
+            "answerCallbackQuery": self._true,
+            "editMessageText": self._edit_message_text,
+            "sendMessage": self._send_message,
+        }
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        self._new_updates.set()
+        if self._runner:
+            await self._runner.cleanup()
+
+    def push_update(self, payload: dict) -> int:
+        """Положить апдейт в очередь getUpdates; update_id назначает заглушка"""
+        update_id = next(self._update_ids)
+        self.updates.append({"update_id": update_id, **payload})
+        self.pushed_at[update_id] = time.perf_counter()
+        self._new_updates.set()
+        return update_id
+
+    def count(self, method: str | None = None, status: int = 200) -> int:
+        return sum(n for (m, s), n in self.responses.items() if s == status and method in (None, m))
+
+    async def _dispatch(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._read_params(request)
+
+        delay = self.config.latency + self._random.uniform(0, self.config.jitter)
+        if delay and method != "getUpdates":
+            await asyncio.sleep(delay)
+
+        handler = self._handlers.get(method)
+        if handler is None:
+            return self._reply(method, params, 404, description="Not Found: method not found")
+
+        if method not in self.config.faultless:
+            roll = self._random.random()
+            if roll < self.config.rate_429:
+                return self._reply(
+                    method, params, 429,
+                    description=f"Too Many Requests: retry after {self.config.retry_after}",
+                    parameters={"retry_after": self.config.retry_after},
+                )
+            if roll < self.config.rate_429 + self.config.error_rate:
+                return self._reply(method, params, 500, description="Internal Server Error")
+
+        result = await handler(params)
+        return self._reply(method, params, 200, result=result)
+
+    async def _read_params(self, request: web.Request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        form = await request.post()
+        params = {}
+        for key, value in form.items():
+            if isinstance(value, web.FileField):
+                params[key] = {"filename": value.filename, "size": len(value.file.read())}
+            else:
+                params[key] = value
+        params.update(request.query)
+        return params
+
+    def _reply(self, method: str, params: dict, status: int, **body) -> web.Response:
+        self.calls.append(StubCall(method, params, time.perf_counter(), status))
+        self.responses[method, status] += 1
+        if status == 200:
+            body = {"ok": True, **body}
+        else:
+            body = {"ok": False, "error_code": status, **body}
+        return web.json_response(body, status=status)
+
+    def _message(self, chat_id, **extra) -> dict:
+        try:
+            chat = {"id": int(chat_id), "type": "private"}
+        except (TypeError, ValueError):
+            chat = {"id": CHANNEL_CHAT_ID, "type": "channel", "username": str(chat_id).lstrip("@")}
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": chat,
+            **extra,
+        }
+
+    def _photo(self) -> list[dict]:
+        file_id = f"stub-photo-{next(self._message_ids)}"
+        return [{"file_id": file_id, "file_unique_id": file_id, "width": 800, "height": 600}]
+
+    async def _true(self, params: dict):
+        return True
+
+    async def _get_me(self, params: dict):
+        return STUB_BOT
+
+    async def _get_updates(self, params: dict):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+
+        # Подтверждённые апдейты больше не храним — как и настоящий Telegram
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        if not self.updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:limit]
+
+    async def _send_photo(self, params: dict):
+        return self._message(params.get("chat_id"), photo=self._photo(), caption=params.get("caption"))
+
+    async def _send_media_group(self, params: dict):
+        media = json.loads(params.get("media") or "[]")
+        return [self._message(params.get("chat_id"), media_group_id="stub", photo=self._photo()) for _ in media]
+
+    async def _edit_message_text(self, params: dict):
+        if params.get("inline_message_id"):
+            return True
+        return self._message(params.get("chat_id"), text=params.get("text"), edit_date=int(time.time()))
+
+    async def _send_message(self, params: dict):
+        return self._message(params.get("chat_id"), text=params.get("text"))
+
+
+def parse_stub_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, сек")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, сек")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser
+
+
+def stub_config(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_429=args.rate_429,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+
+async def serve(args: argparse.Namespace):
+    stub = TelegramStub(stub_config(args))
+    url = await stub.start(args.host, args.port)
+    print(f"Telegram Bot API stub: {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = parse_stub_args(argparse.ArgumentParser(description=__doc__.strip().splitlines()[0]))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    asyncio.run(serve(parser.parse_args()))
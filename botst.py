@@ -2,43 +2,168 @@ import asyncio
 import logging
 import os
 import random
-from PIL import Image
-from datetime import datetime, time
+import re
+import signal
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
+from datetime import date, datetime, time, timedelta
 from pathlib import Path
+from time import perf_counter
 
 import aiosqlite
 import pytz
 from aiogram import Bot, Dispatcher, F
-from aiogram.filters import CommandStart, StateFilter
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject, CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message, FSInputFile
+from aiogram.types import BufferedInputFile, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message, FSInputFile, Update
+from apscheduler.events import EVENT_JOB_SUBMITTED
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from dotenv import load_dotenv
-from PIL import Image, ImageDraw, ImageFont
+
+from backup import run_backup
+from cluster import Lease, SQLiteStorage, UpdateQueue
+from logs import setup_logging
+from metrics import HandlerTimingMiddleware, counter, histogram, start_metrics_server
+from postlog import SCHEMA as POST_LOG_SCHEMA, PostLog, PostRecord
+from profiling import MemoryTracer, Profiler, dump_tasks
+from singleflight import SingleFlight, settle
+
+# Отсчёт разбивки времени старта — сразу после импортов. Сами импорты меряются снаружи:
+# python -X importtime botst.py 2> imports.log
+MODULE_STARTED = perf_counter()
 
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_ID = int(os.getenv("ADMIN_ID"))
 CHANNEL_ID = os.getenv("CHANNEL_ID")
+# Свой Bot API сервер (локальный telegram-bot-api или заглушка из benchmarks/telegram_stub.py)
+TELEGRAM_API_SERVER = os.getenv("TELEGRAM_API_SERVER")
+# Локальный HTTP /metrics (Prometheus); METRICS_PORT=0 — выключить
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+# Максимальная длительность сессии профилирования / трассировки памяти, сек
+PROFILE_TIMEOUT = int(os.getenv("PROFILE_TIMEOUT", "120"))
+# Несколько процессов над одной базой: общий FSM, очередь апдейтов, планировщик только у лидера
+CLUSTER_MODE = os.getenv("CLUSTER_MODE") == "1"
+# Срок аренды лидера, сек: за столько же примерно переключается лидер после падения
+LEASE_TTL = float(os.getenv("LEASE_TTL", "10"))
+# Сколько апдейтов из очереди процесс обрабатывает одновременно
+CLUSTER_CONCURRENCY = int(os.getenv("CLUSTER_CONCURRENCY", "32"))
+# Сколько секунд при остановке процесса дать начатым обработчикам апдейтов
+SHUTDOWN_GRACE = float(os.getenv("SHUTDOWN_GRACE", "5"))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+# Ежедневный онлайн-бэкап базы (время в поясе по умолчанию; пусто — выключить) и ротация
+BACKUP_TIME = os.getenv("BACKUP_TIME", "04:00")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+BACKUP_KEEP_WEEKS = int(os.getenv("BACKUP_KEEP_WEEKS", "4"))
+# JSON-лог в DATA_DIR/logs: ротация по размеру; одинаковые INFO-строки — не больше LOG_BURST за LOG_INTERVAL с
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "5"))
+LOG_BURST = int(os.getenv("LOG_BURST", "20"))
+LOG_INTERVAL = float(os.getenv("LOG_INTERVAL", "10"))
+# Журнал отправок: пачка в POST_LOG_BATCH записей или раз в POST_LOG_FLUSH с; сырые записи хранятся
+# POST_LOG_DAYS дней (0 — бессрочно), дневные сводки — всегда
+POST_LOG_BATCH = int(os.getenv("POST_LOG_BATCH", "50"))
+POST_LOG_FLUSH = float(os.getenv("POST_LOG_FLUSH", "5"))
+POST_LOG_DAYS = int(os.getenv("POST_LOG_DAYS", "90"))
+# Предел на рендер одной картинки и на её первую загрузку; одновременные вызовы ждут общий результат
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "30"))
+UPLOAD_TIMEOUT = float(os.getenv("UPLOAD_TIMEOUT", "60"))
+# Часовой пояс по умолчанию; у каждого канала может быть свой
 TZ_NAME = "Europe/Moscow"
 tz = pytz.timezone(TZ_NAME)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
+if TELEGRAM_API_SERVER:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_SERVER))
+    bot = Bot(token=BOT_TOKEN, session=session)
+else:
+    bot = Bot(token=BOT_TOKEN)
+# В кластере состояние админки должно быть видно любому процессу, который получит следующий апдейт
+dp = Dispatcher(storage=SQLiteStorage(lambda: DB_PATH) if CLUSTER_MODE else MemoryStorage())
 scheduler = AsyncIOScheduler(timezone=tz)
 
-DATA_DIR = Path("\app\data")
+# Метрики по этапам: отдаются на /metrics, сводка — на экране статуса
+PICK_SECONDS = histogram("affirmation_pick_seconds", "Этапы выбора аффирмации из БД", ("stage",))
+RENDER_SECONDS = histogram("affirmation_render_seconds", "Этапы рендера картинки", ("stage",))
+IMAGE_CACHE = counter("image_cache_total", "Обращения к кэшу картинок на диске (shared — дождались чужого рендера)", ("result",))
+PHOTO_UPLOADS = counter(
+    "photo_uploads_total", "Отправки фото: upload — загрузка файла, file_id — повторно по file_id, shared — по чужой загрузке", ("result",)
+)
+UPLOAD_SECONDS = histogram("telegram_upload_seconds", "Отправка фото в Bot API", ("method",))
+POSTS = counter("posts_total", "Отправки аффирмаций", ("result",))
+SCHEDULER_LAG = histogram("scheduler_lag_seconds", "Опоздание запуска задачи относительно времени cron", ("job",))
+DB_CONNECT_SECONDS = histogram("db_connect_seconds", "Открытие соединения с SQLite")
+SEARCH_SECONDS = histogram("search_seconds", "Поиск по корпусу в админке", buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1))
+BACKUP_SECONDS = histogram("backup_seconds", "Этапы онлайн-бэкапа базы", ("stage",), buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300))
+HANDLER_SECONDS = histogram("handler_seconds", "Время обработчиков кнопок админки", ("handler",))
+
+RENDER_STAGES = ("canvas", "font", "layout", "draw", "encode")
+
+dp.callback_query.middleware(HandlerTimingMiddleware(HANDLER_SECONDS))
+
+
+async def send_profile_report(report):
+    """Отправка отчёта профилировщика админу документами"""
+    stamp = datetime.now(tz).strftime("%Y%m%d-%H%M%S")
+    await bot.send_document(
+        ADMIN_ID,
+        BufferedInputFile(report.pstats_text.encode(), filename=f"profile-{stamp}.txt"),
+        caption=f"🔬 Профиль за {report.duration:.1f} с (cProfile, поток event loop)"
+    )
+    await bot.send_document(
+        ADMIN_ID,
+        BufferedInputFile(report.collapsed.encode(), filename=f"profile-{stamp}.collapsed"),
+        caption=f"🔥 {report.samples} сэмплов стеков всех потоков — для flamegraph.pl / speedscope"
+    )
+
+
+profiler = Profiler(timeout=PROFILE_TIMEOUT, on_timeout=send_profile_report)
+memory_tracer = MemoryTracer(timeout=PROFILE_TIMEOUT)
+# Один бэкап за раз: плановый и кнопка из админки не копируют базу параллельно
+backup_lock = asyncio.Lock()
+
+DATA_DIR = Path(os.getenv("DATA_DIR", "\app\data"))
 DB_PATH = DATA_DIR / "affirmations.db"
 IMAGES_DIR = DATA_DIR / "images"
+FONT_PATH = "/app/TTNormsPro-Thin.ttf"
+AFFIRMATIONS_PATH = Path(__file__).with_name("affirmations.txt")
+
+# Результатов поиска на странице
+SEARCH_PAGE_SIZE = 8
+
+# Канал из CHANNEL_ID — первый тенант, в него переносится глобальный круг и расписание
+DEFAULT_CHANNEL_ID = 1
+DEFAULT_CAPTION = "✨\n\n\n\nСтавь ❤️ и другой увидит, что он не один\n\n@mentally_fit"
+
+# Задача init_db, запущенная в main() параллельно со стартом polling; connect_db() её дожидается
+db_init_task = None
+# Разбивка времени старта, мс
+STARTUP_TIMINGS = {}
+# Отметки об отправленных слотах хранятся столько дней
+POST_CLAIMS_DAYS = 30
+# Счётчики каналов из channel_stats: channel_id -> {"total", "used"}; сбрасываются при каждой записи.
+# В кластере базу меняют и другие процессы, поэтому там счётчики всегда читаются из таблицы
+channel_stats = {}
+# file_id загруженных картинок: image_id -> file_id (источник правды — таблица image_files)
+photo_file_ids = {}
+# Рендер и первая загрузка картинки — одна на image_id, остальные вызовы ждут её результат
+render_flights = SingleFlight(RENDER_TIMEOUT)
+upload_flights = SingleFlight(UPLOAD_TIMEOUT)
+# Рендер вне event loop, но в одном потоке: объекты шрифта FreeType не потокобезопасны
+render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+# Последний показанный статус в сообщении: (chat_id, message_id) -> (текст в Markdown, текст в Telegram)
+status_views = {}
+# Журнал отправок пишется пачками в фоне (лямбда — connect_db объявлена ниже)
+post_log = PostLog(lambda: connect_db(), POST_LOG_BATCH, POST_LOG_FLUSH)
 
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(IMAGES_DIR, exist_ok=True)
@@ -48,519 +173,40 @@ class AdminStates(StatesGroup):
     waiting_time_change = State()
     waiting_time_add = State()
     waiting_time_delete = State()
+    waiting_channel_add = State()
+    waiting_tz = State()
+    waiting_caption = State()
+    waiting_search = State()
 
 
-AFFIRMATIONS = [
-    "Я здесь.",
-    "Я есть.",
-    "Я с собой.",
-    "Я рядом.",
-    "Я опора.",
-    "Я чувствую.",
-    "Я замечаю.",
-    "Я слышу себя.",
-    "Я вижу себя.",
-    "Я не одна.",
-    "Я держусь.",
-    "Я возвращаюсь.",
-    "Я в теле.",
-    "Я здесь сейчас.",
-    "Я не теряюсь.",
-    "Я выбираю себя.",
-    "Я на своей стороне.",
-    "Я себе друг.",
-    "Я могу дышать.",
-    "Я даю себе паузу.",
-    "Я слышу свои чувства.",
-    "Я не против себя.",
-    "Я за себя.",
-    "Я в своём ритме.",
-    "Я могу остаться.",
-    "Я могу уйти.",
-    "Я не обязана.",
-    "Я могу сказать нет.",
-    "Я могу сказать да.",
-    "Я не должна объясняться.",
-    "Я могу молчать.",
-    "Я могу говорить.",
-    "Я могу чувствовать всё.",
-    "Я разрешаю себе быть.",
-    "Я не бросаю себя.",
-    "Я остаюсь с собой.",
-    "Я опора для себя.",
-    "Я сама себе дом.",
-    "Я возвращаюсь домой к себе.",
-    "Я в порядке.",
-    "Мне можно.",
-    "Мне можно быть такой.",
-    "Мне можно хотеть.",
-    "Мне можно устать.",
-    "Мне можно отдыхать.",
-    "Мне можно грустить.",
-    "Мне можно радоваться.",
-    "Мне можно злиться.",
-    "Мне можно бояться.",
-    "Мне можно не знать.",
-    "Я возвращаюсь к себе, шаг за шагом.",
-    "Я учусь не бросать себя.",
-    "Я могу быть себе тихой опорой.",
-    "Я могу быть на своей стороне, даже если никто не понял.",
-    "Я держу себя за руку в этом дне.",
-    "Я выбираю не терять себя ради других.",
-    "Я могу замечать свои потребности.",
-    "Я позволю себе услышать, чего хочу я.",
-    "Я имею право быть в центре своей жизни.",
-    "Я могу позволить себе паузу.",
-    "Я не обязана быть удобной.",
-    "Я могу быть для себя важной.",
-    "Я могу заботиться о себе.",
-    "Я могу выбирать, с кем быть рядом.",
-    "Я могу уходить от тех, кто делает больно.",
-    "Я могу не объяснять своих чувств.",
-    "Я могу не оправдываться.",
-    "Я могу позволить себе отдых.",
-    "Я могу не торопиться.",
-    "Я могу дать себе столько времени, сколько нужно.",
-    "Я могу доверять своим ощущениям.",
-    "Я могу не сравнивать свою боль с чужой.",
-    "Я имею право на жизнь, в которой тепло и мне.",
-    "Мне можно не отвечать шуткой.",
-    "Мне можно плакать в тишине.",
-    "Мне можно радоваться мелочам.",
-    "Мне можно верить, что меня тоже можно полюбить.",
-    "Мои чувства имеют значение.",
-    "Моё «нет» так же важно, как моё «да».",
-    "Я имею право выбирать себя.",
-    "Я достаточно, даже когда делаю мало.",
-    "Я заслуживаю тёплого отношения к себе.",
-    "Я могу опираться на себя и свою жизнь.",
-    "Я не обязана нравиться всем.",
-    "Я могу быть несовершенной.",
-    "Я могу ошибаться.",
-    "Я могу учиться на своих ошибках.",
-    "Я могу быть доброй к себе.",
-    "Я могу прощать себя.",
-    "Я могу принимать себя.",
-    "Я могу любить себя.",
-    "Я могу быть собой.",
-    "Я могу быть честной с собой.",
-    "Я могу слушать себя.",
-    "Я могу доверять себе.",
-    "Я могу верить в себя.",
-    "Я могу поддерживать себя.",
-    "Я могу утешать себя.",
-    "Я могу обнимать себя.",
-    "Я могу говорить себе добрые слова.",
-    "Я могу быть нежной к себе.",
-    "Я могу быть терпеливой к себе.",
-    "Я могу быть понимающей к себе.",
-    "Я могу быть внимательной к себе.",
-    "Я могу быть заботливой к себе.",
-    "Я могу быть любящей к себе.",
-    "Ты в безопасности.",
-    "Я рядом всегда.",
-    "Тепло тебе.",
-    "Ты можешь всё.",
-    "Я держу руку.",
-    "Мир тебе внутри.",
-    "Ты свет мой.",
-    "Обнимаю душой.",
-    "Ты не ошибка.",
-    "Я люблю тебя.",
-    "Покой тебе.",
-    "Ты прекрасна сейчас.",
-    "Держу в тепле.",
-    "Ты можешь быть.",
-    "Свет в тебе.",
-    "Обнимаю нежно.",
-    "Ты в порядке.",
-    "Я с тобой навсегда.",
-    "Тепло обволакивает.",
-    "Ты достойна покоя.",
-    "Я здесь держу.",
-    "Ты — тепло мира.",
-    "Я полна уверенности и силы.",
-    "Моя жизнь наполнена счастьем.",
-    "Каждый день приносит новые возможности.",
-    "Я достойна самого лучшего.",
-    "Я люблю и принимаю себя.",
-    "Мои мечты сбываются легко.",
-    "Я привлекаю успех во все сферы.",
-    "Здоровье и энергия всегда со мной.",
-    "Деньги приходят ко мне легко.",
-    "Я в гармонии с миром.",
-    "Я создаю свою реальность.",
-    "Я магнит для изобилия.",
-    "Моя жизнь полна радости.",
-    "Я доверяю процессу жизни.",
-    "Всё происходит в моих интересах.",
-    "Я расслаблена и спокойна.",
-    "Я открыта для новых возможностей.",
-    "Мой путь освещён любовью.",
-    "Я притягиваю благополучие.",
-    "Я заслуживаю всего самого лучшего.",
-    "Я сильная.",
-    "Я спокойная.",
-    "Я счастлива.",
-    "Я уверена.",
-    "Я любимая.",
-    "Я талантлива.",
-    "Я красива.",
-    "Я успешна.",
-    "Я здорова.",
-    "Я богата.",
-    "Я свободна.",
-    "Я мудрая.",
-    "Я творческая.",
-    "Я вдохновлённая.",
-    "Я благодарна.",
-    "Я осознанна.",
-    "Я настойчива.",
-    "Я терпелива.",
-    "Я смелая.",
-    "Я решительная.",
-    "Я чувствую радость.",
-    "Я чувствую покой.",
-    "Я чувствую любовь.",
-    "Я чувствую силу.",
-    "Я чувствую свободу.",
-    "Я чувствую благодарность.",
-    "Я чувствую уверенность.",
-    "Я чувствую гармонию.",
-    "Я чувствую тепло.",
-    "Я чувствую поддержку.",
-    "Я позволяю себе быть счастливой.",
-    "Я позволяю себе быть успешной.",
-    "Я позволяю себе быть богатой.",
-    "Я позволяю себе быть здоровой.",
-    "Я позволяю себе быть любимой.",
-    "Я позволяю себе быть свободной.",
-    "Я позволяю себе быть собой.",
-    "Я позволяю себе отдыхать.",
-    "Я позволяю себе мечтать.",
-    "Я позволяю себе творить.",
-    "Я выбираю радость.",
-    "Я выбираю любовь.",
-    "Я выбираю мир.",
-    "Я выбираю изобилие.",
-    "Я выбираю здоровье.",
-    "Я выбираю счастье.",
-    "Я выбираю успех.",
-    "Я выбираю свободу.",
-    "Я выбираю благодарность.",
-    "Я выбираю рост.",
-    "Я доверяю себе.",
-    "Я доверяю жизни.",
-    "Я доверяю Вселенной.",
-    "Я доверяю процессу.",
-    "Я доверяю своей интуиции.",
-    "Я доверяю своему пути.",
-    "Я доверяю своим решениям.",
-    "Я доверяю своей силе.",
-    "Я доверяю своим способностям.",
-    "Я доверяю своему сердцу.",
-    "Я принимаю себя полностью.",
-    "Я принимаю свои чувства.",
-    "Я принимаю свои эмоции.",
-    "Я принимаю свои мысли.",
-    "Я принимаю своё тело.",
-    "Я принимаю свой путь.",
-    "Я принимаю свою жизнь.",
-    "Я принимаю свою силу.",
-    "Я принимаю свою красоту.",
-    "Я принимаю свою уникальность.",
-    "Я благодарна за этот день.",
-    "Я благодарна за свою жизнь.",
-    "Я благодарна за своё здоровье.",
-    "Я благодарна за свою семью.",
-    "Я благодарна за своих друзей.",
-    "Я благодарна за свои возможности.",
-    "Я благодарна за свой опыт.",
-    "Я благодарна за свои уроки.",
-    "Я благодарна за свой рост.",
-    "Я благодарна за своё изобилие.",
-    "Я открыта новому.",
-    "Я открыта любви.",
-    "Я открыта радости.",
-    "Я открыта изобилию.",
-    "Я открыта успеху.",
-    "Я открыта счастью.",
-    "Я открыта возможностям.",
-    "Я открыта переменам.",
-    "Я открыта росту.",
-    "Я открыта чудесам.",
-    "Я заслуживаю любви.",
-    "Я заслуживаю счастья.",
-    "Я заслуживаю успеха.",
-    "Я заслуживаю изобилия.",
-    "Я заслуживаю здоровья.",
-    "Я заслуживаю радости.",
-    "Я заслуживаю мира.",
-    "Я заслуживаю отдыха.",
-    "Я заслуживаю уважения.",
-    "Я заслуживаю всего наилучшего.",
-    "Я создаю жизнь своей мечты.",
-    "Я создаю свою радость.",
-    "Я создаю своё счастье.",
-    "Я создаю свой успех.",
-    "Я создаю своё изобилие.",
-    "Я создаю свою свободу.",
-    "Я создаю свой мир.",
-    "Я создаю свою гармонию.",
-    "Я создаю свою красоту.",
-    "Я создаю свою магию.",
-    "Моя жизнь — это чудо.",
-    "Моя жизнь — это дар.",
-    "Моя жизнь — это благословение.",
-    "Моя жизнь — это радость.",
-    "Моя жизнь — это любовь.",
-    "Моя жизнь — это счастье.",
-    "Моя жизнь — это изобилие.",
-    "Моя жизнь — это красота.",
-    "Моя жизнь — это гармония.",
-    "Моя жизнь — это волшебство.",
-    "Я люблю свою жизнь.",
-    "Я люблю себя.",
-    "Я люблю своё тело.",
-    "Я люблю свой путь.",
-    "Я люблю свою работу.",
-    "Я люблю своих близких.",
-    "Я люблю каждый момент.",
-    "Я люблю каждый день.",
-    "Я люблю своё настоящее.",
-    "Я люблю своё будущее.",
-    "Я в мире с собой.",
-    "Я в мире с миром.",
-    "Я в мире с людьми.",
-    "Я в мире со своим прошлым.",
-    "Я в мире со своим настоящим.",
-    "Я в мире со своим будущим.",
-    "Я в мире со своими эмоциями.",
-    "Я в мире со своими мыслями.",
-    "Я в мире со своим телом.",
-    "Я в мире со своей душой.",
-    "Я расту каждый день.",
-    "Я развиваюсь каждый день.",
-    "Я учусь каждый день.",
-    "Я меняюсь к лучшему.",
-    "Я становлюсь сильнее.",
-    "Я становлюсь мудрее.",
-    "Я становлюсь свободнее.",
-    "Я становлюсь счастливее.",
-    "Я становлюсь увереннее.",
-    "Я становлюсь лучшей версией себя.",
-    "Всё хорошо в моём мире.",
-    "Всё идёт по плану.",
-    "Всё происходит вовремя.",
-    "Всё работает на меня.",
-    "Всё приходит легко.",
-    "Всё складывается идеально.",
-    "Всё получается.",
-    "Всё возможно.",
-    "Всё прекрасно.",
-    "Всё замечательно.",
-    "Я притягиваю любовь.",
-    "Я притягиваю радость.",
-    "Я притягиваю счастье.",
-    "Я притягиваю успех.",
-    "Я притягиваю изобилие.",
-    "Я притягиваю здоровье.",
-    "Я притягиваю гармонию.",
-    "Я притягиваю мир.",
-    "Я притягиваю красоту.",
-    "Я притягиваю чудеса.",
-    "Моё сердце открыто.",
-    "Моя душа спокойна.",
-    "Мой разум ясен.",
-    "Моё тело здорово.",
-    "Моя энергия высока.",
-    "Моя жизнь прекрасна.",
-    "Мой путь освещён.",
-    "Моё будущее светло.",
-    "Моё настоящее прекрасно.",
-    "Моё прошлое отпущено.",
-    "Я излучаю любовь.",
-    "Я излучаю радость.",
-    "Я излучаю свет.",
-    "Я излучаю тепло.",
-    "Я излучаю спокойствие.",
-    "Я излучаю уверенность.",
-    "Я излучаю силу.",
-    "Я излучаю красоту.",
-    "Я излучаю гармонию.",
-    "Я излучаю благодарность.",
-    "Я наполнена любовью.",
-    "Я наполнена радостью.",
-    "Я наполнена светом.",
-    "Я наполнена силой.",
-    "Я наполнена энергией.",
-    "Я наполнена благодарностью.",
-    "Я наполнена миром.",
-    "Я наполнена гармонией.",
-    "Я наполнена изобилием.",
-    "Я наполнена счастьем.",
-    "Я живу в потоке.",
-    "Я живу в моменте.",
-    "Я живу в радости.",
-    "Я живу в любви.",
-    "Я живу в мире.",
-    "Я живу в гармонии.",
-    "Я живу в изобилии.",
-    "Я живу в счастье.",
-    "Я живу в благодарности.",
-    "Я живу в свободе.",
-    "Мир поддерживает меня.",
-    "Вселенная любит меня.",
-    "Жизнь дарит мне подарки.",
-    "Судьба на моей стороне.",
-    "Удача со мной.",
-    "Счастье следует за мной.",
-    "Любовь окружает меня.",
-    "Изобилие течёт ко мне.",
-    "Благословения приходят ко мне.",
-    "Чудеса случаются со мной.",
-    "Я в правильном месте.",
-    "Я в правильное время.",
-    "Я делаю правильный выбор.",
-    "Я иду правильным путём.",
-    "Я живу правильной жизнью.",
-    "Я нахожусь там, где нужно.",
-    "Я делаю то, что нужно.",
-    "Я именно та, кто нужна.",
-    "Я всё делаю вовремя.",
-    "Я всё делаю правильно.",
-    "Сегодня прекрасный день.",
-    "Сегодня день возможностей.",
-    "Сегодня день чудес.",
-    "Сегодня день радости.",
-    "Сегодня день любви.",
-    "Сегодня день счастья.",
-    "Сегодня день успеха.",
-    "Сегодня день изобилия.",
-    "Сегодня день благодарности.",
-    "Сегодня день роста.",
-    "Я готова к чудесам.",
-    "Я готова к любви.",
-    "Я готова к счастью.",
-    "Я готова к успеху.",
-    "Я готова к изобилию.",
-    "Я готова к переменам.",
-    "Я готова к росту.",
-    "Я готова к новому.",
-    "Я готова принять всё хорошее.",
-    "Я готова жить полной жизнью.",
-    "Я принимаю свои границы.",
-    "Я уважаю свои границы.",
-    "Я защищаю свои границы.",
-    "Я ясно обозначаю свои границы.",
-    "Мои границы важны.",
-    "Мои границы священны.",
-    "Я имею право на границы.",
-    "Я могу говорить о своих границах.",
-    "Я могу защищать свои границы.",
-    "Я не нарушаю свои границы.",
-    "Я дышу спокойно.",
-    "Я дышу глубоко.",
-    "Я дышу свободно.",
-    "Дыхание успокаивает меня.",
-    "Дыхание центрирует меня.",
-    "Дыхание возвращает меня к себе.",
-    "С каждым вдохом я расслабляюсь.",
-    "С каждым выдохом отпускаю напряжение.",
-    "Дыхание — мой якорь.",
-    "Дыхание — моя опора.",
-    "Я отпускаю то, что не моё.",
-    "Я отпускаю то, что не служит мне.",
-    "Я отпускаю прошлое.",
-    "Я отпускаю страхи.",
-    "Я отпускаю тревоги.",
-    "Я отпускаю боль.",
-    "Я отпускаю обиды.",
-    "Я отпускаю вину.",
-    "Я отпускаю стыд.",
-    "Я отпускаю всё лишнее.",
-    "Я чувствую землю под ногами.",
-    "Я чувствую своё тело.",
-    "Я чувствую своё дыхание.",
-    "Я чувствую своё сердце.",
-    "Я чувствую свою силу.",
-    "Я чувствую свою устойчивость.",
-    "Я чувствую свою связь с землёй.",
-    "Я заземлена.",
-    "Я устойчива.",
-    "Я укоренена.",
-    "Моё тело — мой храм.",
-    "Моё тело мудро.",
-    "Моё тело знает.",
-    "Я слушаю своё тело.",
-    "Я доверяю своему телу.",
-    "Я благодарна своему телу.",
-    "Я забочусь о своём теле.",
-    "Я уважаю своё тело.",
-    "Я люблю своё тело.",
-    "Моё тело — мой союзник.",
-    "Я нахожу баланс.",
-    "Я создаю баланс.",
-    "Я живу в балансе.",
-    "Баланс приходит легко.",
-    "Я балансирую работу и отдых.",
-    "Я балансирую давать и получать.",
-    "Я балансирую быть и делать.",
-    "Я нахожу гармонию.",
-    "Я создаю гармонию.",
-    "Я живу в гармонии.",
-    "Мой внутренний ребёнок в безопасности.",
-    "Мой внутренний ребёнок любим.",
-    "Я обнимаю своего внутреннего ребёнка.",
-    "Я утешаю своего внутреннего ребёнка.",
-    "Я играю со своим внутренним ребёнком.",
-    "Я слышу своего внутреннего ребёнка.",
-    "Я защищаю своего внутреннего ребёнка.",
-    "Я даю своему внутреннему ребёнку то, что нужно.",
-    "Мой внутренний ребёнок может быть собой.",
-    "Мой внутренний ребёнок свободен.",
-    "Я прощаю себя за прошлое.",
-    "Я прощаю себя за ошибки.",
-    "Я прощаю себя за незнание.",
-    "Я прощаю себя за боль.",
-    "Я прощаю себя полностью.",
-    "Прощение освобождает меня.",
-    "Прощение исцеляет меня.",
-    "Я выбираю прощение.",
-    "Я достойна прощения.",
-    "Я свободна через прощение.",
-    "Я исцеляюсь.",
-    "Я исцеляю своё сердце.",
-    "Я исцеляю свою душу.",
-    "Я исцеляю свои раны.",
-    "Исцеление приходит ко мне.",
-    "Исцеление течёт через меня.",
-    "Я открыта исцелению.",
-    "Я позволяю себе исцелиться.",
-    "Каждый день я исцеляюсь всё больше.",
-    "Исцеление — мой естественный процесс.",
-    "Я выражаю себя свободно.",
-    "Я выражаю свои чувства.",
-    "Я выражаю свои мысли.",
-    "Я выражаю свою истину.",
-    "Я выражаю свою креативность.",
-    "Моё самовыражение важно.",
-    "Моё самовыражение ценно.",
-    "Я имею право выражать себя.",
-    "Я творю свою жизнь.",
-    "Я творю свою реальность.",
-    "Я верю в себя.",
-    "Я верю в свои силы.",
-    "Я верю в свои возможности.",
-    "Я верю в свой путь.",
-    "Я верю в своё будущее."
-]
+def load_affirmations() -> list[str]:
+    """Корпус аффирмаций из affirmations.txt — читается только при заполнении базы"""
+    with open(AFFIRMATIONS_PATH, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+@asynccontextmanager
+async def connect_db(wait_ready: bool = True):
+    """Подключение к базе с замером времени открытия"""
+    if wait_ready and db_init_task is not None:
+        # Обработчик пришёл раньше, чем закончилась инициализация базы
+        await asyncio.shield(db_init_task)
+    with DB_CONNECT_SECONDS.time():
+        db = await aiosqlite.connect(DB_PATH)
+    try:
+        yield db
+    finally:
+        await db.close()
 
 
 async def init_db():
     """Инициализация базы данных с новой структурой"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Создаём таблицу аффирмаций с флагом used
+    async with connect_db(wait_ready=False) as db:
+        # WAL: читатели не ждут писателя; BEGIN IMMEDIATE — процессы кластера инициализируют базу по очереди
+        await db.execute("PRAGMA journal_mode=WAL")
+        await db.execute("BEGIN IMMEDIATE")
+        
+        # Создаём таблицу аффирмаций с флагом used (флаг — глобальный круг до появления каналов)
         await db.execute("""
             CREATE TABLE IF NOT EXISTS affirmations (
                 id INTEGER PRIMARY KEY,
@@ -570,7 +216,40 @@ async def init_db():
             )
         """)
         
-        # Таблица расписания
+        # Полнотекстовый индекс для поиска в админке: внешнее содержимое — сама affirmations,
+        # синхронизация триггерами (префиксные индексы — под поиск по началу слова)
+        cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE name = 'affirmations_fts'")
+        fts_exists = await cursor.fetchone() is not None
+        await db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS affirmations_fts USING fts5(
+                text,
+                content = 'affirmations',
+                content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS affirmations_fts_insert AFTER INSERT ON affirmations BEGIN
+                INSERT INTO affirmations_fts (rowid, text) VALUES (new.id, new.text);
+            END
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS affirmations_fts_delete AFTER DELETE ON affirmations BEGIN
+                INSERT INTO affirmations_fts (affirmations_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            END
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS affirmations_fts_update AFTER UPDATE OF text ON affirmations BEGIN
+                INSERT INTO affirmations_fts (affirmations_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                INSERT INTO affirmations_fts (rowid, text) VALUES (new.id, new.text);
+            END
+        """)
+        if not fts_exists:
+            # База, созданная до поиска: уже загруженный корпус индексируется один раз
+            await db.execute("INSERT INTO affirmations_fts (affirmations_fts) VALUES ('rebuild')")
+        
+        # Таблица расписания (до появления каналов; теперь — источник для переноса в channel_schedule)
         await db.execute("""
             CREATE TABLE IF NOT EXISTS schedule (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -584,12 +263,12 @@ async def init_db():
         
         if count == 0:
             # Заполняем базу
-            for i, text in enumerate(AFFIRMATIONS, start=1):
-                await db.execute(
-                    "INSERT INTO affirmations (id, text, image_id, used) VALUES (?, ?, ?, 0)",
-                    (i, text, i)
-                )
-            logger.info(f"База данных заполнена {len(AFFIRMATIONS)} аффирмациями")
+            affirmations = load_affirmations()
+            await db.executemany(
+                "INSERT INTO affirmations (id, text, image_id, used) VALUES (?, ?, ?, 0)",
+                ((i, text, i) for i, text in enumerate(affirmations, start=1))
+            )
+            logger.info("База данных заполнена %d аффирмациями", len(affirmations))
         
         # Проверяем расписание
         cursor = await db.execute("SELECT COUNT(*) FROM schedule")
@@ -598,51 +277,331 @@ async def init_db():
         if sched_count == 0:
             await db.execute("INSERT INTO schedule (post_time) VALUES ('08:00')")
         
+        # Каналы: у каждого свой корпус, свой круг без повторов, расписание, пояс и подпись
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS channels (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id TEXT NOT NULL UNIQUE,
+                tz_name TEXT NOT NULL,
+                caption TEXT NOT NULL,
+                cycle INTEGER NOT NULL DEFAULT 1
+            )
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS channel_affirmations (
+                channel_id INTEGER NOT NULL,
+                affirmation_id INTEGER NOT NULL,
+                used INTEGER NOT NULL DEFAULT 0,
+                rank INTEGER NOT NULL DEFAULT (random()),   -- случайный порядок круга, тасуется при сбросе
+                PRIMARY KEY (channel_id, affirmation_id)
+            ) WITHOUT ROWID
+        """)
+        # База до rank: новый столбец и перетасовка один раз
+        cursor = await db.execute("SELECT COUNT(*) FROM pragma_table_info('channel_affirmations') WHERE name = 'rank'")
+        if (await cursor.fetchone())[0] == 0:
+            await db.execute("ALTER TABLE channel_affirmations ADD COLUMN rank INTEGER NOT NULL DEFAULT 0")
+            await db.execute("UPDATE channel_affirmations SET rank = random()")
+        # Выбор и подсчёты по каналу читают только этот индекс, сколько бы каналов ни было
+        await db.execute("DROP INDEX IF EXISTS idx_channel_affirmations_used")
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_channel_affirmations_rank
+            ON channel_affirmations (channel_id, used, rank)
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS channel_schedule (
+                channel_id INTEGER NOT NULL,
+                post_time TEXT NOT NULL,
+                PRIMARY KEY (channel_id, post_time)
+            ) WITHOUT ROWID
+        """)
+        # Счётчики корпуса канала: меняются в тех же транзакциях, что и флаги used
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS channel_stats (
+                channel_id INTEGER PRIMARY KEY,
+                total INTEGER NOT NULL,
+                used INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        # Отправленные слоты: один слот расписания — один пост, даже если задача сработала в двух процессах
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS post_claims (
+                channel_id INTEGER NOT NULL,
+                slot TEXT NOT NULL,
+                worker TEXT NOT NULL,
+                claimed_at TEXT NOT NULL,
+                PRIMARY KEY (channel_id, slot)
+            ) WITHOUT ROWID
+        """)
+        # file_id загруженных картинок: повторная отправка без загрузки файла
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS image_files (
+                image_id INTEGER PRIMARY KEY,
+                file_id TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
+        # Журнал отправок и дневные сводки по нему
+        for statement in POST_LOG_SCHEMA:
+            await db.execute(statement)
+        
+        # Первый запуск с каналами: глобальные флаги used и расписание становятся каналом по умолчанию
+        cursor = await db.execute("SELECT COUNT(*) FROM channels")
+        if (await cursor.fetchone())[0] == 0:
+            await db.execute(
+                "INSERT INTO channels (id, chat_id, tz_name, caption) VALUES (?, ?, ?, ?)",
+                (DEFAULT_CHANNEL_ID, CHANNEL_ID or "", TZ_NAME, DEFAULT_CAPTION)
+            )
+            await db.execute(
+                "INSERT INTO channel_affirmations (channel_id, affirmation_id, used) "
+                "SELECT ?, id, used FROM affirmations",
+                (DEFAULT_CHANNEL_ID,)
+            )
+            await db.execute(
+                "INSERT INTO channel_schedule (channel_id, post_time) SELECT ?, post_time FROM schedule",
+                (DEFAULT_CHANNEL_ID,)
+            )
+            logger.info("Создан канал по умолчанию #%s (%s)", DEFAULT_CHANNEL_ID, CHANNEL_ID)
+        elif CHANNEL_ID:
+            # CHANNEL_ID из окружения остаётся источником правды для канала по умолчанию,
+            # если этот чат не добавлен в админке как отдельный канал (chat_id уникален)
+            cursor = await db.execute(
+                "SELECT id FROM channels WHERE chat_id = ? AND id != ?", (CHANNEL_ID, DEFAULT_CHANNEL_ID)
+            )
+            conflict = await cursor.fetchone()
+            if conflict:
+                logger.warning(
+                    "⚠️ CHANNEL_ID %s уже добавлен как канал #%s — канал по умолчанию #%s не переименован",
+                    CHANNEL_ID, conflict[0], DEFAULT_CHANNEL_ID
+                )
+            else:
+                await db.execute("UPDATE channels SET chat_id = ? WHERE id = ?", (CHANNEL_ID, DEFAULT_CHANNEL_ID))
+        
+        # Каналы без счётчиков (новый канал по умолчанию или база до channel_stats) считаем один раз
+        await db.execute("""
+            INSERT INTO channel_stats (channel_id, total, used)
+            SELECT c.id,
+                   (SELECT COUNT(*) FROM channel_affirmations a WHERE a.channel_id = c.id),
+                   (SELECT COUNT(*) FROM channel_affirmations a WHERE a.channel_id = c.id AND a.used = 1)
+            FROM channels c
+            WHERE c.id NOT IN (SELECT channel_id FROM channel_stats)
+        """)
+        
         await db.commit()
 
 
-async def get_next_affirmation() -> dict:
+async def create_channel(chat_id: str, tz_name: str, first: int = 1, last: int | None = None) -> int:
     """
-    Получить следующую случайную неиспользованную аффирмацию.
-    Когда все 500 использованы, сбрасывает флаги и начинает новый круг.
+    Добавить канал с корпусом из аффирмаций first..last (last=None — до конца).
+    LookupError — в диапазоне нет ни одной аффирмации: канал без корпуса не создаётся.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        # 1. Пытаемся взять случайную неиспользованную
-        cursor = await db.execute("""
-            SELECT id, text, image_id
-            FROM affirmations
-            WHERE used = 0
-            ORDER BY RANDOM()
-            LIMIT 1
-        """)
+    async with connect_db() as db:
+        cursor = await db.execute(
+            "INSERT INTO channels (chat_id, tz_name, caption) VALUES (?, ?, ?)",
+            (chat_id, tz_name, DEFAULT_CAPTION)
+        )
+        channel_id = cursor.lastrowid
+        cursor = await db.execute(
+            "INSERT INTO channel_affirmations (channel_id, affirmation_id) "
+            "SELECT ?, id FROM affirmations WHERE id >= ? AND (? IS NULL OR id <= ?)",
+            (channel_id, first, last, last)
+        )
+        if cursor.rowcount == 0:
+            await db.rollback()
+            cursor = await db.execute("SELECT COUNT(*) FROM affirmations")
+            total = (await cursor.fetchone())[0]
+            raise LookupError(f"В диапазоне {first}-{last or ''} нет аффирмаций (всего их {total}).")
+        await db.execute(
+            "INSERT INTO channel_stats (channel_id, total, used) VALUES (?, ?, 0)",
+            (channel_id, cursor.rowcount)
+        )
+        await db.commit()
+    
+    logger.info("Добавлен канал #%s %s (%s)", channel_id, chat_id, tz_name)
+    return channel_id
+
+
+async def get_channel(channel_id: int) -> dict | None:
+    """Настройки канала"""
+    async with connect_db() as db:
+        cursor = await db.execute(
+            "SELECT id, chat_id, tz_name, caption, cycle FROM channels WHERE id = ?",
+            (channel_id,)
+        )
         row = await cursor.fetchone()
+    
+    if not row:
+        return None
+    return dict(zip(("id", "chat_id", "tz_name", "caption", "cycle"), row))
+
+
+async def list_channels() -> list[dict]:
+    """Все каналы по порядку"""
+    async with connect_db() as db:
+        cursor = await db.execute("SELECT id, chat_id, tz_name FROM channels ORDER BY id")
+        rows = await cursor.fetchall()
+    return [dict(zip(("id", "chat_id", "tz_name"), row)) for row in rows]
+
+
+async def get_channel_times(channel_id: int) -> list[str]:
+    """Времена постинга канала"""
+    async with connect_db() as db:
+        cursor = await db.execute(
+            "SELECT post_time FROM channel_schedule WHERE channel_id = ? ORDER BY post_time",
+            (channel_id,)
+        )
+        return [row[0] for row in await cursor.fetchall()]
+
+
+async def get_admin_channel(state: FSMContext) -> int:
+    """Канал, выбранный в админ-панели (хранится в данных FSM)"""
+    return (await state.get_data()).get("channel_id", DEFAULT_CHANNEL_ID)
+
+
+def escape_md(text: str) -> str:
+    """Экранирование для parse_mode="Markdown" — в именах каналов и поясов бывают подчёркивания"""
+    for char in ("_", "*", "`", "["):
+        text = text.replace(char, "\\" + char)
+    return text
+
+
+def render_caption(template: str, aff: dict) -> str:
+    """Подпись канала: {text} — текст аффирмации, {id} — её номер"""
+    return template.replace("{text}", aff["text"]).replace("{id}", str(aff["id"]))
+
+
+async def get_channel_stats(channel_id: int) -> dict:
+    """Всего / использовано / осталось в корпусе канала — из channel_stats, без подсчёта строк"""
+    stats = None if CLUSTER_MODE else channel_stats.get(channel_id)
+    if stats is None:
+        async with connect_db() as db:
+            cursor = await db.execute("SELECT total, used FROM channel_stats WHERE channel_id = ?", (channel_id,))
+            row = await cursor.fetchone()
+        total, used = row or (0, 0)
+        stats = channel_stats[channel_id] = {"total": total, "used": used, "remaining": total - used}
+    return stats
+
+
+async def pick_unused(db, channel_id: int) -> int | None:
+    """
+    Взять случайную неиспользованную аффирмацию канала — с наименьшим rank — и сразу
+    пометить used = 1. rank случайный и перетасовывается при каждом сбросе круга, так что
+    круг — случайная перестановка корпуса, и каждая оставшаяся выпадает с равной
+    вероятностью, как при ORDER BY RANDOM(). Подзапрос — один шаг по индексу
+    (channel_id, used, rank), без обхода остатка.
+    
+    Выбор и пометка — один UPDATE под блокировкой записи: одновременные выборы (задачи
+    одного процесса, процессы кластера) всегда получают разные аффирмации. Изменения
+    не зафиксированы — commit за вызывающим.
+    """
+    rows = await db.execute_fetchall(
+        "UPDATE channel_affirmations SET used = 1 WHERE channel_id = ? AND affirmation_id = ("
+        "SELECT affirmation_id FROM channel_affirmations WHERE channel_id = ? AND used = 0 ORDER BY rank LIMIT 1"
+        ") RETURNING affirmation_id",
+        (channel_id, channel_id)
+    )
+    return rows[0][0] if rows else None
+
+
+async def get_next_affirmation(channel_id: int = DEFAULT_CHANNEL_ID) -> dict:
+    """
+    Получить следующую случайную неиспользованную аффирмацию канала.
+    Когда весь корпус канала использован, сбрасывает его флаги и начинает новый круг.
+    """
+    async with connect_db() as db:
+        # 1. Берём случайную неиспользованную (сразу помечается использованной)
+        with PICK_SECONDS.time(stage="select"):
+            aff_id = await pick_unused(db, channel_id)
         
-        # 2. Если не осталось ни одной (все 500 использованы) — обнуляем used и берём снова
-        if not row:
-            logger.info("Все 500 аффирмаций использованы! Начинаем новый круг.")
-            await db.execute("UPDATE affirmations SET used = 0")
-            await db.commit()
+        # 2. Если не осталось ни одной (весь корпус канала использован) — обнуляем used и берём снова
+        if aff_id is None:
+            logger.info("Канал #%s: все аффирмации использованы! Начинаем новый круг.", channel_id)
+            with PICK_SECONDS.time(stage="reset"):
+                await db.execute(
+                    "UPDATE channel_affirmations SET used = 0, rank = random() WHERE channel_id = ?", (channel_id,)
+                )
+                await db.execute("UPDATE channels SET cycle = cycle + 1 WHERE id = ?", (channel_id,))
+                await db.execute("UPDATE channel_stats SET used = 0 WHERE channel_id = ?", (channel_id,))
+                
+                aff_id = await pick_unused(db, channel_id)
             
-            cursor = await db.execute("""
-                SELECT id, text, image_id
-                FROM affirmations
-                ORDER BY RANDOM()
-                LIMIT 1
-            """)
-            row = await cursor.fetchone()
+            if aff_id is None:
+                await db.rollback()
+                raise LookupError(f"У канала #{channel_id} пустой корпус аффирмаций")
         
-        aff_id, text, img_id = row
+        # 3. Счётчик использованных — в той же транзакции, что и пометка
+        with PICK_SECONDS.time(stage="mark"):
+            await db.execute("UPDATE channel_stats SET used = used + 1 WHERE channel_id = ?", (channel_id,))
+            await db.commit()
+            channel_stats.pop(channel_id, None)
         
-        # 3. Помечаем выбранную как использованную
-        await db.execute(
-            "UPDATE affirmations SET used = 1 WHERE id = ?",
-            (aff_id,)
-        )
-        await db.commit()
+        cursor = await db.execute("SELECT text, image_id FROM affirmations WHERE id = ?", (aff_id,))
+        text, img_id = await cursor.fetchone()
         
-        logger.info(f"Выбрана аффирмация #{aff_id}")
+        logger.info("Канал #%s: выбрана аффирмация #%s", channel_id, aff_id)
         return {"id": aff_id, "text": text, "image_id": img_id or 1}
 
+def fts_query(text: str) -> str | None:
+    """Запрос админа -> запрос FTS5: все слова по началу; кавычки защищают от синтаксиса FTS5"""
+    words = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{word}"*' for word in words) or None
+
+
+async def search_affirmations(query: str, channel_id: int, page: int = 0) -> tuple[list[dict], bool]:
+    """
+    Страница поиска по корпусу: «#123» или число — по номеру, иначе FTS5 по словам.
+    used — флаг в корпусе канала (None — аффирмации нет в канале), cached — картинка
+    уже отрисована или загружена. Второе значение — есть ли следующая страница.
+    """
+    select = """
+        SELECT a.id, a.text, a.image_id, ca.used, f.file_id IS NOT NULL
+        FROM affirmations a
+        LEFT JOIN channel_affirmations ca ON ca.channel_id = ? AND ca.affirmation_id = a.id
+        LEFT JOIN image_files f ON f.image_id = a.image_id
+    """
+    number = query.strip().lstrip("#")
+    with SEARCH_SECONDS.time():
+        async with connect_db() as db:
+            # isdigit() пропускает "²" и прочие цифры, которые int() не разберёт
+            if re.fullmatch(r"\d+", number, re.ASCII):
+                rows = await db.execute_fetchall(select + "WHERE a.id = ?", (channel_id, int(number)))
+            else:
+                match = fts_query(query)
+                if match is None:
+                    return [], False
+                # По rowid, а не по rank: LIMIT читает индекс с начала, не ранжируя все совпадения
+                rows = await db.execute_fetchall(
+                    select + """
+                    WHERE a.id IN (
+                        SELECT rowid FROM affirmations_fts WHERE affirmations_fts MATCH ?
+                        ORDER BY rowid LIMIT ? OFFSET ?
+                    )
+                    ORDER BY a.id
+                    """,
+                    (channel_id, match, SEARCH_PAGE_SIZE + 1, page * SEARCH_PAGE_SIZE)
+                )
+    
+    results = [
+        {
+            "id": aff_id,
+            "text": text,
+            "image_id": image_id or 1,
+            "used": used,
+            "cached": bool(uploaded) or (IMAGES_DIR / f"{image_id or 1}.png").exists(),
+        }
+        for aff_id, text, image_id, used, uploaded in rows
+    ]
+    return results[:SEARCH_PAGE_SIZE], len(results) > SEARCH_PAGE_SIZE
+
+
+async def get_affirmation(aff_id: int) -> dict | None:
+    """Аффирмация по номеру"""
+    async with connect_db() as db:
+        rows = await db.execute_fetchall("SELECT text, image_id FROM affirmations WHERE id = ?", (aff_id,))
+    if not rows:
+        return None
+    text, image_id = rows[0]
+    return {"id": aff_id, "text": text, "image_id": image_id or 1}
+
+
 def random_pastel_color():
     hue = random.random()  # 0-1
     sat = random.uniform(0.3, 0.5)  # Низкая насыщенность для пастели
@@ -673,16 +632,32 @@ async def get_affirmation_photo(aff_id: int, aff_text: str) -> str:
     """Получить путь к фото аффирмации или создать с переносом текста"""
     path = IMAGES_DIR / f"{aff_id}.png"
     if path.exists():
+        IMAGE_CACHE.inc(result="hit")
         return str(path)
     
+    # Ту же картинку уже рисуют (второй слот, тест из админки) — ждём тот же рендер.
+    # settle: по таймауту ждущие уходят, но ключ занят, пока поток рендера не закончит
+    IMAGE_CACHE.inc(result="shared" if render_flights.in_flight(path) else "miss")
+    loop = asyncio.get_running_loop()
+    await render_flights.run(path, lambda: settle(loop.run_in_executor(render_executor, render_affirmation, path, aff_text)))
+    return str(path)
+
+
+def render_affirmation(path: Path, aff_text: str):
+    """Нарисовать картинку с переносом текста и атомарно записать в path (вызывается в потоке рендера)"""
+    # Pillow нужен только для рендера — не грузим его при старте
+    from PIL import Image, ImageDraw
+    
+    from glyphs import get_atlas
+    
     # Создаём изображение
-    img = Image.new('RGB', (800, 600), color=random_pastel_color())
-    draw = ImageDraw.Draw(img)
+    with RENDER_SECONDS.time(stage="canvas"):
+        img = Image.new('RGB', (800, 600), color=random_pastel_color())
+        draw = ImageDraw.Draw(img)
     
-    try:
-        font = ImageFont.truetype("/app/TTNormsPro-Thin.ttf", 60)
-    except:
-        font = ImageFont.load_default()
+    with RENDER_SECONDS.time(stage="font"):
+        # Шрифт и растеризованные глифы общие для всех картинок
+        atlas = get_atlas(FONT_PATH, 60)
     
     # Логика переноса текста (word wrap)
     max_width = 760  # Доступная ширина (800 - отступы)
@@ -690,100 +665,373 @@ async def get_affirmation_photo(aff_id: int, aff_text: str) -> str:
     lines = []
     current_line = []
     
-    for word in words:
-        test_line = ' '.join(current_line + [word])
-        bbox = draw.textbbox((0, 0), test_line, font=font)
-        if bbox[2] > max_width:  # Не помещается
-            if current_line:
-                lines.append(' '.join(current_line))
-                current_line = [word]
+    with RENDER_SECONDS.time(stage="layout"):
+        for word in words:
+            test_line = ' '.join(current_line + [word])
+            bbox = atlas.bbox(test_line)
+            if bbox[2] > max_width:  # Не помещается
+                if current_line:
+                    lines.append(' '.join(current_line))
+                    current_line = [word]
+                else:
+                    lines.append(word)  # Очень длинное слово
             else:
-                lines.append(word)  # Очень длинное слово
-        else:
-            current_line.append(word)
-    
-    if current_line:
-        lines.append(' '.join(current_line))
+                current_line.append(word)
+        
+        if current_line:
+            lines.append(' '.join(current_line))
     
     # Отрисовка строк (центрирование по вертикали)
     line_height = 70  # Примерно text_height + отступ (адаптируйте под шрифт)
     total_height = len(lines) * line_height
     y_start = (600 - total_height) // 2
     
-    for i, line in enumerate(lines):
-        bbox = draw.textbbox((0, 0), line, font=font)
-        text_width = bbox[2] - bbox[0]
-        x = (800 - text_width) // 2
-        y = y_start + i * line_height
-        draw.text((x, y), line, fill="black", font=font)
+    with RENDER_SECONDS.time(stage="draw"):
+        for i, line in enumerate(lines):
+            bbox = atlas.bbox(line)
+            text_width = bbox[2] - bbox[0]
+            x = (800 - text_width) // 2
+            y = y_start + i * line_height
+            atlas.draw(draw, (x, y), line, fill="black")
     
-    img.save(path)
-    return str(path)
+    with RENDER_SECONDS.time(stage="encode"):
+        # Через временный файл: другой процесс не должен увидеть недописанный PNG по path.exists()
+        partial = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+        try:
+            img.save(partial, format="PNG")
+            os.replace(partial, path)
+        finally:
+            partial.unlink(missing_ok=True)
     
     
+def photo_file_id(message) -> str | None:
+    """file_id самого большого размера фото из ответа sendPhoto"""
+    photo = getattr(message, "photo", None)
+    return photo[-1].file_id if photo else None
+
+
+def is_stale_file_id(error: TelegramBadRequest) -> bool:
+    """Ошибка Telegram про сам file_id (файл удалён, ссылка устарела), а не про чат или подпись"""
+    message = error.message.lower()
+    return "wrong file identifier" in message or "file reference" in message
+
+
+async def get_photo_file_id(image_id: int) -> str | None:
+    """file_id уже загруженной картинки: из памяти, иначе из image_files (её мог загрузить другой процесс)"""
+    file_id = photo_file_ids.get(image_id)
+    if file_id is None:
+        async with connect_db() as db:
+            rows = await db.execute_fetchall("SELECT file_id FROM image_files WHERE image_id = ?", (image_id,))
+        if rows:
+            file_id = photo_file_ids[image_id] = rows[0][0]
+    return file_id
+
+
+async def set_photo_file_id(image_id: int, file_id: str | None, stale: str | None = None):
+    """
+    Запомнить file_id картинки; None — забыть (Telegram его больше не принимает).
+    stale — забыть, только если сохранён всё ещё он, а не уже перезагруженный
+    """
+    async with connect_db() as db:
+        if file_id is None:
+            await db.execute(
+                "DELETE FROM image_files WHERE image_id = ? AND (? IS NULL OR file_id = ?)",
+                (image_id, stale, stale)
+            )
+        else:
+            await db.execute(
+                "INSERT INTO image_files (image_id, file_id) VALUES (?, ?) "
+                "ON CONFLICT(image_id) DO UPDATE SET file_id = excluded.file_id",
+                (image_id, file_id)
+            )
+        await db.commit()
+    if file_id is None:
+        if stale is None or photo_file_ids.get(image_id) == stale:
+            photo_file_ids.pop(image_id, None)
+    else:
+        photo_file_ids[image_id] = file_id
+
+
+async def send_affirmation_photo(chat_id, aff: dict, caption: str):
+    """
+    sendPhoto картинки аффирмации. Файл картинки загружается один раз: дальше она
+    уходит по file_id без рендера и загрузки. Если первая загрузка уже идёт, вызов ждёт
+    её и отправляет по полученному file_id. Повторные загрузки (устаревший file_id, общая
+    загрузка не удалась) идут через тот же upload_flights: картинку грузит один из ждущих.
+    """
+    image_id = aff["image_id"]
+    file_id = await get_photo_file_id(image_id)
+    if file_id is not None:
+        try:
+            with UPLOAD_SECONDS.time(method="sendPhoto"):
+                message = await bot.send_photo(chat_id, photo=file_id, caption=caption)
+            PHOTO_UPLOADS.inc(result="file_id")
+            return message
+        except TelegramBadRequest as e:
+            # Заново загружаем только при устаревшем file_id; прочие ошибки (чат, подпись) — вызывающему
+            if not is_stale_file_id(e):
+                raise
+            logger.warning("⚠️ file_id картинки #%s не принят, загружаем файл заново", image_id)
+            await set_photo_file_id(image_id, None, stale=file_id)
+            # Пока шла отправка, картинку могла уже перезагрузить другая отправка — берём её file_id
+            fresh = await get_photo_file_id(image_id)
+            if fresh is not None:
+                PHOTO_UPLOADS.inc(result="shared")
+                with UPLOAD_SECONDS.time(method="sendPhoto"):
+                    return await bot.send_photo(chat_id, photo=fresh, caption=caption)
+    
+    async def upload():
+        photo_path = await get_affirmation_photo(image_id, aff["text"])
+        with UPLOAD_SECONDS.time(method="sendPhoto"):
+            message = await bot.send_photo(chat_id, photo=FSInputFile(photo_path), caption=caption)
+        uploaded = photo_file_id(message)
+        if uploaded is not None:
+            await set_photo_file_id(image_id, uploaded)
+        return message
+    
+    for attempt in range(2):
+        if not upload_flights.in_flight(image_id):
+            PHOTO_UPLOADS.inc(result="upload")
+            return await upload_flights.run(image_id, upload)
+        
+        # Чужая загрузка ушла в свой чат — нам нужен только её file_id
+        try:
+            file_id = photo_file_id(await upload_flights.run(image_id, upload))
+        except Exception as e:
+            if attempt:
+                raise
+            # Ошибка чужого чата (бот удалён, таймаут) — не наша: загрузку в свой чат начнёт первый
+            # из ждавших, остальные дождутся уже её
+            logger.warning("⚠️ Общая загрузка картинки #%s не удалась (%s), загружаем заново", image_id, e)
+            continue
+        if file_id is not None:
+            break
+    else:
+        raise RuntimeError(f"Картинка #{image_id} не загружена: общая загрузка не вернула file_id")
+    PHOTO_UPLOADS.inc(result="shared")
+    with UPLOAD_SECONDS.time(method="sendPhoto"):
+        return await bot.send_photo(chat_id, photo=file_id, caption=caption)
+
+
 async def send_form():
     """Отправка аффирмации в канал"""
     try:
         aff = await get_next_affirmation()
-        photo_path = await get_affirmation_photo(aff["image_id"], aff["text"])
         caption = f"✨\n\n\n\nСтавь ❤️ и другой увидит, что он не один\n\n@mentally_fit"
+        await send_affirmation_photo("@test_devcanvas_bot", aff, caption)
         
-        await bot.send_photo(
-            "@test_devcanvas_bot",
-            photo=FSInputFile(photo_path),
-            caption=caption
-        )
-        
-        logger.info(f"✅ Отправлена аффирмация #{aff['id']}: {aff['text'][:30]}...")
-    except Exception as e:
-        logger.error(f"❌ Ошибка отправки теста формы аффирмации: {e}")
+        logger.info("✅ Отправлена аффирмация #%s: %.30s...", aff["id"], aff["text"])
+    except Exception:
+        logger.exception("❌ Ошибка отправки теста формы аффирмации")
 
 
 
-async def send_affirmation():
-    """Отправка аффирмации в канал"""
+def log_post(channel_id: int, tz_name: str, aff: dict | None, scheduled_at: datetime | None, started: float,
+             message=None, error: str | None = None):
+    """Запись в журнал отправок (в базу уходит пачкой)"""
+    post_log.record(PostRecord(
+        channel_id=channel_id,
+        affirmation_id=aff["id"] if aff else None,
+        scheduled_at=scheduled_at,
+        sent_at=datetime.now(pytz.timezone(tz_name)),
+        latency_ms=(perf_counter() - started) * 1000,
+        file_id=photo_file_id(message),
+        message_id=getattr(message, "message_id", None),
+        error=error,
+    ))
+
+
+async def send_affirmation(channel_id: int = DEFAULT_CHANNEL_ID, scheduled_at: datetime | None = None):
+    """Отправка аффирмации в канал; scheduled_at — слот расписания, если отправка плановая"""
+    started = perf_counter()
+    tz_name = TZ_NAME
+    aff = None
     try:
-        aff = await get_next_affirmation()
-        photo_path = await get_affirmation_photo(aff["image_id"], aff["text"])
-        caption = f"✨\n\n\n\nСтавь ❤️ и другой увидит, что он не один\n\n@mentally_fit"
+        channel = await get_channel(channel_id)
+        if channel is None:
+            raise LookupError(f"Канал #{channel_id} не найден")
+        tz_name = channel["tz_name"]
         
-        await bot.send_photo(
-            CHANNEL_ID,
-            photo=FSInputFile(photo_path),
-            caption=caption
-        )
+        aff = await get_next_affirmation(channel_id)
+        caption = render_caption(channel["caption"], aff)
+        message = await send_affirmation_photo(channel["chat_id"], aff, caption)
         
-        logger.info(f"✅ Отправлена аффирмация #{aff['id']}: {aff['text'][:30]}...")
+        POSTS.inc(result="ok")
+        logger.info("✅ [%s] Отправлена аффирмация #%s: %.30s...", channel["chat_id"], aff["id"], aff["text"])
+        log_post(channel_id, tz_name, aff, scheduled_at, started, message)
     except Exception as e:
-        logger.error(f"❌ Ошибка отправки аффирмации: {e}")
+        POSTS.inc(result="error")
+        logger.exception("❌ Ошибка отправки аффирмации в канал #%s", channel_id)
+        log_post(channel_id, tz_name, aff, scheduled_at, started, error=repr(e)[:500])
+
+
+def on_job_submitted(event):
+    """Опоздание фактического запуска задачи относительно времени cron"""
+    now = datetime.now(tz)
+    for run_time in event.scheduled_run_times:
+        SCHEDULER_LAG.observe((now - run_time).total_seconds(), job=event.job_id)
 
 
-async def load_schedule():
-    """Загрузка расписания из БД в планировщик"""
-    scheduler.remove_all_jobs()
+scheduler.add_listener(on_job_submitted, EVENT_JOB_SUBMITTED)
+
+
+def last_slot(now: datetime, time_str: str) -> datetime:
+    """Последнее наступившее время time_str (сегодня или вчера) в поясе now"""
+    t = time.fromisoformat(time_str)
+    slot = now.replace(hour=t.hour, minute=t.minute, second=0, microsecond=0)
+    if slot > now:
+        slot -= timedelta(days=1)
+    return slot
+
+
+async def claim_post(channel_id: int, time_str: str) -> datetime | None:
+    """Занять слот расписания: время слота или None, если его уже отправил другой процесс"""
+    channel = await get_channel(channel_id)
+    now = datetime.now(pytz.timezone(channel["tz_name"]))
+    slot = last_slot(now, time_str)
+    async with connect_db() as db:
+        cursor = await db.execute(
+            "INSERT OR IGNORE INTO post_claims (channel_id, slot, worker, claimed_at) VALUES (?, ?, ?, ?)",
+            (channel_id, slot.isoformat(), WORKER_ID, now.isoformat())
+        )
+        claimed = slot if cursor.rowcount == 1 else None
+        await db.execute(
+            "DELETE FROM post_claims WHERE claimed_at < ?",
+            ((now - timedelta(days=POST_CLAIMS_DAYS)).isoformat(),)
+        )
+        await db.commit()
+    return claimed
+
+
+async def scheduled_post(channel_id: int, time_str: str):
+    """Задача планировщика: отправка по расписанию не больше одного раза на слот"""
+    slot = await claim_post(channel_id, time_str)
+    if slot is not None:
+        await send_affirmation(channel_id, slot)
+    else:
+        logger.info("⏭ Канал #%s: слот %s уже отправлен другим процессом", channel_id, time_str)
+
+
+async def load_schedule(channel_id: int | None = None):
+    """Загрузка расписания из БД в планировщик: всех каналов или только одного"""
+    prefix = "post_" if channel_id is None else f"post_{channel_id}_"
+    for job in scheduler.get_jobs():
+        if job.id.startswith(prefix):
+            job.remove()
     
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT post_time FROM schedule ORDER BY post_time")
+    async with connect_db() as db:
+        cursor = await db.execute("""
+            SELECT s.channel_id, s.post_time, c.tz_name
+            FROM channel_schedule s
+            JOIN channels c ON c.id = s.channel_id
+            WHERE ? IS NULL OR s.channel_id = ?
+            ORDER BY s.channel_id, s.post_time
+        """, (channel_id, channel_id))
         times = await cursor.fetchall()
     
-    for time_str, in times:
+    for job_channel_id, time_str, tz_name in times:
         try:
             t = time.fromisoformat(time_str)
             scheduler.add_job(
-                send_affirmation,
+                scheduled_post,
                 'cron',
                 hour=t.hour,
                 minute=t.minute,
-                id=f"post_{time_str}",
+                timezone=pytz.timezone(tz_name),
+                args=[job_channel_id, time_str],
+                id=f"post_{job_channel_id}_{time_str}",
                 replace_existing=True
             )
-            logger.info(f"✅ Добавлена задача на {time_str}")
-        except Exception as e:
-            logger.error(f"❌ Ошибка добавления задачи {time_str}: {e}")
+            logger.info("✅ Канал #%s: добавлена задача на %s (%s)", job_channel_id, time_str, tz_name)
+        except Exception:
+            logger.exception("❌ Ошибка добавления задачи %s для канала #%s", time_str, job_channel_id)
+
+
+async def schedule_fingerprint() -> tuple:
+    """Расписание всех каналов с их поясами: лидер сравнивает его, чтобы заметить правки из других процессов"""
+    async with connect_db() as db:
+        cursor = await db.execute("""
+            SELECT s.channel_id, s.post_time, c.tz_name
+            FROM channel_schedule s
+            JOIN channels c ON c.id = s.channel_id
+            ORDER BY s.channel_id, s.post_time
+        """)
+        return tuple(await cursor.fetchall())
+
+
+async def backup_database():
+    """Онлайн-бэкап базы в DATA_DIR/backups с ротацией"""
+    async with backup_lock:
+        info = await run_backup(DB_PATH, DATA_DIR / "backups", BACKUP_KEEP, BACKUP_KEEP_WEEKS)
+    BACKUP_SECONDS.observe(info.copy_seconds, stage="copy")
+    BACKUP_SECONDS.observe(info.compress_seconds, stage="compress")
+    logger.info(
+        "💾 Бэкап %s: %.0f → %.0f KiB, копирование %.2f с, сжатие %.2f с",
+        info.path.name, info.db_size / 1024, info.size / 1024, info.copy_seconds, info.compress_seconds
+    )
+    return info
+
+
+async def scheduled_backup():
+    """Задача планировщика: ошибка бэкапа не должна ронять планировщик"""
+    try:
+        await backup_database()
+    except Exception:
+        logger.exception("❌ Ошибка бэкапа")
+
+
+def schedule_backup():
+    """Ежедневный бэкап в BACKUP_TIME"""
+    if not BACKUP_TIME:
+        return
+    t = time.fromisoformat(BACKUP_TIME)
+    scheduler.add_job(scheduled_backup, 'cron', hour=t.hour, minute=t.minute, id="backup", replace_existing=True)
+    logger.info("💾 Бэкап базы ежедневно в %s (%s)", BACKUP_TIME, TZ_NAME)
+
+
+async def prune_post_log():
+    """Задача планировщика: удалить сырые записи журнала старше POST_LOG_DAYS"""
+    try:
+        removed = await post_log.prune(datetime.now(tz) - timedelta(days=POST_LOG_DAYS))
+        if removed:
+            logger.info("🧹 Журнал отправок: удалено %s записей старше %s дн.", removed, POST_LOG_DAYS)
+    except Exception:
+        logger.exception("❌ Ошибка очистки журнала отправок")
+
+
+def schedule_post_log_prune():
+    """Очистка журнала раз в 6 часов; POST_LOG_DAYS=0 — хранить всё"""
+    if POST_LOG_DAYS > 0:
+        # Не "post_...": этот префикс у задач постинга, load_schedule снимает их все при перезагрузке
+        scheduler.add_job(prune_post_log, 'interval', hours=6, id="log_prune", replace_existing=True)
+
+
+def metrics_summary() -> str:
+    """Короткая сводка метрик для экрана статуса"""
+    pick_ms = sum(PICK_SECONDS.stats(stage=s)["mean"] for s in ("select", "mark")) * 1000
+    render_ms = sum(RENDER_SECONDS.stats(stage=s)["mean"] for s in RENDER_STAGES) * 1000
+    upload = UPLOAD_SECONDS.stats(method="sendPhoto")
+    lags = [SCHEDULER_LAG.stats(job=job.id) for job in scheduler.get_jobs() if job.id.startswith("post_")]
+    last_lag = max((lag["last"] for lag in lags if lag["count"]), default=0.0)
+    
+    return (
+        f"⏱ Выбор из БД: *{pick_ms:.1f} мс*\n"
+        f"🖼 Рендер: *{render_ms:.0f} мс*, кэш: *{IMAGE_CACHE.value(result='hit'):.0f}*/"
+        f"*{IMAGE_CACHE.value(result='miss'):.0f}* (попадания/промахи)\n"
+        f"📤 Загрузка: *{upload['mean'] * 1000:.0f} мс*, файлов: *{PHOTO_UPLOADS.value(result='upload'):.0f}*, "
+        f"повторно: *{PHOTO_UPLOADS.value(result='file_id') + PHOTO_UPLOADS.value(result='shared'):.0f}*, "
+        f"ошибок отправки: *{POSTS.value(result='error'):.0f}*\n"
+        f"⏰ Опоздание планировщика: *{last_lag:.2f} с*"
+    )
 
 
 def get_main_keyboard():
     """Главная клавиатура админ-панели"""
+    if profiler.active:
+        profile_button = InlineKeyboardButton(text="⏹ Стоп профиля", callback_data="profile_stop")
+    else:
+        profile_button = InlineKeyboardButton(text="🔬 Профиль", callback_data="profile_start")
+    
     return InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(text="📊 Статус", callback_data="status"),
@@ -799,6 +1047,24 @@ def get_main_keyboard():
         ],
         [
             InlineKeyboardButton(text="📤 Тест офориления", callback_data="test_format")
+        ],
+        [
+            InlineKeyboardButton(text="📡 Каналы", callback_data="channels"),
+            InlineKeyboardButton(text="➕ Канал", callback_data="add_channel")
+        ],
+        [
+            InlineKeyboardButton(text="🌍 Часовой пояс", callback_data="set_tz"),
+            InlineKeyboardButton(text="✏️ Подпись", callback_data="set_caption")
+        ],
+        [
+            profile_button,
+            InlineKeyboardButton(text="🧠 Память", callback_data="memory_snapshot"),
+            InlineKeyboardButton(text="🧵 Задачи", callback_data="dump_tasks")
+        ],
+        [
+            InlineKeyboardButton(text="🔎 Поиск", callback_data="search"),
+            InlineKeyboardButton(text="📈 История", callback_data="post_history"),
+            InlineKeyboardButton(text="💾 Бэкап", callback_data="backup_now")
         ]
     ])
 
@@ -823,34 +1089,47 @@ async def start_handler(msg: Message):
 
 
 @dp.callback_query(F.data == "status")
-async def status_cb(cb: CallbackQuery):
+async def status_cb(cb: CallbackQuery, state: FSMContext):
     """Показ статуса бота"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT COUNT(*) FROM affirmations")
-        total = (await cursor.fetchone())[0]
-        
-        cursor = await db.execute("SELECT COUNT(*) FROM affirmations WHERE used = 1")
-        used_total = (await cursor.fetchone())[0]
-        
-        remaining = total - used_total
-        
-        cursor = await db.execute("SELECT post_time FROM schedule ORDER BY post_time")
-        times = [row[0] for row in await cursor.fetchall()]
+    channel_id = await get_admin_channel(state)
+    channel = await get_channel(channel_id)
+    stats = await get_channel_stats(channel_id)
+    times = await get_channel_times(channel_id)
+    # Сводка за неделю — из post_daily; буфер журнала сначала дописываем, чтобы видеть и последние отправки
+    await post_log.flush()
+    today = datetime.now(pytz.timezone(channel["tz_name"])).date()
+    week = await post_log.totals(channel_id, (today - timedelta(days=6)).isoformat())
     
-    jobs = scheduler.get_jobs()
-    active_jobs = len([j for j in jobs if "post_" in j.id])
+    jobs = [j for j in scheduler.get_jobs() if j.id.startswith(f"post_{channel_id}_")]
+    # У задач, добавленных до старта планировщика, next_run_time ещё не вычислен
+    next_runs = [j.next_run_time for j in jobs if getattr(j, "next_run_time", None)]
+    next_run = min(next_runs).strftime("%d.%m %H:%M") if next_runs else "—"
     
     text = (
         f"📊 *Статус бота*\n\n"
-        f"📚 Всего аффирмаций: *{total}*\n"
-        f"✅ Использовано: *{used_total}*\n"
-        f"🔥 Осталось до нового круга: *{remaining}*\n\n"
+        f"📡 Канал: *{escape_md(channel['chat_id'])}* (#{channel_id})\n"
+        f"📚 Всего аффирмаций: *{stats['total']}*\n"
+        f"✅ Использовано: *{stats['used']}*\n"
+        f"🔥 Осталось до нового круга: *{stats['remaining']}*\n"
+        f"🔁 Круг: *{channel['cycle']}*\n"
+        f"📈 За 7 дней: *{week['posts']}* постов, ошибок *{week['errors']}*, "
+        f"опоздание *{week['delay_s']:.1f} с*\n\n"
         f"⏰ Время постинга: *{', '.join(times) or 'Не настроено'}*\n"
-        f"🔄 Активных задач: *{active_jobs}*\n"
-        f"🌍 Часовой пояс: *{TZ_NAME}*"
+        f"🔄 Активных задач: *{len(jobs)}*, следующий пост: *{next_run}*\n"
+        f"🌍 Часовой пояс: *{escape_md(channel['tz_name'])}*\n\n"
+        f"{metrics_summary()}"
     )
     
-    await cb.message.edit_text(text, reply_markup=get_main_keyboard(), parse_mode="Markdown")
+    # Повторное нажатие без изменений не трогает сообщение (Telegram ответил бы «message is not modified»)
+    key = (cb.message.chat.id, cb.message.message_id)
+    if status_views.get(key) == (text, cb.message.text):
+        await cb.answer("Без изменений")
+        return
+    
+    message = await cb.message.edit_text(text, reply_markup=get_main_keyboard(), parse_mode="Markdown")
+    if len(status_views) > 100:
+        status_views.clear()
+    status_views[key] = (text, getattr(message, "text", None))
     await cb.answer()
 
 
@@ -861,12 +1140,326 @@ async def reload_cb(cb: CallbackQuery):
     await cb.answer("✅ Расписание перезагружено!", show_alert=True)
 
 
+@dp.callback_query(F.data == "channels")
+async def channels_cb(cb: CallbackQuery, state: FSMContext):
+    """Список каналов для выбора"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    current = await get_admin_channel(state)
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"{'✅ ' if channel['id'] == current else ''}#{channel['id']} {channel['chat_id']}",
+            callback_data=f"channel:{channel['id']}"
+        )]
+        for channel in await list_channels()
+    ]
+    buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="status")])
+    
+    await cb.message.edit_text(
+        "📡 *Каналы*\n\nВыбери канал, которым управляет панель:",
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons),
+        parse_mode="Markdown"
+    )
+    await cb.answer()
+
+
+@dp.callback_query(F.data == "post_history")
+async def post_history_cb(cb: CallbackQuery, state: FSMContext):
+    """Отправки канала по дням за две недели и итог за всё время — из дневных сводок"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    channel_id = await get_admin_channel(state)
+    channel = await get_channel(channel_id)
+    await post_log.flush()
+    today = datetime.now(pytz.timezone(channel["tz_name"])).date()
+    days = await post_log.daily(channel_id, (today - timedelta(days=13)).isoformat())
+    total = await post_log.totals(channel_id)
+    
+    lines = [
+        f"{date.fromisoformat(d['day']).strftime('%d.%m')}: *{d['posts']}*"
+        + (f", ошибок *{d['errors']}*" if d["errors"] else "")
+        + f", опоздание {d['delay_s']:.1f} с, отправка {d['latency_ms']:.0f} мс"
+        for d in days
+    ]
+    text = (
+        f"📈 *История отправок* {escape_md(channel['chat_id'])} (#{channel_id})\n\n"
+        + ("\n".join(lines) or "За две недели отправок не было")
+        + f"\n\nВсего: *{total['posts']}* постов, ошибок *{total['errors']}*"
+    )
+    await cb.message.edit_text(
+        text,
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="⬅️ Назад", callback_data="status")]]),
+        parse_mode="Markdown"
+    )
+    await cb.answer()
+
+
+async def search_view(state: FSMContext, page: int) -> tuple[str, InlineKeyboardMarkup]:
+    """Текст и клавиатура страницы поиска; запрос хранится в данных FSM (в callback_data не влезет)"""
+    data = await state.get_data()
+    query = data.get("search_query", "")
+    results, has_next = await search_affirmations(query, data.get("channel_id", DEFAULT_CHANNEL_ID), page)
+    
+    marks = {None: "➖", 0: "🆕", 1: "✅"}
+    lines = [
+        f"{marks[r['used']]}{' 🖼' if r['cached'] else ''} *#{r['id']}* {escape_md(r['text'][:80])}"
+        for r in results
+    ]
+    text = (
+        f"🔎 *{escape_md(query)}* — стр. {page + 1}\n\n"
+        + ("\n".join(lines) or "Ничего не найдено")
+        + "\n\n✅ использована, 🆕 ещё нет, ➖ не в корпусе канала, 🖼 картинка готова"
+    )
+    
+    buttons = [
+        [InlineKeyboardButton(text=f"#{r['id']} {r['text'][:40]}", callback_data=f"aff:{r['id']}")]
+        for r in results
+    ]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"search_page:{page - 1}"))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"search_page:{page + 1}"))
+    if nav:
+        buttons.append(nav)
+    buttons.append([
+        InlineKeyboardButton(text="🔎 Новый поиск", callback_data="search"),
+        InlineKeyboardButton(text="⬅️ Назад", callback_data="status")
+    ])
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+async def show_search(msg: Message, state: FSMContext, query: str):
+    """Первая страница поиска новым сообщением"""
+    await state.set_state(None)
+    await state.update_data(search_query=query.strip()[:100])
+    text, keyboard = await search_view(state, 0)
+    await msg.answer(text, reply_markup=keyboard, parse_mode="Markdown")
+
+
+@dp.message(Command("search"))
+async def search_command(msg: Message, command: CommandObject, state: FSMContext):
+    """/search слова или /search 123 — поиск по корпусу"""
+    if msg.from_user.id != ADMIN_ID:
+        return
+    
+    if not command.args:
+        await msg.answer("🔎 Пришли слова для поиска или номер аффирмации")
+        await state.set_state(AdminStates.waiting_search)
+        return
+    await show_search(msg, state, command.args)
+
+
+@dp.callback_query(F.data == "search")
+async def search_cb(cb: CallbackQuery, state: FSMContext):
+    """Поиск по корпусу аффирмаций"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    await cb.message.edit_text(
+        "🔎 *Поиск*\n\nПришли слова (ищутся по началу, все сразу) или номер аффирмации, например 123.",
+        parse_mode="Markdown"
+    )
+    await state.set_state(AdminStates.waiting_search)
+    await cb.answer()
+
+
+@dp.message(StateFilter(AdminStates.waiting_search), F.text)
+async def process_search(msg: Message, state: FSMContext):
+    """Обработка запроса поиска"""
+    if msg.from_user.id != ADMIN_ID:
+        return
+    
+    await show_search(msg, state, msg.text)
+
+
+@dp.callback_query(F.data.startswith("search_page:"))
+async def search_page_cb(cb: CallbackQuery, state: FSMContext):
+    """Листание результатов поиска"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    text, keyboard = await search_view(state, int(cb.data.split(":", 1)[1]))
+    await cb.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    await cb.answer()
+
+
+@dp.callback_query(F.data.startswith("aff:"))
+async def preview_cb(cb: CallbackQuery, state: FSMContext):
+    """Превью аффирмации админу: картинка из кэша (или по file_id), рендер — только если её ещё нет"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    aff = await get_affirmation(int(cb.data.split(":", 1)[1]))
+    if aff is None:
+        await cb.answer("Аффирмация не найдена", show_alert=True)
+        return
+    
+    await cb.answer()
+    await send_affirmation_photo(cb.message.chat.id, aff, f"🔎 #{aff['id']}\n\n{aff['text']}")
+
+
+@dp.callback_query(F.data.startswith("channel:"))
+async def select_channel_cb(cb: CallbackQuery, state: FSMContext):
+    """Выбор канала для админ-панели"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    channel_id = int(cb.data.split(":", 1)[1])
+    if await get_channel(channel_id) is None:
+        await cb.answer("❌ Канал не найден!", show_alert=True)
+        return
+    
+    await state.update_data(channel_id=channel_id)
+    await status_cb(cb, state)
+
+
+@dp.callback_query(F.data == "add_channel")
+async def add_channel_cb(cb: CallbackQuery, state: FSMContext):
+    """Добавление канала"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    text = (
+        f"➕ *Новый канал*\n\n"
+        f"Введи: *@канал [часовой пояс] [с-по]*\n"
+        f"Например: @my\\_channel Europe/Berlin 1-250\n\n"
+        f"По умолчанию пояс {escape_md(TZ_NAME)}, корпус — все аффирмации."
+    )
+    
+    await cb.message.edit_text(text, parse_mode="Markdown")
+    await state.set_state(AdminStates.waiting_channel_add)
+    await cb.answer()
+
+
+@dp.message(StateFilter(AdminStates.waiting_channel_add), F.text)
+async def process_channel_add(msg: Message, state: FSMContext):
+    """Обработка добавления канала"""
+    if msg.from_user.id != ADMIN_ID:
+        return
+    
+    tz_name, first, last = TZ_NAME, 1, None
+    
+    try:
+        chat_id, *options = msg.text.split()
+        for option in options:
+            if option.replace("-", "").isdigit():
+                first, last = (int(x) for x in option.split("-", 1))
+            else:
+                pytz.timezone(option)
+                tz_name = option
+        
+        if last is not None and first > last:
+            await msg.answer(f"❌ Пустой диапазон {first}-{last}: начало больше конца.")
+            await state.set_state(None)
+            return
+        channel_id = await create_channel(chat_id, tz_name, first, last)
+    except (ValueError, pytz.UnknownTimeZoneError):
+        await msg.answer("❌ Неверный формат! Пример: @my_channel Europe/Berlin 1-250")
+    except LookupError as e:
+        await msg.answer(f"❌ {e}")
+    except aiosqlite.IntegrityError:
+        await msg.answer("❌ Этот канал уже добавлен!")
+    else:
+        await state.update_data(channel_id=channel_id)
+        await msg.answer(
+            f"✅ Канал #{channel_id} {chat_id} добавлен и выбран. Добавь ему время постинга.",
+            reply_markup=get_main_keyboard()
+        )
+    
+    await state.set_state(None)
+
+
+@dp.callback_query(F.data == "set_tz")
+async def set_tz_cb(cb: CallbackQuery, state: FSMContext):
+    """Изменение часового пояса канала"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    channel = await get_channel(await get_admin_channel(state))
+    
+    text = (
+        f"🌍 *Часовой пояс*\n\n"
+        f"Текущий: *{escape_md(channel['tz_name'])}*\n\n"
+        f"Введи новый, например: Europe/Moscow или Asia/Almaty"
+    )
+    
+    await cb.message.edit_text(text, parse_mode="Markdown")
+    await state.set_state(AdminStates.waiting_tz)
+    await cb.answer()
+
+
+@dp.message(StateFilter(AdminStates.waiting_tz), F.text)
+async def process_tz(msg: Message, state: FSMContext):
+    """Обработка изменения часового пояса"""
+    if msg.from_user.id != ADMIN_ID:
+        return
+    
+    channel_id = await get_admin_channel(state)
+    tz_name = msg.text.strip()
+    
+    try:
+        pytz.timezone(tz_name)
+    except pytz.UnknownTimeZoneError:
+        await msg.answer("❌ Неизвестный часовой пояс! Например: Europe/Moscow")
+    else:
+        async with connect_db() as db:
+            await db.execute("UPDATE channels SET tz_name = ? WHERE id = ?", (tz_name, channel_id))
+            await db.commit()
+        
+        await load_schedule(channel_id)
+        await msg.answer(f"✅ Часовой пояс изменён на {tz_name}", reply_markup=get_main_keyboard())
+    
+    await state.set_state(None)
+
+
+@dp.callback_query(F.data == "set_caption")
+async def set_caption_cb(cb: CallbackQuery, state: FSMContext):
+    """Изменение подписи к постам канала"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    text = (
+        f"✏️ *Подпись к постам*\n\n"
+        f"Пришли новый текст подписи.\n"
+        f"Можно использовать {{text}} — текст аффирмации и {{id}} — её номер."
+    )
+    
+    await cb.message.edit_text(text, parse_mode="Markdown")
+    await state.set_state(AdminStates.waiting_caption)
+    await cb.answer()
+
+
+@dp.message(StateFilter(AdminStates.waiting_caption), F.text)
+async def process_caption(msg: Message, state: FSMContext):
+    """Обработка изменения подписи"""
+    if msg.from_user.id != ADMIN_ID:
+        return
+    
+    channel_id = await get_admin_channel(state)
+    async with connect_db() as db:
+        await db.execute("UPDATE channels SET caption = ? WHERE id = ?", (msg.text, channel_id))
+        await db.commit()
+    
+    await msg.answer("✅ Подпись обновлена", reply_markup=get_main_keyboard())
+    await state.set_state(None)
+
+
 @dp.callback_query(F.data == "change_time")
 async def change_time_cb(cb: CallbackQuery, state: FSMContext):
     """Изменение времени постинга"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT post_time FROM schedule ORDER BY post_time")
-        times = [row[0] for row in await cursor.fetchall()]
+    times = await get_channel_times(await get_admin_channel(state))
     
     text = (
         f"⏰ *Изменение времени*\n\n"
@@ -886,28 +1479,31 @@ async def process_time_change(msg: Message, state: FSMContext):
     if msg.from_user.id != ADMIN_ID:
         return
     
+    channel_id = await get_admin_channel(state)
+    
     try:
         time.fromisoformat(msg.text.strip())
         
-        async with aiosqlite.connect(DB_PATH) as db:
-            await db.execute("DELETE FROM schedule")
-            await db.execute("INSERT INTO schedule (post_time) VALUES (?)", (msg.text.strip(),))
+        async with connect_db() as db:
+            await db.execute("DELETE FROM channel_schedule WHERE channel_id = ?", (channel_id,))
+            await db.execute(
+                "INSERT INTO channel_schedule (channel_id, post_time) VALUES (?, ?)",
+                (channel_id, msg.text.strip())
+            )
             await db.commit()
         
-        await load_schedule()
+        await load_schedule(channel_id)
         await msg.answer(f"✅ Время изменено на {msg.text.strip()}", reply_markup=get_main_keyboard())
     except ValueError:
         await msg.answer("❌ Неверный формат! Используй HH:MM (например, 08:00)")
     
-    await state.clear()
+    await state.set_state(None)
 
 
 @dp.callback_query(F.data == "add_time")
 async def add_time_cb(cb: CallbackQuery, state: FSMContext):
     """Добавление времени постинга"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT post_time FROM schedule ORDER BY post_time")
-        times = [row[0] for row in await cursor.fetchall()]
+    times = await get_channel_times(await get_admin_channel(state))
     
     text = (
         f"➕ *Добавление времени*\n\n"
@@ -926,29 +1522,32 @@ async def process_time_add(msg: Message, state: FSMContext):
     if msg.from_user.id != ADMIN_ID:
         return
     
+    channel_id = await get_admin_channel(state)
+    
     try:
         time.fromisoformat(msg.text.strip())
         
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with connect_db() as db:
             try:
-                await db.execute("INSERT INTO schedule (post_time) VALUES (?)", (msg.text.strip(),))
+                await db.execute(
+                    "INSERT INTO channel_schedule (channel_id, post_time) VALUES (?, ?)",
+                    (channel_id, msg.text.strip())
+                )
                 await db.commit()
-                await load_schedule()
+                await load_schedule(channel_id)
                 await msg.answer(f"✅ Добавлено время {msg.text.strip()}", reply_markup=get_main_keyboard())
             except Exception:
                 await msg.answer("❌ Это время уже добавлено!")
     except ValueError:
         await msg.answer("❌ Неверный формат! Используй HH:MM")
     
-    await state.clear()
+    await state.set_state(None)
 
 
 @dp.callback_query(F.data == "del_time")
 async def del_time_cb(cb: CallbackQuery, state: FSMContext):
     """Удаление времени постинга"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT post_time FROM schedule ORDER BY post_time")
-        times = [row[0] for row in await cursor.fetchall()]
+    times = await get_channel_times(await get_admin_channel(state))
     
     if not times:
         await cb.answer("❌ Нет времени для удаления!", show_alert=True)
@@ -971,23 +1570,28 @@ async def process_time_delete(msg: Message, state: FSMContext):
     if msg.from_user.id != ADMIN_ID:
         return
     
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("DELETE FROM schedule WHERE post_time = ?", (msg.text.strip(),))
+    channel_id = await get_admin_channel(state)
+    
+    async with connect_db() as db:
+        cursor = await db.execute(
+            "DELETE FROM channel_schedule WHERE channel_id = ? AND post_time = ?",
+            (channel_id, msg.text.strip())
+        )
         await db.commit()
         
         if cursor.rowcount > 0:
-            await load_schedule()
+            await load_schedule(channel_id)
             await msg.answer(f"✅ Удалено время {msg.text.strip()}", reply_markup=get_main_keyboard())
         else:
             await msg.answer("❌ Такого времени нет в расписании!")
     
-    await state.clear()
+    await state.set_state(None)
 
 
 @dp.callback_query(F.data == "test_post")
-async def test_post_cb(cb: CallbackQuery):
+async def test_post_cb(cb: CallbackQuery, state: FSMContext):
     """Тестовая отправка аффирмации"""
-    await send_affirmation()
+    await send_affirmation(await get_admin_channel(state))
     await cb.answer("✅ Тестовая аффирмация отправлена!", show_alert=True)
     
 @dp.callback_query(F.data == "test_form")
@@ -997,14 +1601,348 @@ async def test_form_cb(cb: CallbackQuery):
 
 
 
+@dp.callback_query(F.data == "profile_start")
+async def profile_start_cb(cb: CallbackQuery):
+    """Запуск сессии профилирования"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    if profiler.active:
+        await cb.answer("🔬 Профилирование уже идёт", show_alert=True)
+        return
+    
+    profiler.start()
+    await cb.message.edit_reply_markup(reply_markup=get_main_keyboard())
+    await cb.answer(f"🔬 Профилирование запущено, автостоп через {PROFILE_TIMEOUT} с", show_alert=True)
+
+
+@dp.callback_query(F.data == "profile_stop")
+async def profile_stop_cb(cb: CallbackQuery):
+    """Остановка профилирования и отправка отчёта"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    if not profiler.active:
+        await cb.answer("❌ Профилирование не запущено (или уже остановлено по таймауту)", show_alert=True)
+        await cb.message.edit_reply_markup(reply_markup=get_main_keyboard())
+        return
+    
+    report = profiler.stop()
+    await cb.message.edit_reply_markup(reply_markup=get_main_keyboard())
+    await cb.answer()
+    await send_profile_report(report)
+
+
+@dp.callback_query(F.data == "memory_snapshot")
+async def memory_snapshot_cb(cb: CallbackQuery):
+    """Снимок tracemalloc; повторный снимок показывает разницу с предыдущим"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    first = not memory_tracer.active
+    report = memory_tracer.snapshot()
+    stamp = datetime.now(tz).strftime("%Y%m%d-%H%M%S")
+    caption = (
+        f"🧠 Трассировка памяти включена на {PROFILE_TIMEOUT} с. Нажми ещё раз, чтобы увидеть разницу."
+        if first else "🧠 Разница с прошлым снимком"
+    )
+    await cb.answer()
+    await cb.message.answer_document(
+        BufferedInputFile(report.encode(), filename=f"memory-{stamp}.txt"),
+        caption=caption
+    )
+
+
+@dp.callback_query(F.data == "dump_tasks")
+async def dump_tasks_cb(cb: CallbackQuery):
+    """Стеки всех asyncio-задач"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    stamp = datetime.now(tz).strftime("%Y%m%d-%H%M%S")
+    await cb.answer()
+    await cb.message.answer_document(
+        BufferedInputFile(dump_tasks().encode(), filename=f"tasks-{stamp}.txt"),
+        caption="🧵 Стеки asyncio-задач"
+    )
+
+
+@dp.callback_query(F.data == "backup_now")
+async def backup_now_cb(cb: CallbackQuery):
+    """Бэкап базы вне расписания"""
+    if cb.from_user.id != ADMIN_ID:
+        await cb.answer("❌ Доступ только для админа.", show_alert=True)
+        return
+    
+    if backup_lock.locked():
+        await cb.answer("💾 Бэкап уже идёт", show_alert=True)
+        return
+    
+    await cb.answer("💾 Бэкап запущен")
+    try:
+        info = await backup_database()
+    except Exception as e:
+        logger.exception("❌ Ошибка бэкапа")
+        await cb.message.answer(f"❌ Ошибка бэкапа: {e}")
+        return
+    
+    await cb.message.answer(
+        f"💾 Бэкап готов: *{escape_md(info.path.name)}*\n"
+        f"Размер: *{info.size / 1024:.0f} KiB* (база {info.db_size / 1024:.0f} KiB)\n"
+        f"Копирование: *{info.copy_seconds:.2f} с*, сжатие: *{info.compress_seconds:.2f} с*\n"
+        f"SHA-256: `{info.sha256[:16]}…`",
+        parse_mode="Markdown"
+    )
+
+
+@dp.update.outer_middleware()
+async def first_update_middleware(handler, event, data):
+    """Время от старта до первого обработанного апдейта"""
+    result = await handler(event, data)
+    if "first_update" not in STARTUP_TIMINGS:
+        STARTUP_TIMINGS["first_update"] = (perf_counter() - MODULE_STARTED) * 1000
+        logger.info("⏱ Первый апдейт обработан через %.0f мс после старта", STARTUP_TIMINGS["first_update"])
+    return result
+
+
+async def timed_startup_step(name: str, coro):
+    """Выполнить шаг старта и записать его длительность в STARTUP_TIMINGS"""
+    started = perf_counter()
+    result = await coro
+    STARTUP_TIMINGS[name] = (perf_counter() - started) * 1000
+    return result
+
+
+async def poll_updates(queue: UpdateQueue):
+    """Лидер: getUpdates у Telegram и в общую очередь; offset хранится вместе с очередью"""
+    allowed_updates = dp.resolve_used_update_types()
+    offset = await queue.offset()
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset, timeout=10, allowed_updates=allowed_updates, request_timeout=20
+            )
+        except Exception:
+            logger.exception("❌ Ошибка getUpdates")
+            await asyncio.sleep(1)
+            continue
+        if updates:
+            await queue.put([u.model_dump(mode="json", by_alias=True, exclude_none=True) for u in updates])
+            offset = updates[-1].update_id + 1
+
+
+async def consume_updates(queue: UpdateQueue):
+    """Все процессы: разбирают очередь апдейтов и обрабатывают их через dp"""
+    slots = asyncio.Semaphore(CLUSTER_CONCURRENCY)
+    tasks = set()
+    in_flight = set()
+    
+    async def handle(raw: dict):
+        try:
+            await dp.feed_update(bot, Update.model_validate(raw, context={"bot": bot}))
+        except Exception:
+            logger.exception("❌ Ошибка обработки апдейта %s", raw["update_id"])
+        try:
+            await queue.ack(raw["update_id"])
+        except Exception:
+            # Неподтверждённый апдейт вернётся в очередь через claim_timeout
+            logger.exception("❌ Ошибка подтверждения апдейта %s", raw["update_id"])
+        finally:
+            in_flight.discard(raw["update_id"])
+            slots.release()
+    
+    async def keep_claims():
+        # Долгий обработчик (рендер с загрузкой, бэкап) не должен уйти второму процессу
+        while True:
+            await asyncio.sleep(queue.claim_timeout / 3)
+            if in_flight:
+                try:
+                    await queue.extend(list(in_flight))
+                except Exception:
+                    logger.exception("❌ Ошибка продления захвата апдейтов")
+    
+    keeper = asyncio.create_task(keep_claims())
+    try:
+        while True:
+            batch = await queue.claim(CLUSTER_CONCURRENCY)
+            if not batch:
+                await asyncio.sleep(0.05)
+                continue
+            for raw in batch:
+                await slots.acquire()
+                in_flight.add(raw["update_id"])
+                task = asyncio.create_task(handle(raw))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+    finally:
+        keeper.cancel()
+        # Остановка: начатые обработчики дорабатывают (недолго), не успевшие — прерываются,
+        # и все неподтверждённые апдейты сразу возвращаются в очередь — другим процессам
+        # не ждать claim_timeout. После этого обработчики к очереди уже не обращаются
+        if tasks:
+            _, stuck = await asyncio.wait(tasks, timeout=SHUTDOWN_GRACE)
+            for task in stuck:
+                task.cancel()
+            if stuck:
+                await asyncio.wait(stuck)
+        try:
+            await queue.release()
+        except Exception:
+            logger.exception("❌ Захваченные апдейты не возвращены в очередь")
+
+
+async def catch_up_missed_posts():
+    """Новый лидер отправляет слоты, пропущенные, пока лидера не было"""
+    window = timedelta(seconds=LEASE_TTL * 3)
+    for channel_id, time_str, tz_name in await schedule_fingerprint():
+        now = datetime.now(pytz.timezone(tz_name))
+        if now - last_slot(now, time_str) <= window:
+            await scheduled_post(channel_id, time_str)
+
+
+async def leadership_loop(lease: Lease, queue: UpdateQueue):
+    """Держать или перехватывать аренду лидера; у лидера работают планировщик и getUpdates"""
+    poller = None
+    catch_up = None
+    schedule = None
+    try:
+        while True:
+            try:
+                leader = await lease.acquire()
+            except Exception:
+                logger.exception("❌ Ошибка продления аренды лидера")
+                leader = False
+            
+            try:
+                if leader and poller is None:
+                    logger.info("👑 %s стал лидером", WORKER_ID)
+                    schedule = await schedule_fingerprint()
+                    await load_schedule()
+                    scheduler.resume()
+                    poller = asyncio.create_task(poll_updates(queue))
+                    # Досылка пропущенных постов не должна задерживать продление аренды
+                    catch_up = asyncio.create_task(catch_up_missed_posts())
+                elif leader:
+                    current = await schedule_fingerprint()
+                    if current != schedule:
+                        schedule = current
+                        await load_schedule()
+                elif poller is not None:
+                    logger.warning("⚠️ %s больше не лидер", WORKER_ID)
+                    scheduler.pause()
+                    # Досылкой пропущенных постов теперь занимается новый лидер
+                    for task in (poller, catch_up):
+                        if task is not None:
+                            task.cancel()
+                    poller = catch_up = None
+            except Exception:
+                logger.exception("❌ Ошибка обновления расписания лидера")
+            
+            await asyncio.sleep(lease.ttl / 3)
+    finally:
+        for task in (poller, catch_up):
+            if task is not None:
+                task.cancel()
+
+
+async def flush_post_log():
+    """Дописать буфер журнала при остановке; фоновые таймеры записи снимаются"""
+    try:
+        await post_log.close()
+    except Exception:
+        logger.exception("❌ Журнал отправок не дописан при остановке")
+
+
+async def run_cluster_worker():
+    """Процесс кластера: общая база, аренда лидера и разбор очереди апдейтов"""
+    logger.info("🧩 Кластерный режим, процесс %s", WORKER_ID)
+    # Корректная остановка освобождает аренду — лидер сменяется сразу, без ожидания LEASE_TTL
+    main_task = asyncio.current_task()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        with suppress(NotImplementedError):
+            asyncio.get_running_loop().add_signal_handler(sig, main_task.cancel)
+    
+    await init_db()
+    schedule_backup()
+    schedule_post_log_prune()
+    scheduler.start(paused=True)
+    lease = Lease(DB_PATH, "leader", WORKER_ID, LEASE_TTL)
+    queue = UpdateQueue(DB_PATH, WORKER_ID)
+    logger.info("✅ Процесс кластера готов к работе!")
+    workers = [asyncio.create_task(leadership_loop(lease, queue)), asyncio.create_task(consume_updates(queue))]
+    try:
+        await asyncio.gather(*workers)
+    except asyncio.CancelledError:
+        logger.info("🛑 Процесс %s останавливается", WORKER_ID)
+    finally:
+        # gather отдаёт отмену с первой отменённой задачей; очередь закрываем только после того,
+        # как consume_updates дождётся обработчиков и вернёт захваченные апдейты
+        for task in workers:
+            task.cancel()
+        await asyncio.wait(workers)
+        scheduler.shutdown(wait=False)
+        await flush_post_log()
+        # Сначала своё соединение очереди: незакрытый поток aiosqlite не даст процессу выйти
+        await queue.close()
+        try:
+            await lease.release()
+        except Exception:
+            logger.exception("❌ Аренда не освобождена, перейдёт к другому через LEASE_TTL")
+        await dp.storage.close()
+        await bot.session.close()
+
+
 async def main():
     """Главная функция запуска бота"""
+    global db_init_task
+    STARTUP_TIMINGS["module"] = (perf_counter() - MODULE_STARTED) * 1000
+    # Только при запуске бота: импорт botst (бенчмарки, simulate) не трогает корневой логгер.
+    # Процессы кластера пишут каждый в свой файл: RotatingFileHandler не умеет ротировать общий
+    setup_logging(
+        DATA_DIR / "logs",
+        f"bot-{os.getpid()}.log" if CLUSTER_MODE else "bot.log",
+        max_bytes=LOG_MAX_BYTES,
+        backups=LOG_BACKUPS,
+        burst=LOG_BURST,
+        interval=LOG_INTERVAL,
+    )
     logger.info("🚀 Запуск бота...")
-    await init_db()
-    await load_schedule()
-    scheduler.start()
+    if METRICS_PORT:
+        try:
+            await timed_startup_step("metrics", start_metrics_server(METRICS_HOST, METRICS_PORT))
+            logger.info("📈 Метрики: http://%s:%s/metrics", METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            # Порт занят (например, соседним процессом кластера) — бот работает и без метрик
+            logger.warning("⚠️ Метрики не запущены: %s", e)
+    
+    if CLUSTER_MODE:
+        await run_cluster_worker()
+        return
+    
+    # База готовится параллельно со стартом polling: обработчики дождутся её в connect_db()
+    db_init_task = asyncio.create_task(timed_startup_step("init_db", init_db()))
+    polling = asyncio.create_task(dp.start_polling(bot))
+    try:
+        await db_init_task
+        await timed_startup_step("load_schedule", load_schedule())
+        schedule_backup()
+        schedule_post_log_prune()
+        scheduler.start()
+    except Exception:
+        polling.cancel()
+        raise
+    
+    STARTUP_TIMINGS["ready"] = (perf_counter() - MODULE_STARTED) * 1000
+    logger.info("⏱ Старт: %s", ", ".join(f"{name} {ms:.0f} мс" for name, ms in STARTUP_TIMINGS.items()))
     logger.info("✅ Бот запущен и готов к работе!")
-    await dp.start_polling(bot)
+    try:
+        await polling
+    finally:
+        await flush_post_log()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,232 @@
+"""
+Общие примитивы для запуска нескольких процессов бота над одной SQLite-базой.
+
+- SQLiteStorage — FSM-хранилище aiogram, общее для всех процессов;
+- Lease — аренда с истечением по времени для выбора лидера (планировщик и getUpdates);
+- UpdateQueue — очередь апдейтов в той же базе: лидер кладёт, все процессы разбирают.
+
+Доставка апдейтов — «хотя бы один раз»: пока процесс жив, он продлевает захват
+апдейтов в работе (extend), и их никто не перехватит, сколько бы ни шёл обработчик.
+Если процесс упал посреди обработки, апдейт через claim_timeout получит другой процесс
+и обработает ещё раз.
+"""
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+
+import aiosqlite
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+
+def _key(key: StorageKey) -> str:
+    return ":".join(str(part) for part in (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny
+    ))
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-состояния и данные в таблице fsm; db_path — функция, чтобы путь можно было подменить"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._db = None
+        # Соединение одно на процесс: запросы и commit разных обработчиков не должны перемешиваться
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def _connection(self):
+        async with self._lock:
+            if self._db is None:
+                self._db = await aiosqlite.connect(self.db_path())
+                await self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS fsm (
+                        key TEXT PRIMARY KEY,
+                        state TEXT,
+                        data TEXT NOT NULL DEFAULT '{}'
+                    )
+                """)
+                await self._db.commit()
+            yield self._db
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        if isinstance(state, State):
+            state = state.state
+        async with self._connection() as db:
+            await db.execute(
+                "INSERT INTO fsm (key, state) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET state = excluded.state",
+                (_key(key), state)
+            )
+            await db.commit()
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        async with self._connection() as db:
+            rows = await db.execute_fetchall("SELECT state FROM fsm WHERE key = ?", (_key(key),))
+        return rows[0][0] if rows else None
+
+    async def set_data(self, key: StorageKey, data: dict) -> None:
+        async with self._connection() as db:
+            await db.execute(
+                "INSERT INTO fsm (key, data) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET data = excluded.data",
+                (_key(key), json.dumps(data, ensure_ascii=False))
+            )
+            await db.commit()
+
+    async def get_data(self, key: StorageKey) -> dict:
+        async with self._connection() as db:
+            rows = await db.execute_fetchall("SELECT data FROM fsm WHERE key = ?", (_key(key),))
+        return json.loads(rows[0][0]) if rows else {}
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+class Lease:
+    """
+    Аренда имени name на ttl секунд. acquire() продлевает свою аренду или забирает
+    истёкшую чужую; держатель должен вызывать его чаще, чем раз в ttl.
+    """
+
+    def __init__(self, db_path, name: str, holder: str, ttl: float):
+        self.db_path = db_path
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+
+    async def acquire(self) -> bool:
+        now = time.time()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            await db.execute("""
+                INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+            """, (self.name, self.holder, now + self.ttl, now))
+            await db.commit()
+            cursor = await db.execute("SELECT holder FROM leases WHERE name = ?", (self.name,))
+            return (await cursor.fetchone())[0] == self.holder
+
+    async def release(self):
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+            await db.commit()
+
+
+class UpdateQueue:
+    """
+    Очередь сырых апдейтов Telegram. Забранный апдейт, который не подтвердили и не
+    продлили за claim_timeout секунд (процесс упал), снова становится доступен другим.
+    Вместе с апдейтами хранится следующий offset getUpdates, чтобы новый лидер
+    не забрал повторно то, что уже обработано.
+    """
+
+    def __init__(self, db_path, worker: str, claim_timeout: float = 60.0):
+        self.db_path = db_path
+        self.worker = worker
+        self.claim_timeout = claim_timeout
+        self._db = None
+        # Соединением пользуются поллер, разбор очереди и все обработчики процесса
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def _connection(self):
+        async with self._lock:
+            if self._db is None:
+                self._db = await aiosqlite.connect(self.db_path)
+                await self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS update_queue (
+                        update_id INTEGER PRIMARY KEY,
+                        payload TEXT NOT NULL,
+                        claimed_by TEXT,
+                        claimed_at REAL
+                    )
+                """)
+                await self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS update_offset (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        next_update_id INTEGER NOT NULL
+                    )
+                """)
+                await self._db.commit()
+            try:
+                yield self._db
+            except BaseException:
+                # Отмена при остановке посреди транзакции оставила бы базу заблокированной
+                # для всех процессов; rollback встанет в поток aiosqlite после прерванного запроса
+                await self._db.rollback()
+                raise
+
+    async def put(self, updates: list[dict]):
+        async with self._connection() as db:
+            await db.executemany(
+                "INSERT OR IGNORE INTO update_queue (update_id, payload) VALUES (?, ?)",
+                ((u["update_id"], json.dumps(u, ensure_ascii=False)) for u in updates)
+            )
+            await db.execute(
+                "INSERT INTO update_offset (id, next_update_id) VALUES (1, ?) "
+                "ON CONFLICT(id) DO UPDATE SET next_update_id = MAX(next_update_id, excluded.next_update_id)",
+                (max(u["update_id"] for u in updates) + 1,)
+            )
+            await db.commit()
+
+    async def offset(self) -> int | None:
+        async with self._connection() as db:
+            rows = await db.execute_fetchall("SELECT next_update_id FROM update_offset WHERE id = 1")
+        return rows[0][0] if rows else None
+
+    async def claim(self, limit: int) -> list[dict]:
+        now = time.time()
+        async with self._connection() as db:
+            rows = await db.execute_fetchall("""
+                UPDATE update_queue SET claimed_by = ?, claimed_at = ?
+                WHERE update_id IN (
+                    SELECT update_id FROM update_queue
+                    WHERE claimed_by IS NULL OR claimed_at < ?
+                    ORDER BY update_id
+                    LIMIT ?
+                )
+                RETURNING payload
+            """, (self.worker, now, now - self.claim_timeout, limit))
+            await db.commit()
+        return [json.loads(payload) for payload, in rows]
+
+    async def extend(self, update_ids: list[int]):
+        """Продлить свой захват апдейтов, которые ещё обрабатываются"""
+        now = time.time()
+        async with self._connection() as db:
+            await db.executemany(
+                "UPDATE update_queue SET claimed_at = ? WHERE update_id = ? AND claimed_by = ?",
+                ((now, update_id, self.worker) for update_id in update_ids)
+            )
+            await db.commit()
+
+    async def release(self):
+        """Вернуть в очередь все свои неподтверждённые апдейты — при остановке процесса"""
+        async with self._connection() as db:
+            await db.execute(
+                "UPDATE update_queue SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by = ?",
+                (self.worker,)
+            )
+            await db.commit()
+
+    async def ack(self, update_id: int):
+        async with self._connection() as db:
+            await db.execute(
+                "DELETE FROM update_queue WHERE update_id = ? AND claimed_by = ?",
+                (update_id, self.worker)
+            )
+            await db.commit()
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
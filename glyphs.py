@@ -0,0 +1,165 @@
+"""
+Атлас глифов для массового рендера.
+
+draw.text растеризует каждую букву заново для каждой картинки, а корпус — кириллица
+из пары сотен символов одним шрифтом. GlyphAtlas растеризует символ один раз,
+запоминает маску, ширину и кернинг пар, а строку собирает наложением готовых масок.
+
+Быстрый путь работает только с базовой раскладкой (ImageFont.Layout.BASIC): позиции
+символов — их ширины и кернинг пар из таблицы kern, без шейпинга. Он включён, только
+если базовая раскладка — та, что draw.text выбирает для шрифта по умолчанию (Pillow
+без raqm). С raqm draw.text берёт кернинг из GPOS и лигатуры из GSUB (у TT Norms
+кернинг только в GPOS), и сборка из отдельных масок с ним не совпадёт — там атлас
+выключен и строки рисуются обычным draw.text.
+С базовой раскладкой строки без шейпинга совпадают с draw.text попиксельно:
+пересекающиеся маски складываются так же (alpha-over с тем же округлением), итоговая
+маска рисуется тем же draw.bitmap. Строки, которым нужен шейпинг (RTL, комбинируемые
+знаки), и не-FreeType шрифт — всегда через draw.text.
+"""
+import unicodedata
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Символы, для которых нужен шейпинг: письмо справа налево и знаки, меняющие соседей
+_COMPLEX_BIDI = {"R", "AL", "AN", "RLE", "RLO", "RLI", "LRE", "LRO", "LRI", "PDF", "PDI", "FSI"}
+
+
+class GlyphAtlas:
+    """
+    Растеризованные глифы одного шрифта одного размера. font — шрифт быстрого пути,
+    shaping_font — для строк, которым нужен шейпинг; по умолчанию тот же font. Быстрый
+    путь включён, только если оба — FreeType с раскладкой BASIC: иначе draw.text
+    расставил бы символы по-другому.
+    """
+
+    def __init__(self, font, shaping_font=None):
+        self.font = font
+        self.shaping_font = shaping_font or font
+        self.enabled = all(
+            isinstance(f, ImageFont.FreeTypeFont) and f.layout_engine == ImageFont.Layout.BASIC
+            for f in (font, self.shaping_font)
+        )
+        self._glyphs = {}       # символ -> (RGBA-маска с покрытием в альфе или None, смещение)
+        self._bboxes = {}       # символ -> getbbox(символ)
+        self._advances = {}     # символ -> ширина
+        self._kerning = {}      # (пред., след.) -> поправка к ширине
+        self._simple = {}       # символ -> можно ли без шейпинга
+
+    def supports(self, text: str) -> bool:
+        """Можно ли собрать строку из атласа так же, как её нарисует draw.text"""
+        if not self.enabled or not text:
+            return False
+        for char in text:
+            simple = self._simple.get(char)
+            if simple is None:
+                simple = self._simple[char] = (
+                    char.isprintable()
+                    and not unicodedata.combining(char)
+                    and unicodedata.bidirectional(char) not in _COMPLEX_BIDI
+                )
+            if not simple:
+                return False
+        return True
+
+    def _advance(self, char: str) -> float:
+        advance = self._advances.get(char)
+        if advance is None:
+            advance = self._advances[char] = self.font.getlength(char)
+        return advance
+
+    def _kern(self, prev: str, char: str) -> float:
+        kern = self._kerning.get((prev, char))
+        if kern is None:
+            kern = self._kerning[(prev, char)] = (
+                self.font.getlength(prev + char) - self._advance(prev) - self._advance(char)
+            )
+        return kern
+
+    def _pens(self, text: str):
+        """(символ, позиция пера) — ширины и кернинг пар, как в базовой раскладке FreeType"""
+        pen = 0.0
+        prev = None
+        for char in text:
+            if prev is not None:
+                pen += self._kern(prev, char)
+            yield char, pen
+            pen += self._advance(char)
+            prev = char
+
+    def _glyph(self, char: str):
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            # Маска — через публичный draw.text на чёрном "L": покрытие переносится без изменений
+            left, top, right, bottom = self.font.getbbox(char)
+            if right > left and bottom > top:
+                mask = Image.new("L", (right - left, bottom - top))
+                ImageDraw.Draw(mask).text((-left, -top), char, fill=255, font=self.font)
+                rgba = Image.new("RGBA", mask.size)
+                rgba.putalpha(mask)
+            else:
+                rgba = None         # пробел
+            glyph = self._glyphs[char] = (rgba, (left, top))
+        return glyph
+
+    def bbox(self, text: str) -> tuple[int, int, int, int]:
+        """То же, что draw.textbbox((0, 0), text, font) тем шрифтом, которым строка будет нарисована"""
+        if not self.supports(text):
+            return self.shaping_font.getbbox(text)
+        x0 = y0 = x1 = y1 = None
+        for char, pen in self._pens(text):
+            if pen != int(pen):
+                return self.font.getbbox(text)
+            box = self._bboxes.get(char)
+            if box is None:
+                box = self._bboxes[char] = self.font.getbbox(char)
+            left, top, right, bottom = pen + box[0], box[1], pen + box[2], box[3]
+            if x0 is None:
+                x0, y0, x1, y1 = left, top, right, bottom
+            else:
+                x0, y0, x1, y1 = min(x0, left), min(y0, top), max(x1, right), max(y1, bottom)
+        return int(x0), int(y0), int(x1), int(y1)
+
+    def draw(self, draw, xy: tuple[int, int], text: str, fill):
+        """draw.text((x, y), text, fill, font) через готовые маски"""
+        x, y = xy
+        if not self.supports(text):
+            draw.text(xy, text, fill=fill, font=self.shaping_font)
+            return
+        if x != int(x) or y != int(y):
+            # Дробные координаты и позиции пера дают субпиксельный сдвиг маски — таких глифов в атласе нет
+            draw.text(xy, text, fill=fill, font=self.font)
+            return
+
+        placed = []
+        for char, pen in self._pens(text):
+            if pen != int(pen):
+                draw.text(xy, text, fill=fill, font=self.font)
+                return
+            mask, (dx, dy) = self._glyph(char)
+            if mask is not None:
+                placed.append((mask, x + int(pen) + dx, y + dy))
+        if not placed:
+            return
+
+        left = min(gx for _, gx, _ in placed)
+        top = min(gy for _, _, gy in placed)
+        right = max(gx + mask.width for mask, gx, _ in placed)
+        bottom = max(gy + mask.height for mask, _, gy in placed)
+        line = Image.new("RGBA", (right - left, bottom - top))
+        for mask, gx, gy in placed:
+            line.alpha_composite(mask, (gx - left, gy - top))
+        draw.bitmap((left, top), line.getchannel("A"), fill=fill)
+
+
+@lru_cache(maxsize=8)
+def get_atlas(font_path: str, size: int) -> GlyphAtlas:
+    """
+    Атлас на (шрифт, размер) с раскладкой по умолчанию, как у draw.text; с raqm и без
+    файла шрифта (встроенный шрифт Pillow) — строки через draw.text
+    """
+    try:
+        font = ImageFont.truetype(font_path, size)
+    except OSError:
+        font = ImageFont.load_default()
+    return GlyphAtlas(font)
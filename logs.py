@@ -0,0 +1,156 @@
+"""
+Логирование без записи в поток event loop.
+
+logger.info(...) только кладёт запись в очередь (QueueHandler); форматирование и
+запись в консоль и файл делает поток QueueListener. Сообщения пишутся в %-стиле
+(logger.info("Канал #%s", channel_id)), так что строка собирается уже в потоке
+слушателя, а отброшенные записи не форматируются вовсе. Трассировка исключения и
+сообщения с изменяемыми аргументами (списки, словари, объекты) форматируются сразу:
+к моменту записи в файл они могут стать другими.
+
+- консоль — прежний текстовый формат;
+- файл в папке логов — JSON по строке на запись, с ротацией по размеру;
+- одинаковые (по логгеру и шаблону) строки уровня INFO ограничены по частоте,
+  число пропущенных попадает в поле suppressed следующей записанной.
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Стандартные поля LogRecord; всё, что передано через extra=..., уходит в JSON отдельными полями
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "suppressed"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON; трассировка исключения — в поле exc"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_FIELDS)
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        elif record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Прежний формат консоли плюс отметка о пропущенных повторах"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        if getattr(record, "suppressed", 0):
+            text += f" (и ещё {record.suppressed} таких же пропущено)"
+        return text
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Не больше burst записей с одним шаблоном за interval секунд. Предупреждения и
+    ошибки проходят всегда. Вызывается в потоке, который логирует, — до очереди.
+    """
+
+    def __init__(self, burst: int = 20, interval: float = 10.0, max_keys: int = 1000):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.max_keys = max_keys            # защита от f-строк: у них каждый шаблон уникален
+        self._windows = {}                  # (логгер, шаблон) -> [начало окна, пропущено в окно, отброшено]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or record.created - window[0] >= self.interval:
+                if window is None and len(self._windows) >= self.max_keys:
+                    self._windows.clear()
+                if window is not None and window[2]:
+                    record.suppressed = window[2]
+                self._windows[key] = [record.created, 1, 0]
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+# Аргументы, которые не изменятся, пока запись ждёт в очереди
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler, который откладывает сборку сообщения до потока слушателя, если это
+    безопасно. Как и в стандартном prepare(), запись копируется, а исключение сразу
+    превращается в текст exc_text: трассировка и объект исключения не держатся в
+    очереди и не меняются до записи.
+    """
+
+    _formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = self._formatter.formatException(record.exc_info)
+            record.exc_info = None
+        args = record.args
+        if isinstance(args, dict):
+            args = args.values()
+        if args and not all(isinstance(arg, _IMMUTABLE_ARGS) for arg in args):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def setup_logging(
+    log_dir: Path,
+    file_name: str = "bot.log",
+    level: int = logging.INFO,
+    max_bytes: int = 10 * 1024 * 1024,
+    backups: int = 5,
+    burst: int = 20,
+    interval: float = 10.0,
+) -> QueueListener:
+    """Заменить обработчики корневого логгера очередью и запустить поток-слушатель"""
+    log_dir.mkdir(parents=True, exist_ok=True)
+    console = logging.StreamHandler()
+    console.setFormatter(TextFormatter(TEXT_FORMAT))
+    file = RotatingFileHandler(log_dir / file_name, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    file.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = LazyQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter(burst=burst, interval=interval))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, console, file, respect_handler_level=True)
+    listener.start()
+    # При выходе дописать всё, что осталось в очереди
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,204 @@
+"""
+Журнал отправок и дневные сводки.
+
+post_log — только добавление (UPDATE запрещён триггером): что, куда и когда отправлено,
+плановый слот, длительность отправки, file_id и message_id из ответа Telegram.
+Записи копятся в памяти и пишутся пачкой — по размеру пачки или через interval секунд
+после первой записи в пустой буфер; неудачная запись повторяется через interval. В той же транзакции пачка добавляется в post_daily:
+счётчики за день канала (день — по поясу канала). История, статистика и экран статуса
+читают только post_daily; сырые записи старше срока хранения удаляются, сводки остаются.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS post_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel_id INTEGER NOT NULL,
+        affirmation_id INTEGER,
+        scheduled_at TEXT,          -- слот расписания, UTC ISO; NULL — отправка вне расписания
+        sent_at TEXT NOT NULL,      -- UTC ISO
+        latency_ms REAL,            -- от начала send_affirmation до ответа Telegram
+        file_id TEXT,
+        message_id INTEGER,
+        error TEXT                  -- NULL — отправлено
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_post_log_sent ON post_log(sent_at)",
+    """
+    CREATE TRIGGER IF NOT EXISTS post_log_append_only BEFORE UPDATE ON post_log
+    BEGIN
+        SELECT RAISE(ABORT, 'post_log is append-only');
+    END
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS post_daily (
+        channel_id INTEGER NOT NULL,
+        day TEXT NOT NULL,                      -- дата в поясе канала
+        posts INTEGER NOT NULL DEFAULT 0,
+        errors INTEGER NOT NULL DEFAULT 0,
+        scheduled INTEGER NOT NULL DEFAULT 0,   -- отправки по расписанию: знаменатель для delay_sum
+        delay_sum REAL NOT NULL DEFAULT 0,      -- секунд от слота до отправки
+        latency_sum REAL NOT NULL DEFAULT 0,    -- мс, по успешным отправкам
+        PRIMARY KEY (channel_id, day)
+    ) WITHOUT ROWID
+    """,
+)
+
+
+@dataclass
+class PostRecord:
+    channel_id: int
+    affirmation_id: int | None
+    scheduled_at: datetime | None
+    sent_at: datetime           # aware, в поясе канала — по нему считается день
+    latency_ms: float | None
+    file_id: str | None = None
+    message_id: int | None = None
+    error: str | None = None
+
+
+class PostLog:
+    """Буфер записей post_log; connect — функция, возвращающая async-контекст соединения"""
+
+    def __init__(self, connect, batch: int = 50, interval: float = 5.0, max_buffer: int = 5000):
+        self.connect = connect
+        self.batch = batch
+        self.interval = interval
+        self.max_buffer = max_buffer        # база недоступна долго — старые записи отбрасываются
+        self._buffer = []
+        self._lock = asyncio.Lock()
+        self._tasks = set()
+        self._timers = set()                # ещё ждут своего срока, запись не начали
+
+    def record(self, entry: PostRecord):
+        """Добавить запись; сама запись в базу — в фоне"""
+        self._buffer.append(entry)
+        if len(self._buffer) >= self.batch:
+            self._spawn(0)
+        elif len(self._buffer) == 1:
+            self._spawn(self.interval)
+
+    def _spawn(self, delay: float):
+        task = asyncio.create_task(self._flush_later(delay))
+        self._tasks.add(task)
+        self._timers.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(self._timers.discard)
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        # Начатую запись close() не отменяет, а дожидается
+        self._timers.discard(asyncio.current_task())
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("❌ Ошибка записи журнала отправок")
+            # Записи вернулись в буфер; новых может и не быть — без таймера они ждали бы до остановки
+            if self._buffer and not self._timers:
+                self._spawn(self.interval)
+
+    async def close(self) -> int:
+        """Остановка: снять таймеры, дождаться начатых записей и дописать буфер"""
+        while self._tasks:
+            for task in self._timers:
+                task.cancel()
+            await asyncio.wait(self._tasks)
+        return await self.flush()
+
+    async def flush(self) -> int:
+        """Записать буфер и обновить сводки одной транзакцией; возвращает число записей"""
+        async with self._lock:
+            entries, self._buffer = self._buffer, []
+            if not entries:
+                return 0
+
+            rollups = {}
+            for e in entries:
+                row = rollups.setdefault((e.channel_id, e.sent_at.date().isoformat()), [0, 0, 0, 0.0, 0.0])
+                if e.error is None:
+                    row[0] += 1
+                    row[4] += e.latency_ms or 0.0
+                else:
+                    row[1] += 1
+                if e.scheduled_at is not None:
+                    row[2] += 1
+                    row[3] += (e.sent_at - e.scheduled_at).total_seconds()
+
+            try:
+                async with self.connect() as db:
+                    await db.executemany(
+                        "INSERT INTO post_log (channel_id, affirmation_id, scheduled_at, sent_at, latency_ms, "
+                        "file_id, message_id, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(
+                            e.channel_id, e.affirmation_id,
+                            e.scheduled_at.astimezone(pytz.utc).isoformat() if e.scheduled_at else None,
+                            e.sent_at.astimezone(pytz.utc).isoformat(),
+                            e.latency_ms, e.file_id, e.message_id, e.error,
+                        ) for e in entries]
+                    )
+                    await db.executemany("""
+                        INSERT INTO post_daily (channel_id, day, posts, errors, scheduled, delay_sum, latency_sum)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (channel_id, day) DO UPDATE SET
+                            posts = posts + excluded.posts,
+                            errors = errors + excluded.errors,
+                            scheduled = scheduled + excluded.scheduled,
+                            delay_sum = delay_sum + excluded.delay_sum,
+                            latency_sum = latency_sum + excluded.latency_sum
+                    """, [key + tuple(row) for key, row in rollups.items()])
+                    await db.commit()
+            except Exception:
+                # Вернуть в буфер — запишутся следующей пачкой
+                self._buffer[:0] = entries
+                del self._buffer[:-self.max_buffer]
+                raise
+            return len(entries)
+
+    async def prune(self, before: datetime) -> int:
+        """Удалить сырые записи старше before; сводки не трогаются"""
+        async with self.connect() as db:
+            cursor = await db.execute(
+                "DELETE FROM post_log WHERE sent_at < ?",
+                (before.astimezone(pytz.utc).isoformat(),)
+            )
+            await db.commit()
+            return cursor.rowcount
+
+    async def daily(self, channel_id: int, since: str) -> list[dict]:
+        """Сводки канала по дням начиная с since (YYYY-MM-DD), новые первыми"""
+        async with self.connect() as db:
+            rows = await db.execute_fetchall(
+                "SELECT day, posts, errors, scheduled, delay_sum, latency_sum FROM post_daily "
+                "WHERE channel_id = ? AND day >= ? ORDER BY day DESC",
+                (channel_id, since)
+            )
+        return [_summary(row[0], *row[1:]) for row in rows]
+
+    async def totals(self, channel_id: int, since: str | None = None) -> dict:
+        """Сумма сводок канала с since (None — за всё время)"""
+        async with self.connect() as db:
+            rows = await db.execute_fetchall(
+                "SELECT COALESCE(SUM(posts), 0), COALESCE(SUM(errors), 0), COALESCE(SUM(scheduled), 0), "
+                "COALESCE(SUM(delay_sum), 0), COALESCE(SUM(latency_sum), 0) FROM post_daily "
+                "WHERE channel_id = ? AND (? IS NULL OR day >= ?)",
+                (channel_id, since, since)
+            )
+        return _summary(since, *rows[0])
+
+
+def _summary(day, posts, errors, scheduled, delay_sum, latency_sum) -> dict:
+    return {
+        "day": day,
+        "posts": posts,
+        "errors": errors,
+        "delay_s": delay_sum / scheduled if scheduled else 0.0,
+        "latency_ms": latency_sum / posts if posts else 0.0,
+    }
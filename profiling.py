@@ -0,0 +1,172 @@
+"""
+Профилирование по запросу из админки.
+
+Пока сессия не запущена, ничего не установлено: ни профайлера, ни потока-сэмплера,
+ни tracemalloc — накладные расходы нулевые. Каждая сессия ограничена по времени
+и останавливается сама.
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProfileReport:
+    duration: float
+    pstats_text: str     # cProfile потока event loop, сортировка по cumulative
+    collapsed: str       # сэмплы стеков всех потоков в формате flamegraph.pl / speedscope
+    samples: int
+
+
+class Profiler:
+    """
+    Сессия профилирования: cProfile в потоке event loop и сэмплер стеков всех потоков
+    (в том числе потоков aiosqlite и воркеров рендера) с записью в collapsed stacks.
+    """
+
+    def __init__(self, timeout: float, sample_interval: float = 0.005, on_timeout=None):
+        self.timeout = timeout
+        self.sample_interval = sample_interval
+        self.on_timeout = on_timeout        # async def on_timeout(report)
+        self._profile = None
+        self._sampler = None
+        self._stop_sampling = threading.Event()
+        self._stacks = Counter()
+        self._started = 0.0
+        self._timer = None
+        self._reports = set()               # задачи on_timeout: держим ссылку до завершения
+
+    @property
+    def active(self) -> bool:
+        return self._profile is not None
+
+    def start(self):
+        if self.active:
+            raise RuntimeError("Профилирование уже запущено")
+        loop = asyncio.get_running_loop()
+        self._stacks = Counter()
+        self._stop_sampling.clear()
+        self._sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+        self._profile = cProfile.Profile()
+        self._started = time.perf_counter()
+        self._sampler.start()
+        self._profile.enable()
+        self._timer = loop.call_later(self.timeout, self._expire)
+
+    def stop(self) -> ProfileReport:
+        if not self.active:
+            raise RuntimeError("Профилирование не запущено")
+        self._profile.disable()
+        self._stop_sampling.set()
+        self._sampler.join()
+        if self._timer:
+            self._timer.cancel()
+
+        buf = io.StringIO()
+        pstats.Stats(self._profile, stream=buf).strip_dirs().sort_stats("cumulative").print_stats(80)
+        collapsed = "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+        report = ProfileReport(
+            duration=time.perf_counter() - self._started,
+            pstats_text=buf.getvalue(),
+            collapsed=collapsed + "\n",
+            samples=sum(self._stacks.values()),
+        )
+        self._profile = self._sampler = self._timer = None
+        return report
+
+    def _expire(self):
+        report = self.stop()
+        if self.on_timeout:
+            task = asyncio.get_running_loop().create_task(self.on_timeout(report))
+            self._reports.add(task)
+            task.add_done_callback(self._reported)
+
+    def _reported(self, task: asyncio.Task):
+        self._reports.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("❌ Ошибка отправки отчёта профилирования", exc_info=task.exception())
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop_sampling.wait(self.sample_interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(stack))] += 1
+
+
+class MemoryTracer:
+    """
+    Снимки tracemalloc: первый вызов включает трассировку, следующие показывают
+    разницу с предыдущим снимком. Трассировка выключается сама через timeout.
+    """
+
+    def __init__(self, timeout: float, frames: int = 10, top: int = 30):
+        self.timeout = timeout
+        self.frames = frames
+        self.top = top
+        self._previous = None
+        self._timer = None
+
+    @property
+    def active(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def snapshot(self) -> str:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._previous = None
+            self._timer = asyncio.get_running_loop().call_later(self.timeout, self.stop)
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Отслеживается: {current / 1024:.0f} KiB, пик: {peak / 1024:.0f} KiB", ""]
+
+        if self._previous is None:
+            lines.append(f"Топ-{self.top} мест выделения памяти:")
+            lines += [str(stat) for stat in snapshot.statistics("lineno")[:self.top]]
+        else:
+            lines.append(f"Топ-{self.top} изменений с прошлого снимка:")
+            lines += [str(stat) for stat in snapshot.compare_to(self._previous, "lineno")[:self.top]]
+        self._previous = snapshot
+        return "\n".join(lines) + "\n"
+
+    def stop(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self._previous = None
+        tracemalloc.stop()
+
+
+def dump_tasks() -> str:
+    """Стеки всех asyncio-задач текущего цикла"""
+    buf = io.StringIO()
+    tasks = asyncio.all_tasks()
+    buf.write(f"Задач: {len(tasks)}\n\n")
+    for task in sorted(tasks, key=lambda t: t.get_name()):
+        buf.write(f"=== {task.get_name()} {task.get_coro()!r}\n")
+        task.print_stack(file=buf)
+        buf.write("\n")
+    return buf.getvalue()
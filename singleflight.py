@@ -0,0 +1,68 @@
+"""
+Одна операция на ключ за раз.
+
+Если рендер или загрузка картинки уже идут, следующие вызовы с тем же ключом не
+запускают их заново, а ждут общий результат: значение получают все, исключение
+(включая таймаут) тоже получают все. Сама операция выполняется отдельной задачей,
+поэтому отмена одного из ждущих не отменяет её для остальных.
+
+Таймаут отпускает ждущих и отменяет операцию, но ключ остаётся занятым, пока она
+действительно не закончится. Корутина заканчивается сразу после отмены, а поток
+executor'а отменой не остановить — такую операцию оборачивают в settle(), и второй
+рендер той же картинки не начнётся, пока первый ещё идёт в потоке. Вызовы в это
+время сразу получают тот же TimeoutError.
+"""
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Общий future на ключ; timeout — предел ожидания операции, None — без предела"""
+
+    def __init__(self, timeout: float | None = None):
+        self.timeout = timeout
+        self._flights: dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    async def run(self, key: Hashable, operation: Callable[[], Awaitable[T]]) -> T:
+        """Выполнить operation() или дождаться уже идущей операции с тем же ключом"""
+        task = self._flights.get(key)
+        if task is None:
+            work = asyncio.ensure_future(operation())
+            task = asyncio.create_task(self._bounded(work))
+            self._flights[key] = task
+            task.add_done_callback(_retrieve)
+            work.add_done_callback(lambda done: self._finished(key, task, done))
+        return await asyncio.shield(task)
+
+    async def _bounded(self, work: asyncio.Future) -> T:
+        try:
+            return await asyncio.wait_for(asyncio.shield(work), self.timeout)
+        except TimeoutError:
+            work.cancel()
+            raise
+
+    def _finished(self, key: Hashable, task: asyncio.Task, work: asyncio.Future):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        _retrieve(work)
+
+
+async def settle(future: Awaitable[T]) -> T:
+    """Дождаться future даже после отмены — для run_in_executor: поток отменой не остановить"""
+    future = asyncio.ensure_future(future)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait([future])
+        raise
+
+
+def _retrieve(future: asyncio.Future):
+    # Все ждущие могли быть отменены — исключение не должно остаться «неполученным»
+    if not future.cancelled():
+        future.exception()